@@ -1,3 +1,4 @@
+import os
 import sys
 import re
 import argparse
@@ -9,8 +10,12 @@ from . import runtime
 from . import rgb_serial
 from . import hardware_monitor
 from . import autorun
+from . import remote
+from . import profiler
+from . import shared_snapshot
+from . import query_api
 from .hardware_monitor import HMNoSensorsError, HMSensorNotFound, HMExecError, HardwareMonitorError
-from .log import logger, log_stream_handler, setup_file_logging, error_popup
+from .log import logger, set_stream_log_level, setup_file_logging, set_rate_limit, error_popup
 from .runtime import quit_event, pause_event, is_admin
 from .systray import RGBHardwareMonitorSysTray, WaitIconAnimation, PausedIconStatic, ErrorIconAnimation
 
@@ -20,6 +25,11 @@ def sensor_spec_from_cfg(config, section_name, subsection_name):
     sensorspec_device = sensorspec_cfg['device']
     sensorspec_min = sensorspec_cfg.getfloat('range_min', rgb_serial.SensorSpec.min)
     sensorspec_max = sensorspec_cfg.getfloat('range_max', rgb_serial.SensorSpec.max)
+    sensorspec_alarm_threshold = sensorspec_cfg.getfloat('alarm_threshold', rgb_serial.SensorSpec.alarm_threshold)
+    sensorspec_aggregate = sensorspec_cfg.get('aggregate')
+    sensorspec_weights = sensorspec_cfg.get('aggregate_weights')
+    if sensorspec_weights is not None:
+        sensorspec_weights = [float(weight) for weight in sensorspec_weights.split(',') if weight.strip()]
     sensorspec_filters = []
     for key in sensorspec_cfg:
         match = re.fullmatch(r'filters_(?P<filter_name>.+)', key, re.I)
@@ -29,6 +39,8 @@ def sensor_spec_from_cfg(config, section_name, subsection_name):
         device=sensorspec_device,
         filters=dict(sensorspec_filters),
         min=sensorspec_min, max=sensorspec_max,
+        alarm_threshold=sensorspec_alarm_threshold,
+        aggregate=sensorspec_aggregate, weights=sensorspec_weights,
     )
 
 
@@ -43,21 +55,36 @@ def ring_lights_from_cfg(config):
             ring_temp_sensor = sensor_spec_from_cfg(config, section_name, 'TempSensor')
             ring_load_sensor = sensor_spec_from_cfg(config, section_name, 'LoadSensor')
             ring_fan_sensor = sensor_spec_from_cfg(config, section_name, 'FanSensor')
+            ring_min_interval = ring_cfg.getfloat('update_interval_min', rgb_serial.RingLightSpec.min_interval)
+            ring_max_interval = ring_cfg.getfloat('update_interval_max', rgb_serial.RingLightSpec.max_interval)
+            ring_alarm_effect = ring_cfg.getboolean('alarm_effect', rgb_serial.RingLightSpec.alarm_effect)
             ringlights.append(rgb_serial.RingLightSpec(
                 id=ring_id, name=ring_name,
                 temp_sensor=ring_temp_sensor, load_sensor=ring_load_sensor, fan_sensor=ring_fan_sensor,
+                min_interval=ring_min_interval, max_interval=ring_max_interval, alarm_effect=ring_alarm_effect,
             ))
     return ringlights
 
 
 def parse_args():
     argparser = argparse.ArgumentParser()
-    argparser.add_argument('-i', '--system-info', action='store_true',
-                           help='Print OpenHardwareMonitor system info and exit')
+    argparser.add_argument('-i', '--system-info', nargs='?', const='text', default=None,
+                           choices=hardware_monitor.INVENTORY_FORMATS,
+                           help='Print OpenHardwareMonitor system info and exit, optionally as json or csv')
+    argparser.add_argument('-o', '--output', default=None,
+                           help='Write the system info to this file instead of printing it')
     argparser.add_argument('--autorun', choices=['enable', 'disable'],
                            help='Set autorun and exit')
     argparser.add_argument('-c', '--config', default='config.ini',
                            help='Specify custom path for configuration')
+    argparser.add_argument('--agent', metavar='HOST[:PORT]', default=None,
+                           help='Run as a sensor agent, sending the sensors to the RGBHardwareMonitor on HOST')
+    argparser.add_argument('--agent-name', default=None,
+                           help='Sensor agent name, referenced by remote devices (default: computer name)')
+    argparser.add_argument('--agent-interval', type=float, default=1.0,
+                           help='Sensor agent update interval in seconds')
+    argparser.add_argument('--profile', action='store_true',
+                           help='Profile the running threads, writing flame graph stacks and a summary to the log folder')
     log_choices = ['CRITICAL', 'ERROR', 'WARNING', 'INFO', 'DEBUG', 'NOTSET']
     argparser.add_argument('--log-file', default=None,
                            help='Specify custom path for log file')
@@ -91,29 +118,89 @@ def real_main():
     hardware_monitor.openhardwaremonitor_exe_path = runtime.config['RGBHardwareMonitor']['openhardwaremonitor_path']
 
     if args.system_info:
-        hardware_monitor.SystemInfo().print_info()
+        system_info = hardware_monitor.SystemInfo()
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8', newline='') as fp:
+                system_info.write_inventory(fp, args.system_info)
+        elif args.system_info == 'text':
+            system_info.print_info()
+        else:
+            system_info.write_inventory(sys.stdout, args.system_info)
         return 0
 
     verbosity = args.verbosity or runtime.config['RGBHardwareMonitor'].get('verbosity', 'INFO')
-    log_stream_handler.setLevel(verbosity)
+    set_stream_log_level(verbosity)
     log_file = args.log_file or runtime.config['RGBHardwareMonitor'].get('log_file')
     log_level = args.log_level or runtime.config['RGBHardwareMonitor'].get('log_level', 'INFO')
     if log_file:
         setup_file_logging(log_file, log_level)
+    set_rate_limit(runtime.config['RGBHardwareMonitor'].getfloat('log_rate_limit', 10.0))
+    profiler.output_dir = os.path.dirname(os.path.abspath(log_file)) if log_file else runtime.user_data_path('logs')
+    if args.profile:
+        profiler.start()
+
+    if args.agent:
+        remote.SensorAgent(remote.parse_address(args.agent), name=args.agent_name, interval=args.agent_interval).run()
+        return 0
 
     rgb_serial.arduino_id = runtime.config['RGBHardwareMonitor']['arduino_serial_id']
+    rgb_serial.arduino_port = runtime.config['RGBHardwareMonitor'].get('arduino_serial_port')
+    rgb_serial.firmware_log_level = runtime.config['RGBHardwareMonitor'].get('arduino_log_level',
+                                                                            rgb_serial.firmware_log_level)
+    rgb_serial.telemetry_interval = runtime.config['RGBHardwareMonitor'].getfloat('arduino_telemetry_interval',
+                                                                                  rgb_serial.telemetry_interval)
+    baud_rates = runtime.config['RGBHardwareMonitor'].get('arduino_baud_rates')
+    if baud_rates is not None:
+        rgb_serial.baud_rates = [int(baud) for baud in baud_rates.split(',') if baud.strip()]
+    rgb_serial.pipeline_window = runtime.config['RGBHardwareMonitor'].getint('arduino_pipeline_window',
+                                                                             rgb_serial.pipeline_window)
+    rgb_serial.adaptive_polling = runtime.config['RGBHardwareMonitor'].getboolean('adaptive_polling',
+                                                                                  rgb_serial.adaptive_polling)
+    rgb_serial.alarm_interval = runtime.config['RGBHardwareMonitor'].getfloat('alarm_sampling_interval',
+                                                                              rgb_serial.alarm_interval)
+    catalog_cache = runtime.config['RGBHardwareMonitor'].get('sensor_catalog_cache',
+                                                             runtime.user_data_path('sensor_catalog.json'))
+    rgb_serial.catalog_cache_path = catalog_cache or None
+    shared_snapshot_path = runtime.config['RGBHardwareMonitor'].get('shared_snapshot_file')
+    if shared_snapshot_path:
+        shared_snapshot_capacity = runtime.config['RGBHardwareMonitor'].getint('shared_snapshot_capacity',
+                                                                             shared_snapshot.DEFAULT_CAPACITY)
+        try:
+            snapshot_writer = shared_snapshot.SnapshotWriter(shared_snapshot_path, capacity=shared_snapshot_capacity)
+            hardware_monitor.snapshot_listeners.append(snapshot_writer.publish)
+            logger.info(f'Publishing sensor snapshots to {shared_snapshot_path}')
+        except OSError as exc:  # Eg. still mapped by readers with a different capacity
+            logger.warning(f'Cannot publish sensor snapshots to {shared_snapshot_path}: {exc}')
+    query_api_port = runtime.config['RGBHardwareMonitor'].getint('query_api_port')
+    if query_api_port:
+        query_api_history = runtime.config['RGBHardwareMonitor'].getfloat('query_api_history',
+                                                                          query_api.HISTORY_SECONDS)
+        try:
+            query_api.server = query_api.QueryServer(query_api_port, history_seconds=query_api_history)
+        except OSError as exc:  # Eg. port already in use
+            logger.warning(f'Cannot serve the query API on port {query_api_port}, running without it: {exc}')
+    remote_sensors_port = runtime.config['RGBHardwareMonitor'].getint('remote_sensors_port')
+    if remote_sensors_port:
+        remote_stale_timeout = runtime.config['RGBHardwareMonitor'].getfloat('remote_sensors_stale_timeout', 5.0)
+        remote.listener = remote.RemoteSensorListener(remote_sensors_port, stale_timeout=remote_stale_timeout)
 
     with RGBHardwareMonitorSysTray(animation_cls=WaitIconAnimation, start_animation=True) as systray:
         is_init: bool = True
         while not quit_event.is_set():
             try:
-                if is_init and not hardware_monitor.is_openhardwaremonitor_running():
-                    systray.set_hover_text('Starting OpenHardwareMonitor')
-                    systray.set_animation(WaitIconAnimation)
-                    hardware_monitor.openhardwaremonitor_start()
-                    rgb_serial.SensorSpec.system_info = None  # deinit cached OHM data
-                    sleep(10)  # Let OHM load sensors
-                rgb_serial.rings = ring_lights_from_cfg(runtime.config)
+                if is_init:
+                    # Only the sensors used last time need to be loaded, no need to wait for all of them
+                    needed_sensors = rgb_serial.cached_bindings()
+                    if not hardware_monitor.is_openhardwaremonitor_running():
+                        systray.set_hover_text('Starting OpenHardwareMonitor')
+                        systray.set_animation(WaitIconAnimation)
+                        hardware_monitor.openhardwaremonitor_start(needed_sensors)
+                        rgb_serial.SensorSpec.system_info = None  # deinit cached OHM data
+                    else:  # Could still be loading sensors, eg. when both run at startup
+                        hardware_monitor.wait_for_openhardwaremonitor(needed_sensors)
+                if not rgb_serial.rings:  # Once built, failing sensors are recovered one by one by the update loop
+                    rgb_serial.rings = ring_lights_from_cfg(runtime.config)
+                    rgb_serial.cache_bindings()
                 is_init = False
                 if not hardware_monitor.is_openhardwaremonitor_running():
                     raise HMExecError('OHM not running')
@@ -1,15 +1,37 @@
+import os
+import sys
+import csv
+import json
 import time
-from dataclasses import dataclass, InitVar
-from typing import Optional, List, Union
+import hashlib
+import itertools
+from array import array
+from dataclasses import dataclass, field, InitVar
+from threading import Thread
+from typing import Optional, List, Union, Dict, Iterator, Tuple, Callable, Collection, Set
 from pathlib import Path
 
-from wmi import WMI
+import pythoncom
+from wmi import WMI, x_wmi
 
 from .log import logger
 from .runtime import run_as_admin
 
 
 openhardwaremonitor_exe_path: Optional[str] = None
+# Called with the values and `time.time()` of every new snapshot, eg. to publish them to local processes
+snapshot_listeners: List[Callable[[Dict[str, float], float], None]] = []
+
+CATALOG_CACHE_VERSION = 2
+READY_POLL_INTERVALS = (0.05, 0.1, 0.2, 0.25)  # Backoff while waiting for OHM, the last one repeats
+READY_TIMEOUT = 60.0
+SENSORS_SETTLE_TIME = 2.0  # Unless all the needed sensors report sooner, OHM is ready once the polled ones settle
+SNAPSHOT_MAX_AGE = 0.05  # Sensor values read within this many seconds share one WMI query
+
+DEVICE_CATEGORIES = ('mainboard', 'superio', 'cpu', 'ram', 'gpu', 'hdd')
+INVENTORY_FORMATS = ('text', 'json', 'csv')
+INVENTORY_CSV_FIELDS = ('category', 'hardware_type', 'device_name', 'device_identifier', 'device_parent',
+                        'sensor_name', 'sensor_identifier', 'sensor_type', 'sensor_index', 'value')
 
 
 class HardwareMonitorError(Exception):
@@ -40,6 +62,10 @@ class HMSensorNotFound(HardwareMonitorError):
     """Exception class for sensor not found from WMI query"""
 
 
+class HMStaleSensorError(HardwareMonitorError):
+    """Exception class for sensor values that stopped being updated"""
+
+
 # TODO: Catch WMI errors (like disconnection), check wmi lib
 
 
@@ -52,21 +78,102 @@ def is_openhardwaremonitor_running():
     return bool(_wmi_get_ohm().Hardware())
 
 
-def openhardwaremonitor_start():
+def hardware_fingerprint() -> str:
+    """Hash of the hardware devices listed by OHM, identifies the sensors catalog with a single, small WMI query"""
+    devices = sorted((hw.Identifier, hw.Name, hw.HardwareType) for hw in _wmi_get_ohm().Hardware())
+    return hashlib.sha1(repr(devices).encode('utf-8')).hexdigest()
+
+
+def _wql_string(value: str) -> str:
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def read_sensor_values(identifiers: Optional[Collection[str]] = None, wmi_ohm=None) -> Dict[str, float]:
+    """Returns the current value of every sensor, or just of the given ones, by identifier, with a single WMI query"""
+    wmi_ohm = wmi_ohm or _wmi_get_ohm()
+    if identifiers is None:
+        sensors = wmi_ohm.Sensor()
+    elif not identifiers:
+        return {}
+    else:
+        sensors = wmi_ohm.query('SELECT Identifier, Value FROM Sensor WHERE '
+                                + ' OR '.join(f'Identifier = {_wql_string(identifier)}' for identifier in identifiers))
+    return {sensor.Identifier: sensor.Value for sensor in sensors}
+
+
+def wait_for_openhardwaremonitor(identifiers: Optional[Collection[str]] = None, timeout=READY_TIMEOUT) -> float:
+    """
+    Waits until OHM is ready: as soon as the given sensors report values in two consecutive polls, or once the
+    ones reporting (or the sensors count, when none are given) have settled. Polls on a single WMI connection, with
+    a short backoff, querying just the given sensors. Returns the time waited
+    """
+    identifiers = set(identifiers or ())
+    start = time.monotonic()
+    wmi_ohm = None
+    polled: Union[Set[str], int, None] = None  # Sensors with a value in the previous poll, or the sensors count
+    polled_since = None
+    for attempt in itertools.count():
+        now = time.monotonic()
+        if now - start > timeout:
+            raise HMWMIError('Failed starting OpenHardwareMonitor: WMI timed out')
+        try:
+            if wmi_ohm is None:
+                wmi_ohm = _wmi_get_ohm()
+            if identifiers:
+                current = {identifier for identifier, value in read_sensor_values(identifiers, wmi_ohm).items()
+                           if value is not None}
+                if current == identifiers and current == polled:
+                    break
+            else:
+                current = len(wmi_ohm.query('SELECT Identifier FROM Sensor'))
+            if current != polled:
+                polled, polled_since = current, now
+            elif polled and now - polled_since >= SENSORS_SETTLE_TIME:
+                break
+        except x_wmi:
+            wmi_ohm = None  # The namespace shows up once OHM is running
+        time.sleep(READY_POLL_INTERVALS[min(attempt, len(READY_POLL_INTERVALS) - 1)])
+    elapsed = time.monotonic() - start
+    logger.info(f'OpenHardwareMonitor ready in {elapsed:.2f}s')
+    return elapsed
+
+
+_snapshot: Tuple[float, Dict[str, float]] = (float('-inf'), {})
+
+
+def sensor_snapshot(max_age: float = SNAPSHOT_MAX_AGE) -> Dict[str, float]:
+    """
+    Returns the values of all the sensors by identifier, read again with a single WMI query when older than
+    `max_age`, so all the sensors read in the same pass cost one query
+    """
+    global _snapshot
+    taken, values = _snapshot
+    now = time.monotonic()
+    if now - taken > max_age:
+        try:
+            values = read_sensor_values()
+        except x_wmi as exc:
+            raise HMWMIError(f'Failed reading sensor values: {exc}') from exc
+        _snapshot = (now, values)
+        if snapshot_listeners:
+            timestamp = time.time()
+            for listener in snapshot_listeners:
+                listener(values, timestamp)
+    return values
+
+
+def openhardwaremonitor_start(identifiers: Optional[Collection[str]] = None):
+    """Starts OHM and waits until it's ready, see `wait_for_openhardwaremonitor`"""
     if openhardwaremonitor_exe_path is None:
         raise HMExecError('Cannot run OpenHardwareMonitor: executable path not specified')
     run_dir = Path(openhardwaremonitor_exe_path).parent
     logger.debug('Starting OpenHardwareMonitor...')
     run_as_admin(openhardwaremonitor_exe_path, run_dir=str(run_dir))
-    retry = 60
-    while retry > 0:
-        time.sleep(1)
-        if is_openhardwaremonitor_running():
-            logger.debug('OpenHardwareMonitor started')
-            break
-        retry -= 1
-    else:
-        raise HMWMIError('Failed starting OpenHardwareMonitor: WMI timed out')
+    wait_for_openhardwaremonitor(identifiers)
+
+
+def format_value(value: Optional[float]) -> str:
+    return '-' if value is None else f'{value:.2f}'
 
 
 @dataclass
@@ -120,8 +227,11 @@ class Sensor:
 
     @property
     def value(self):
-        """Get sensor's current value"""
-        return self.wmi_sensor.Value
+        """Get sensor's current value, from the latest snapshot"""
+        try:
+            return sensor_snapshot()[self.identifier]
+        except KeyError as exc:
+            raise HMSensorNotFound('Sensor not found') from exc
 
     @property
     def min(self):
@@ -168,25 +278,26 @@ class Device:
     """List of Sensors attached to the device"""
 
     def __post_init__(self):
-        """Constructor"""
-        self.sensors = list()
-        for sensor in _wmi_get_ohm().Sensor():
-            if sensor.Parent == self.identifier:
-                self.sensors.append(Sensor.from_wmi(sensor))
+        """Constructor, queries the sensors unless given"""
+        if self.sensors is None:
+            self.sensors = [Sensor.from_wmi(sensor) for sensor in _wmi_get_ohm().Sensor()
+                            if sensor.Parent == self.identifier]
         self.sensors.sort(key=lambda s: s.identifier)
 
     @classmethod
-    def from_wmi(cls, device):
-        """Constructor from WMI Device"""
+    def from_wmi(cls, device, wmi_sensors=None):
+        """Constructor from WMI Device, optionally picking its sensors from all the already queried WMI sensors"""
         return cls(
             name=device.Name,
             identifier=device.Identifier,
             hardware_type=device.HardwareType,
             parent=device.Parent,
+            sensors=None if wmi_sensors is None else [Sensor.from_wmi(sensor) for sensor in wmi_sensors
+                                                      if sensor.Parent == device.Identifier],
         )
 
-    def get_info(self):
-        """Function for get device info with a correct format"""
+    def get_info(self, values: Optional[Dict[str, float]] = None):
+        """Function for get device info with a correct format, with the sensor values of a snapshot (default latest)"""
         info_str = f'\n{self.hardware_type}\n' \
                    f'-------------------\n' \
                    f'\t* Name: {self.name}\n' \
@@ -194,16 +305,203 @@ class Device:
         if self.parent:
             info_str += f'\t* Parent: {self.parent}\n'
         if self.sensors:
+            values = sensor_snapshot() if values is None else values
             info_str += '\t* Sensors:\n' \
                         '\t-------------\n' \
                         f'\t\t  {"name":22}\t{"identifier":27}\t{"sensor_type":11}\t{"value"}\n' \
-                      + '\n'.join(f'\t\t- {sens.name:22}\t{sens.identifier:27}\t{sens.sensor_type:11}\t{sens.value:.2f}'
+                      + '\n'.join(f'\t\t- {sens.name:22}\t{sens.identifier:27}\t{sens.sensor_type:11}\t'
+                                  + format_value(values.get(sens.identifier))
                                   for sens in self.sensors)
         info_str += '\n'
 
         return info_str
 
 
+class _Codes:
+    """Small integer codes for repeated strings"""
+
+    def __init__(self, values=()):
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def get(self, value: str) -> Optional[int]:
+        return self._codes.get(value)
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(sys.intern(value))
+        return code
+
+
+class SensorView:
+    """Sensor API over a row of a `SensorCatalog`"""
+
+    __slots__ = ('catalog', 'row')
+
+    def __init__(self, catalog: 'SensorCatalog', row: int):
+        self.catalog = catalog
+        self.row = row
+
+    @property
+    def name(self) -> str:
+        return self.catalog.sensor_names[self.row]
+
+    @property
+    def identifier(self) -> str:
+        return self.catalog.sensor_identifiers[self.row]
+
+    @property
+    def sensor_type(self) -> str:
+        return self.catalog.sensor_types.values[self.catalog.sensor_type_codes[self.row]]
+
+    @property
+    def parent(self) -> str:
+        return self.catalog.device_identifiers[self.catalog.sensor_devices[self.row]]
+
+    @property
+    def index(self) -> int:
+        return self.catalog.sensor_indexes[self.row]
+
+    wmi_sensor = Sensor.wmi_sensor
+    value = Sensor.value
+    min = Sensor.min
+    max = Sensor.max
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(name={self.name!r}, identifier={self.identifier!r}, ' \
+               f'sensor_type={self.sensor_type!r})'
+
+
+class DeviceView:
+    """Device API over a row of a `SensorCatalog`, its sensors are views too"""
+
+    __slots__ = ('catalog', 'row')
+
+    def __init__(self, catalog: 'SensorCatalog', row: int):
+        self.catalog = catalog
+        self.row = row
+
+    @property
+    def name(self) -> str:
+        return self.catalog.device_names[self.row]
+
+    @property
+    def identifier(self) -> str:
+        return self.catalog.device_identifiers[self.row]
+
+    @property
+    def hardware_type(self) -> str:
+        return self.catalog.hardware_types.values[self.catalog.device_type_codes[self.row]]
+
+    @property
+    def parent(self) -> str:
+        return self.catalog.device_parents[self.row]
+
+    @property
+    def sensors(self) -> List[SensorView]:
+        return [SensorView(self.catalog, row)
+                for row in range(self.catalog.sensor_starts[self.row], self.catalog.sensor_starts[self.row + 1])]
+
+    get_info = Device.get_info
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(name={self.name!r}, identifier={self.identifier!r}, ' \
+               f'hardware_type={self.hardware_type!r})'
+
+
+class SensorCatalog:
+    """
+    Columnar catalog of all the devices and sensors: strings are interned, types and parents are small integer codes
+    in arrays, and the sensors of each device are a contiguous range of rows, sorted by identifier.
+    `DeviceView` and `SensorView` objects expose rows with the `Device` and `Sensor` API.
+    """
+
+    def __init__(self):
+        self.hardware_types = _Codes()
+        self.device_names: List[str] = []
+        self.device_identifiers: List[str] = []
+        self.device_type_codes = array('B')
+        self.device_parents: List[str] = []
+        self.sensor_starts = array('I', [0])  # Device row -> first sensor row, with the end as last item
+        self.sensor_types = _Codes()
+        self.sensor_names: List[str] = []
+        self.sensor_identifiers: List[str] = []
+        self.sensor_type_codes = array('B')
+        self.sensor_devices = array('I')  # Sensor row -> parent device row
+        self.sensor_indexes = array('i')
+
+    @classmethod
+    def from_wmi(cls, wmi_devices, wmi_sensors):
+        """Constructor from the WMI query results, sensors not belonging to any of the devices are left out"""
+        return cls.from_columns(
+            devices=[(device.Name, device.Identifier, device.HardwareType, device.Parent) for device in wmi_devices],
+            sensors=[(sensor.Name, sensor.Identifier, sensor.SensorType, sensor.Parent, sensor.Index)
+                     for sensor in wmi_sensors])
+
+    @classmethod
+    def from_columns(cls, devices, sensors):
+        """Constructor from (name, identifier, hardware type, parent) and (name, identifier, type, parent, index)"""
+        catalog = cls()
+        device_rows = {}
+        for name, identifier, hardware_type, parent in devices:
+            device_rows[identifier] = len(catalog.device_names)
+            catalog.device_names.append(sys.intern(name))
+            catalog.device_identifiers.append(sys.intern(identifier))
+            catalog.device_type_codes.append(catalog.hardware_types.code(hardware_type))
+            catalog.device_parents.append(sys.intern(parent or ''))
+        rows = sorted((device_rows[parent], identifier, name, sensor_type, index)
+                      for name, identifier, sensor_type, parent, index in sensors if parent in device_rows)
+        counts = [0] * len(device_rows)
+        for device_row, identifier, name, sensor_type, index in rows:
+            counts[device_row] += 1
+            catalog.sensor_names.append(sys.intern(name))
+            catalog.sensor_identifiers.append(sys.intern(identifier))
+            catalog.sensor_type_codes.append(catalog.sensor_types.code(sensor_type))
+            catalog.sensor_devices.append(device_row)
+            catalog.sensor_indexes.append(-1 if index is None else index)
+        for count in counts:
+            catalog.sensor_starts.append(catalog.sensor_starts[-1] + count)
+        return catalog
+
+    @classmethod
+    def from_dict(cls, data):
+        """Constructor from the `to_dict` representation"""
+        hardware_types, sensor_types = data['hardware_types'], data['sensor_types']
+        parents = data['device_identifiers']
+        return cls.from_columns(
+            devices=zip(data['device_names'], data['device_identifiers'],
+                        (hardware_types[code] for code in data['device_type_codes']), data['device_parents']),
+            sensors=zip(data['sensor_names'], data['sensor_identifiers'],
+                        (sensor_types[code] for code in data['sensor_type_codes']),
+                        (parents[row] for row in data['sensor_devices']), data['sensor_indexes']))
+
+    def to_dict(self):
+        return {
+            'hardware_types': self.hardware_types.values,
+            'device_names': self.device_names,
+            'device_identifiers': self.device_identifiers,
+            'device_type_codes': self.device_type_codes.tolist(),
+            'device_parents': self.device_parents,
+            'sensor_types': self.sensor_types.values,
+            'sensor_names': self.sensor_names,
+            'sensor_identifiers': self.sensor_identifiers,
+            'sensor_type_codes': self.sensor_type_codes.tolist(),
+            'sensor_devices': self.sensor_devices.tolist(),
+            'sensor_indexes': self.sensor_indexes.tolist(),
+        }
+
+    def __len__(self):
+        return len(self.sensor_identifiers)
+
+    def devices(self, *hardware_types: str) -> List[DeviceView]:
+        codes = {self.hardware_types.get(hardware_type) for hardware_type in hardware_types}
+        return [DeviceView(self, row) for row, code in enumerate(self.device_type_codes) if code in codes]
+
+
 @dataclass
 class SystemInfo:
     """Class that represent all the PC's hardware. Also have information about
@@ -218,29 +516,43 @@ class SystemInfo:
     os_architecture: str = ""
     """OS architecture. e.g. x86_64"""
 
-    mainboard: Optional[Union[Device, List[Device]]] = None
+    mainboard: Optional[Union[DeviceView, List[DeviceView]]] = None
     """Mainboard of the computer"""
 
-    superio: Optional[Union[Device, List[Device]]] = None
+    superio: Optional[Union[DeviceView, List[DeviceView]]] = None
     """SuperIO controller(s) of the computer"""
 
-    cpu: Optional[Union[Device, List[Device]]] = None
+    cpu: Optional[Union[DeviceView, List[DeviceView]]] = None
     """Processor(s) of the computer"""
 
-    ram: Optional[Union[Device, List[Device]]] = None
+    ram: Optional[Union[DeviceView, List[DeviceView]]] = None
     """RAM module(s) of the computer"""
 
-    hdd: Optional[Union[Device, List[Device]]] = None
+    hdd: Optional[Union[DeviceView, List[DeviceView]]] = None
     """HardDisk Drives of the computer"""
 
-    gpu: Optional[Union[Device, List[Device]]] = None
+    gpu: Optional[Union[DeviceView, List[DeviceView]]] = None
     """Graphic Processor of the computer (Nvidia or AMD)"""
 
+    catalog: Optional[SensorCatalog] = field(default=None, repr=False)
+    """All the devices and sensors, the device fields are views on it"""
+
+    fingerprint: Optional[str] = field(default=None, repr=False)
+    """Hardware fingerprint when the info was queried"""
+
+    from_cache: bool = field(default=False, repr=False)
+    """Whether the info was loaded from the catalog cache, instead of queried"""
+
     start_ohm: InitVar[bool] = False
     """Init var to start OpenHardwareMonitor"""
 
-    def __post_init__(self, start_ohm):
+    query: InitVar[bool] = True
+    """Init var to query all the info from WMI, otherwise it's given"""
+
+    def __post_init__(self, start_ohm, query):
         """Constructor"""
+        if not query:
+            return
         wmi_ohm = _wmi_get_ohm()
         if not is_openhardwaremonitor_running():
             if not start_ohm:
@@ -250,49 +562,119 @@ class SystemInfo:
         self.name = WMI().Win32_ComputerSystem()[0].Name
         self.os_name = WMI().Win32_OperatingSystem()[0].Caption
         self.os_architecture = WMI().Win32_OperatingSystem()[0].OSArchitecture
-        self.mainboard = self.add_device(wmi_ohm.Hardware(HardwareType="Mainboard"))
-        self.superio = self.add_device(wmi_ohm.Hardware(HardwareType="SuperIO"))
-        self.cpu = self.add_device(wmi_ohm.Hardware(HardwareType="CPU"))
-        self.ram = self.add_device(wmi_ohm.Hardware(HardwareType="RAM"))
-        self.hdd = self.add_device(wmi_ohm.Hardware(HardwareType="HDD"))
-        self.gpu = self.add_device(wmi_ohm.Hardware(HardwareType="GpuNvidia"))
+        self.fingerprint = hardware_fingerprint()
+        self.catalog = SensorCatalog.from_wmi(wmi_ohm.Hardware(), wmi_ohm.Sensor())  # One query for each
+        self.add_devices()
+
+    def add_devices(self):
+        """Sets the device fields from the catalog"""
+        self.mainboard = self.add_device(self.catalog.devices("Mainboard"))
+        self.superio = self.add_device(self.catalog.devices("SuperIO"))
+        self.cpu = self.add_device(self.catalog.devices("CPU"))
+        self.ram = self.add_device(self.catalog.devices("RAM"))
+        self.hdd = self.add_device(self.catalog.devices("HDD"))
+        self.gpu = self.add_device(self.catalog.devices("GpuNvidia"))
         if self.gpu is None:
-            self.gpu = self.add_device(wmi_ohm.Hardware(HardwareType="GpuAti"))
+            self.gpu = self.add_device(self.catalog.devices("GpuAti"))
+
+    @classmethod
+    def from_dict(cls, data, from_cache=False):
+        """Constructor from the `to_dict` representation, without querying WMI"""
+        system_info = cls(name=data['name'], os_name=data['os_name'], os_architecture=data['os_architecture'],
+                          fingerprint=data['fingerprint'], catalog=SensorCatalog.from_dict(data['catalog']),
+                          from_cache=from_cache, query=False)
+        system_info.add_devices()
+        return system_info
+
+    def to_dict(self):
+        return dict(name=self.name, os_name=self.os_name, os_architecture=self.os_architecture,
+                    fingerprint=self.fingerprint, catalog=self.catalog.to_dict())
 
     @staticmethod
-    def add_device(device_query):
+    def add_device(devices: List[DeviceView]):
         """Function for get the Device Object if its only a device, or a list with
         the devices in case of have more of one of the same type.\n
         Returns None if don't have any device of that type"""
-        if len(device_query) > 1:
-            device_list = list()
-            for element in device_query:
-                device = Device.from_wmi(element)
-                device_list.append(device)
-
-        elif len(device_query) == 1:
-            device_list = Device.from_wmi(device_query[0])
-
+        if len(devices) > 1:
+            return devices
+        elif len(devices) == 1:
+            return devices[0]
         else:
-            device_list = None
+            return None
 
-        return device_list
+    def iter_devices(self) -> Iterator[Tuple[str, DeviceView]]:
+        """Yields (category, device) for all the devices, eg. ('gpu', Device(...)) for each of multiple GPUs"""
+        for category in DEVICE_CATEGORIES:
+            devices = getattr(self, category)
+            if devices is None:
+                continue
+            for device in (devices if isinstance(devices, list) else [devices]):
+                yield category, device
 
-    def formatted_devices(self):
-        info_strs = []
-        for device_list in (self.mainboard, self.superio, self.cpu, self.ram, self.gpu, self.hdd):
-            if isinstance(device_list, list):
-                for device in device_list:
-                    info_strs.append(device.get_info())
-            else:
-                info_strs.append(device_list.get_info())
-        return ''.join(info_strs)
+    def has_sensors(self) -> bool:
+        return bool(self.catalog)
 
-    def formatted_info(self):
+    def formatted_devices(self, values: Optional[Dict[str, float]] = None):
+        values = sensor_snapshot() if values is None else values  # A single query for all the devices
+        return ''.join(device.get_info(values) for _, device in self.iter_devices())
+
+    def formatted_header(self):
         return f'{self.name}\n' \
                f'---------------\n' \
-               f'OS: {self.os_name} {self.os_architecture}\n\n' \
-               + self.formatted_devices()
+               f'OS: {self.os_name} {self.os_architecture}\n\n'
+
+    def formatted_info(self):
+        return self.formatted_header() + self.formatted_devices()
+
+    def inventory(self, values: Optional[Dict[str, float]] = None) -> Iterator[dict]:
+        """
+        Yields all the devices (including the ones of no category, eg. a second kind of GPUs), each with its sensors
+        and their values, taken from a single snapshot (default latest), straight from the catalog columns
+        """
+        catalog = self.catalog
+        values = sensor_snapshot() if values is None else values
+        categories = {device.row: category for category, device in self.iter_devices()}
+        hardware_types, sensor_types = catalog.hardware_types.values, catalog.sensor_types.values
+        for row, identifier in enumerate(catalog.device_identifiers):
+            sensors = []
+            for sensor_row in range(catalog.sensor_starts[row], catalog.sensor_starts[row + 1]):
+                sensor_identifier, index = catalog.sensor_identifiers[sensor_row], catalog.sensor_indexes[sensor_row]
+                sensors.append(dict(name=catalog.sensor_names[sensor_row], identifier=sensor_identifier,
+                                    sensor_type=sensor_types[catalog.sensor_type_codes[sensor_row]],
+                                    index=index if index >= 0 else None, value=values.get(sensor_identifier)))
+            yield dict(category=categories.get(row), hardware_type=hardware_types[catalog.device_type_codes[row]],
+                       name=catalog.device_names[row], identifier=identifier,
+                       parent=catalog.device_parents[row] or None, sensors=sensors)
+
+    def write_inventory(self, fp, output_format='text', values: Optional[Dict[str, float]] = None):
+        """
+        Writes all the devices and sensors with their values from a single snapshot, device by device,
+        as the "Show hardware info" text, a JSON document, or CSV rows (one per sensor)
+        """
+        values = sensor_snapshot() if values is None else values
+        if output_format == 'text':
+            fp.write(self.formatted_header())
+            for _, device in self.iter_devices():
+                fp.write(device.get_info(values))
+        elif output_format == 'json':
+            header = json.dumps(dict(name=self.name, os_name=self.os_name, os_architecture=self.os_architecture,
+                                     time=time.time()))
+            fp.write(header[:-1] + ', "devices": [')
+            for number, device in enumerate(self.inventory(values)):
+                fp.write(('\n' if not number else ',\n') + json.dumps(device))
+            fp.write('\n]}\n')
+        elif output_format == 'csv':
+            writer = csv.writer(fp, lineterminator='\n')
+            writer.writerow(INVENTORY_CSV_FIELDS)
+            for device in self.inventory(values):
+                device_fields = [device[key] for key in ('category', 'hardware_type', 'name', 'identifier', 'parent')]
+                if not device['sensors']:  # Empty sensor fields, every row has all the columns
+                    writer.writerow(device_fields + [None] * (len(INVENTORY_CSV_FIELDS) - len(device_fields)))
+                writer.writerows(device_fields + [sensor[key] for key in ('name', 'identifier', 'sensor_type',
+                                                                          'index', 'value')]
+                                 for sensor in device['sensors'])
+        else:
+            raise ValueError(f'Unknown inventory format: {output_format}, accepted: {", ".join(INVENTORY_FORMATS)}')
 
     def print_devices(self):
         logger.info(self.formatted_devices())
@@ -301,6 +683,52 @@ class SystemInfo:
         logger.info(self.formatted_info())
 
 
+def read_catalog_cache(path: str) -> Optional[Tuple[SystemInfo, List[str]]]:
+    """
+    Loads the system info and the identifiers of the sensors in use saved by `write_catalog_cache`,
+    None if missing or unreadable
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as fp:
+            data = json.load(fp)
+        if data.get('version') != CATALOG_CACHE_VERSION:
+            return None
+        return SystemInfo.from_dict(data['system_info'], from_cache=True), list(data.get('bindings', []))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        logger.warning(f'Ignoring unreadable sensor catalog cache {path}: {exc}')
+        return None
+
+
+def write_catalog_cache(path: str, system_info: SystemInfo, bindings: Collection[str] = ()):
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as fp:
+            json.dump({'version': CATALOG_CACHE_VERSION, 'system_info': system_info.to_dict(),
+                       'bindings': sorted(bindings)}, fp)
+        os.replace(temp_path, path)  # Never leaves a partially written cache
+    except OSError as exc:
+        logger.warning(f'Failed writing sensor catalog cache {path}: {exc}')
+
+
+def query_system_info_async(callback: Callable[[SystemInfo], None]) -> Thread:
+    """Queries the system info in a background thread, then calls back with it"""
+    def query():
+        pythoncom.CoInitialize()  # WMI needs COM initialized in each thread
+        try:
+            callback(SystemInfo())
+        except (HardwareMonitorError, x_wmi) as exc:
+            logger.warning(f'Failed querying system info in background: {exc}')
+        finally:
+            pythoncom.CoUninitialize()
+
+    thread = Thread(target=query, name='SystemInfoQuery', daemon=True)
+    thread.start()
+    return thread
+
+
 if __name__ == '__main__':
     logger.setLevel('INFO')
     SystemInfo().print_info()
@@ -1,11 +1,60 @@
+import atexit
 import ctypes
 import logging
+from queue import Queue, Full
+from time import monotonic
+from logging.handlers import QueueHandler, QueueListener
 
 import win32con
 
 
 LOG_FORMAT = '%(asctime)s [%(module)s] %(levelname)s: %(message)s'
 LOG_DATEFORMAT = '%Y-%m-%d %H:%M:%S'
+LOG_QUEUE_SIZE = 1000
+
+RATE_LIMITED = {'rate_limited': True}  # `extra` for repeating hot path messages, eg. logger.debug(..., extra=RATE_LIMITED)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Never blocks the caller: records are dropped (and counted) while the queue is full"""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most one record per `interval` seconds for each call site logging with `RATE_LIMITED`,
+    the following one reports how many were suppressed meanwhile. An interval of 0 disables the limiting.
+    Keyed on the call site rather than the message, which f-strings make different for every value.
+    """
+
+    def __init__(self, interval=0.0):
+        super().__init__()
+        self.interval = interval
+        self._last_emit = {}  # (logger, level, file, line) -> (emit time, suppressed count)
+
+    def filter(self, record):
+        if not self.interval or not getattr(record, 'rate_limited', False):
+            return True
+        now = monotonic()
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        last_time, suppressed = self._last_emit.get(key, (None, 0))
+        if last_time is not None and now - last_time < self.interval:
+            self._last_emit[key] = (last_time, suppressed + 1)
+            return False
+        self._last_emit[key] = (now, 0)
+        if suppressed:
+            record.msg = f'{record.msg} ({suppressed} similar messages suppressed)'
+        return True
+
 
 logger = logging.getLogger('RGBHardwareMonitor')
 logger.setLevel(logging.DEBUG)
@@ -13,17 +62,41 @@ log_formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATEFORMAT)
 
 log_stream_handler = logging.StreamHandler()
 log_stream_handler.setFormatter(log_formatter)
-logger.addHandler(log_stream_handler)
+
+# Records are formatted and written by the listener thread, so slow consoles or disks don't stall the caller
+log_queue = Queue(LOG_QUEUE_SIZE)
+log_queue_handler = BoundedQueueHandler(log_queue)
+log_rate_limit_filter = RateLimitFilter()
+log_queue_handler.addFilter(log_rate_limit_filter)
+logger.addHandler(log_queue_handler)
+log_listener = QueueListener(log_queue, log_stream_handler, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)  # Flushes the queued records
 
 log_file_handler = None
 
 
+def update_logger_level():
+    """Sets the logger level to the most verbose of the handlers, so filtered out records aren't even created"""
+    logger.setLevel(min(handler.level or logging.DEBUG for handler in log_listener.handlers))
+
+
+def set_stream_log_level(log_level):
+    log_stream_handler.setLevel(log_level)
+    update_logger_level()
+
+
 def setup_file_logging(file_path, log_level):
     global log_file_handler, logger, log_formatter
     log_file_handler = logging.FileHandler(file_path)
     log_file_handler.setFormatter(log_formatter)
     log_file_handler.setLevel(log_level)
-    logger.addHandler(log_file_handler)
+    log_listener.handlers = log_listener.handlers + (log_file_handler,)
+    update_logger_level()
+
+
+def set_rate_limit(interval):
+    log_rate_limit_filter.interval = interval
 
 
 def message_popup(msg, title, type=win32con.MB_OK):
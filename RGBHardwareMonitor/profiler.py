@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import atexit
+import threading
+from collections import Counter
+from pathlib import Path
+from threading import Thread, Event
+from typing import Optional, Dict
+
+from .log import logger
+
+
+SAMPLE_INTERVAL = 0.01  # 100Hz, a sample of all the threads stacks takes well under a millisecond
+DUMP_INTERVAL = 60.0
+SUMMARY_TOP = 50
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the stacks of all the other threads (update loop, tray, animations, serial port watcher...).
+    Every `dump_interval` it writes the stacks sampled meanwhile in the folded format of flame graph tools
+    (one `thread;caller;...;function count` line per stack), and rewrites a per-function summary of the whole run.
+    Samples include the time threads spend waiting, eg. in sleeps or serial reads.
+    """
+
+    def __init__(self, output_dir: str, interval=SAMPLE_INTERVAL, dump_interval=DUMP_INTERVAL):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.stacks: Counter = Counter()  # Since the last dump
+        self.total_stacks: Counter = Counter()
+        self.samples = 0
+        self.overhead = 0.0  # Time spent sampling, seconds
+        self.start_time = time.strftime('%Y%m%d_%H%M%S')
+        self._stop = Event()
+        self._thread = Thread(target=self._run, name='SamplingProfiler', daemon=True)
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        next_dump = time.monotonic() + self.dump_interval
+        while not self._stop.wait(self.interval):
+            start = time.perf_counter()
+            self.sample()
+            self.overhead += time.perf_counter() - start
+            if time.monotonic() >= next_dump:
+                self.dump()
+                next_dump = time.monotonic() + self.dump_interval
+        self.dump()
+
+    def sample(self):
+        thread_names: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self._thread.ident:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{Path(code.co_filename).stem}.{code.co_name}')
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, str(ident)))
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def dump(self):
+        if not self.stacks:
+            return
+        stacks_path = os.path.join(self.output_dir, f'profile_{time.strftime("%Y%m%d_%H%M%S")}.folded')
+        with open(stacks_path, 'w', encoding='utf-8') as fp:
+            fp.writelines(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+        self.total_stacks.update(self.stacks)
+        self.stacks.clear()
+        with open(os.path.join(self.output_dir, f'profile_{self.start_time}_summary.txt'), 'w',
+                  encoding='utf-8') as fp:
+            fp.write(self.summary())
+        logger.debug(f'Profile stacks written to {stacks_path}')
+
+    def summary(self) -> str:
+        own, inclusive, threads = Counter(), Counter(), Counter()
+        for stack, count in self.total_stacks.items():
+            thread, *functions = stack.split(';')
+            threads[thread] += count
+            if functions:
+                own[functions[-1]] += count
+            for function in set(functions):
+                inclusive[function] += count
+        lines = [f'{self.samples} samples every {self.interval * 1000:.0f}ms, '
+                 f'sampling overhead {self.overhead / max(self.samples, 1) * 1000:.3f}ms per sample',
+                 '', 'Samples by thread:']
+        lines += [f'  {count:8} {thread}' for thread, count in threads.most_common()]
+        lines += ['', f'Top {SUMMARY_TOP} functions by own samples (own, own %, inclusive, inclusive %):']
+        lines += [f'  {count:8} {count / self.samples:6.1%} {inclusive[function]:8} '
+                  f'{inclusive[function] / self.samples:6.1%}  {function}'
+                  for function, count in own.most_common(SUMMARY_TOP)]
+        return '\n'.join(lines) + '\n'
+
+
+output_dir: Optional[str] = None
+active: Optional[SamplingProfiler] = None
+
+
+def is_running() -> bool:
+    return active is not None
+
+
+def start():
+    global active
+    if active is not None:
+        return
+    active = SamplingProfiler(output_dir or os.getcwd())
+    active.start()
+    logger.info(f'Profiling started, writing to {active.output_dir}')
+
+
+def stop():
+    global active
+    if active is None:
+        return
+    stopping, active = active, None
+    stopping.stop()
+    logger.info(f'Profiling stopped after {stopping.samples} samples')
+
+
+def toggle():
+    if is_running():
+        stop()
+    else:
+        start()
+
+
+atexit.register(stop)  # Writes the last stacks
@@ -0,0 +1,208 @@
+import json
+import math
+from array import array
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Condition
+from time import monotonic
+from typing import Dict, List, Optional, Tuple, Deque
+from urllib.parse import urlsplit, parse_qs
+
+from . import hardware_monitor
+from . import rgb_serial
+from .log import logger, RATE_LIMITED
+from .runtime import quit_event
+
+
+# Local HTTP/1.1 JSON API for external tooling (dashboards, scripts), answered from the snapshots the update loop
+# already takes, so polling it never adds WMI queries or slows down the serial updates:
+#   GET /sensors[?id=...&id=...][&prefix=/intelcpu/0/]  latest sensor values
+#   GET /rings                                          latest raw values sent for each ring
+#   GET /history?id=...[&seconds=30]                    values of the given sensors over the last seconds
+#   GET /metrics                                        command pipeline, alarms, fault recovery, firmware telemetry
+#   GET /stream[?id=...]                                server-sent events, pushing the values as they change
+QUERY_API_PORT = 9556
+HISTORY_SECONDS = 60.0
+STREAM_KEEPALIVE = 15.0  # Comment lines sent while nothing changes, so clients notice a dropped connection
+
+
+class SnapshotHistory:
+    """
+    Keeps the latest snapshot, and the ones of the last `seconds`: compactly, with the values in an array
+    and the identifiers tuple shared among consecutive snapshots of the same sensors
+    """
+
+    def __init__(self, seconds: float = HISTORY_SECONDS):
+        self.seconds = seconds
+        self.snapshots: Deque[Tuple[float, Tuple[str, ...], array]] = deque()
+        self.latest: Tuple[float, Dict[str, float]] = (0.0, {})
+        self.tick = 0
+        self.changed = Condition()
+
+    def record(self, values: Dict[str, float], timestamp: float):
+        identifiers = tuple(values)
+        if self.snapshots and self.snapshots[-1][1] == identifiers:
+            identifiers = self.snapshots[-1][1]
+        packed = array('d', (math.nan if value is None else value for value in values.values()))
+        with self.changed:
+            self.snapshots.append((timestamp, identifiers, packed))
+            while self.snapshots[0][0] < timestamp - self.seconds:
+                self.snapshots.popleft()
+            self.latest = (timestamp, values)
+            self.tick += 1
+            self.changed.notify_all()
+
+    def window(self, identifiers: List[str], seconds: float) -> Dict[str, List[Tuple[float, Optional[float]]]]:
+        """Returns the (time, value) pairs of the given sensors over the last `seconds`"""
+        with self.changed:
+            snapshots = list(self.snapshots)
+        series: Dict[str, List[Tuple[float, Optional[float]]]] = {identifier: [] for identifier in identifiers}
+        if not snapshots:
+            return series
+        start = snapshots[-1][0] - seconds
+        indexed, positions = None, {}
+        for timestamp, snapshot_identifiers, values in snapshots:
+            if timestamp < start:
+                continue
+            if snapshot_identifiers is not indexed:
+                indexed = snapshot_identifiers
+                positions = {identifier: position for position, identifier in enumerate(indexed)}
+            for identifier in identifiers:
+                position = positions.get(identifier)
+                if position is not None:
+                    value = values[position]
+                    series[identifier].append((timestamp, None if math.isnan(value) else value))
+        return series
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive connections
+    disable_nagle_algorithm = True  # Or each response waits for the delayed ACK of its headers, ~40ms
+    server: 'QueryServer'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        path = url.path.rstrip('/')
+        if path == '/stream':
+            self.stream(query)
+            return
+        route = ROUTES.get(path)
+        if route is None:
+            self.send_json({'error': f'Unknown endpoint {url.path}, available: {", ".join(ROUTES)}, /stream'}, 404)
+            return
+        try:
+            data = route(self.server.history, query)
+        except ValueError as exc:
+            self.send_json({'error': str(exc)}, 400)
+        else:
+            self.send_json(data)
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, query):
+        """Pushes the values that changed with each snapshot as server-sent events, until the client disconnects"""
+        history = self.server.history
+        identifiers = set(query.get('id', ())) or None
+        self.close_connection = True  # Streamed until closed
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        sent: Dict[str, float] = {}
+        tick = None
+        try:
+            while not quit_event.is_set():
+                with history.changed:
+                    if not history.changed.wait_for(lambda: history.tick != tick, timeout=STREAM_KEEPALIVE):
+                        self.wfile.write(b': keep-alive\n\n')
+                        continue
+                    tick, (timestamp, values) = history.tick, history.latest
+                changed = {identifier: value for identifier, value in values.items()
+                           if (identifiers is None or identifier in identifiers)
+                           and (identifier not in sent or sent[identifier] != value)}
+                if changed:
+                    sent.update(changed)
+                    event = json.dumps({'time': timestamp, 'values': changed}, separators=(',', ':'))
+                    self.wfile.write(f'id: {tick}\ndata: {event}\n\n'.encode('utf-8'))
+        except OSError:  # Client gone
+            pass
+
+    def log_message(self, format, *args):
+        logger.debug('Query API: ' + format, *args, extra=RATE_LIMITED)
+
+
+def query_float(query, name: str, default: float) -> float:
+    try:
+        return float(query[name][0]) if name in query else default
+    except ValueError as exc:
+        raise ValueError(f'Invalid {name}: {query[name][0]}') from exc
+
+
+def get_sensors(history: SnapshotHistory, query):
+    timestamp, values = history.latest
+    identifiers, prefix = query.get('id'), query.get('prefix', [''])[0]
+    if identifiers is not None:
+        values = {identifier: values[identifier] for identifier in identifiers if identifier in values}
+    if prefix:
+        values = {identifier: value for identifier, value in values.items() if identifier.startswith(prefix)}
+    return {'time': timestamp, 'values': values}
+
+
+def get_rings(history: SnapshotHistory, query):
+    now = monotonic()
+    rings = []
+    for ring in rgb_serial.rings:
+        sample = ring.history[-1] if ring.history else None
+        rings.append({
+            'id': ring.id, 'name': ring.name,
+            'raw_values': list(sample.raw_values) if sample is not None else None,
+            'age': now - sample.time if sample is not None else None,
+            'alarm': ring.alarm,
+            'sensors': {kind: str(spec) for kind, spec in zip(('temp', 'load', 'fan'), ring.sensor_specs)},
+        })
+    return rings
+
+
+def get_history(history: SnapshotHistory, query):
+    if 'id' not in query:
+        raise ValueError('Missing sensor id, eg. /history?id=/intelcpu/0/temperature/0')
+    seconds = min(query_float(query, 'seconds', history.seconds), history.seconds)
+    return history.window(query['id'], seconds)
+
+
+def get_metrics(history: SnapshotHistory, query):
+    timestamp, values = history.latest
+    return {
+        'snapshots': {'tick': history.tick, 'time': timestamp, 'sensors': len(values),
+                      'history_length': len(history.snapshots)},
+        'pipeline': dict(rgb_serial.pipeline_stats),
+        'alarms': rgb_serial.alarm_metrics,
+        'faults': rgb_serial.fault_metrics,
+        'telemetry': dict(rgb_serial.telemetry),
+    }
+
+
+ROUTES = {'/sensors': get_sensors, '/rings': get_rings, '/history': get_history, '/metrics': get_metrics}
+
+
+class QueryServer(ThreadingHTTPServer):
+    """Serves the query API on localhost, in a daemon thread (and one per connection)"""
+    daemon_threads = True
+
+    def __init__(self, port: int = QUERY_API_PORT, address: str = '127.0.0.1', history_seconds=HISTORY_SECONDS):
+        super().__init__((address, port), QueryHandler)
+        self.history = SnapshotHistory(history_seconds)
+        hardware_monitor.snapshot_listeners.append(self.history.record)
+        self.thread = Thread(target=self.serve_forever, name='QueryServer', daemon=True)
+        self.thread.start()
+        logger.info(f'Query API listening on http://{address}:{self.server_address[1]}/')
+
+
+server: Optional[QueryServer] = None
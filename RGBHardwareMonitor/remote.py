@@ -0,0 +1,338 @@
+import math
+import socket
+import struct
+import zlib
+from time import monotonic
+from threading import Thread, Event
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Tuple, Iterator
+
+from wmi import x_wmi
+
+from .log import logger, RATE_LIMITED
+from .runtime import quit_event
+from .hardware_monitor import (SystemInfo, Sensor, read_sensor_values, HardwareMonitorError, HMSensorNotFound,
+                               HMNoDeviceError, HMStaleSensorError)
+
+
+# Agents send UDP datagrams: the sensors catalog (device category, name, identifier, type and parent of each sensor)
+# at startup and then periodically, in chunks that fit a datagram, while each tick only sends the values as float32,
+# in catalog order, tagged with the catalog's CRC32. A few hundred sensors fit a single values datagram.
+REMOTE_PORT = 9555
+MAGIC = b'RGBS'
+PROTOCOL_VERSION = 1
+KIND_CATALOG = 1
+KIND_VALUES = 2
+HEADER = struct.Struct('!4sBBId')  # Magic, version, kind, catalog CRC32, agent timestamp; followed by the agent name
+CHUNK = struct.Struct('!IHH')  # Sequence number (values only), first entry index, total entries
+MAX_DATAGRAM = 1400  # Fits an ethernet frame, a lost IP fragment would drop the whole datagram
+CATALOG_FIELDS = 5
+CATALOG_INTERVAL = 5.0  # Agents resend the catalog periodically, so listeners (re)started later pick it up
+AGENT_RETRY_INTERVAL = 5.0
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    device: str  # SystemInfo device category, eg. cpu
+    name: str
+    identifier: str
+    sensor_type: str
+    parent: str
+
+
+def _pack_str(value: str) -> bytes:
+    data = value.encode('utf-8')[:255]
+    return bytes((len(data),)) + data
+
+
+def _unpack_str(data: bytes, offset: int) -> Tuple[str, int]:
+    length = data[offset]
+    end = offset + 1 + length
+    if end > len(data):
+        raise ValueError('Truncated string')
+    return data[offset + 1:end].decode('utf-8', errors='replace'), end
+
+
+def _header(kind: int, name: str, catalog_id: int) -> bytes:
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, kind, catalog_id, monotonic()) + _pack_str(name)
+
+
+def catalog_id_for(entries: List[CatalogEntry]) -> int:
+    return zlib.crc32(b''.join(_pack_str(value) for entry in entries
+                               for value in (entry.device, entry.name, entry.identifier,
+                                             entry.sensor_type, entry.parent)))
+
+
+def encode_catalog(name: str, catalog_id: int, entries: List[CatalogEntry]) -> Iterator[bytes]:
+    header = _header(KIND_CATALOG, name, catalog_id)
+    first, chunk = 0, b''
+    for index, entry in enumerate(entries):
+        packed = b''.join(_pack_str(value) for value in (entry.device, entry.name, entry.identifier,
+                                                         entry.sensor_type, entry.parent))
+        if chunk and len(header) + CHUNK.size + len(chunk) + len(packed) > MAX_DATAGRAM:
+            yield header + CHUNK.pack(0, first, len(entries)) + chunk
+            first, chunk = index, b''
+        chunk += packed
+    yield header + CHUNK.pack(0, first, len(entries)) + chunk
+
+
+def encode_values(name: str, catalog_id: int, seq: int, values: List[float]) -> Iterator[bytes]:
+    header = _header(KIND_VALUES, name, catalog_id)
+    per_datagram = (MAX_DATAGRAM - len(header) - CHUNK.size) // 4
+    for first in range(0, max(len(values), 1), per_datagram):
+        chunk = values[first:first + per_datagram]
+        yield header + CHUNK.pack(seq, first, len(values)) + struct.pack(f'!{len(chunk)}f', *chunk)
+
+
+def decode(data: bytes):
+    """Returns (kind, agent name, catalog id, sequence number, first index, total, items) for a datagram"""
+    magic, version, kind, catalog_id, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or version != PROTOCOL_VERSION:
+        raise ValueError(f'Unsupported datagram (magic: {magic!r}, version: {version})')
+    name, offset = _unpack_str(data, HEADER.size)
+    seq, first, total = CHUNK.unpack_from(data, offset)
+    offset += CHUNK.size
+    if kind == KIND_VALUES:
+        count = (len(data) - offset) // 4
+        items = struct.unpack_from(f'!{count}f', data, offset)
+    elif kind == KIND_CATALOG:
+        items = []
+        while offset < len(data):
+            fields = []
+            for _ in range(CATALOG_FIELDS):
+                value, offset = _unpack_str(data, offset)
+                fields.append(value)
+            items.append(CatalogEntry(*fields))
+    else:
+        raise ValueError(f'Unknown datagram kind: {kind}')
+    if first + len(items) > total:
+        raise ValueError('Chunk out of bounds')
+    return kind, name, catalog_id, seq, first, total, items
+
+
+class SensorAgent:
+    """Publishes this machine's sensors to a listener, one batch of values per interval"""
+
+    def __init__(self, target: Tuple[str, int], name: Optional[str] = None, interval: float = 1.0):
+        self.target = target
+        self.name = name or socket.gethostname()
+        self.interval = interval
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.entries: List[CatalogEntry] = []
+        self.catalog_id: Optional[int] = None
+        self.catalog_sent = 0.0
+        self.seq = 0
+
+    def build_catalog(self):
+        system_info = SystemInfo(start_ohm=True)
+        self.entries = [CatalogEntry(device=category, name=sensor.name, identifier=sensor.identifier,
+                                     sensor_type=sensor.sensor_type, parent=sensor.parent)
+                        for category, device in system_info.iter_devices() for sensor in device.sensors]
+        self.catalog_id = catalog_id_for(self.entries)
+        self.catalog_sent = 0.0
+        logger.info(f'Sensor agent "{self.name}" publishing {len(self.entries)} sensors to {self.target[0]}:{self.target[1]}')
+
+    def send(self, datagrams: Iterator[bytes]):
+        for datagram in datagrams:
+            self.socket.sendto(datagram, self.target)
+
+    def publish(self):
+        now = monotonic()
+        if now - self.catalog_sent >= CATALOG_INTERVAL:
+            self.send(encode_catalog(self.name, self.catalog_id, self.entries))
+            self.catalog_sent = now
+        readings = read_sensor_values()  # One WMI query for all the sensors
+        values = [readings.get(entry.identifier) for entry in self.entries]
+        values = [math.nan if value is None else value for value in values]
+        self.send(encode_values(self.name, self.catalog_id, self.seq, values))
+        self.seq = (self.seq + 1) % 2**32
+
+    def run(self):
+        while not quit_event.is_set():
+            start = monotonic()
+            try:
+                if self.catalog_id is None:
+                    self.build_catalog()
+                self.publish()
+            except (HardwareMonitorError, x_wmi) as exc:
+                logger.warning(f'Sensor agent error: {exc}. Retrying in {AGENT_RETRY_INTERVAL}s')
+                self.catalog_id = None  # OHM could have restarted with different hardware
+                quit_event.wait(AGENT_RETRY_INTERVAL)
+                continue
+            except OSError as exc:
+                logger.warning('Sensor agent send failed: %s', exc, extra=RATE_LIMITED)
+            quit_event.wait(max(0.0, self.interval - (monotonic() - start)))
+
+
+@dataclass
+class RemoteSensor(Sensor):
+    """A sensor of a remote machine, its value is the latest one received from the agent"""
+
+    source: 'RemoteSource' = field(default=None, repr=False, compare=False)
+
+    @property
+    def wmi_sensor(self):
+        raise HMSensorNotFound('Remote sensors are not available through WMI')
+
+    @property
+    def value(self):
+        return self.source.value(self.identifier)
+
+
+class RemoteSource:
+    """State of the sensors received from an agent"""
+
+    def __init__(self, name: str, address: str, stale_timeout: float):
+        self.name = name
+        self.address = address
+        self.stale_timeout = stale_timeout
+        self.catalog_id: Optional[int] = None
+        self.entries: List[CatalogEntry] = []
+        self.positions: Dict[str, int] = {}
+        self.values: List[float] = []
+        self.received: Optional[float] = None  # Time of the last values received
+        self.seq: Optional[int] = None
+        self.lost = 0  # Values batches lost, from sequence number gaps
+        self.stale = False
+        self._pending: Dict[int, List[Optional[CatalogEntry]]] = {}  # Catalogs being assembled, by id
+
+    def add_catalog_chunk(self, catalog_id: int, first: int, total: int, entries: List[CatalogEntry]):
+        if catalog_id == self.catalog_id:
+            return
+        pending = self._pending.setdefault(catalog_id, [None] * total)
+        if len(pending) != total:
+            return
+        pending[first:first + len(entries)] = entries
+        if all(entry is not None for entry in pending):
+            self._pending.clear()
+            self.positions = {entry.identifier: index for index, entry in enumerate(pending)}
+            self.values = [math.nan] * total
+            self.entries = pending
+            self.catalog_id = catalog_id
+            logger.info(f'Received catalog of {total} sensors from remote agent "{self.name}" ({self.address})')
+
+    def add_values_chunk(self, catalog_id: int, seq: int, first: int, total: int, values: List[float]):
+        if catalog_id != self.catalog_id or total != len(self.values):
+            return  # Waiting for the current catalog
+        if first == 0 and self.seq is not None:
+            self.lost += (seq - self.seq - 1) % 2**32
+        if first == 0:
+            self.seq = seq
+        self.values[first:first + len(values)] = values
+        self.received = monotonic()
+
+    def age(self) -> Optional[float]:
+        return None if self.received is None else monotonic() - self.received
+
+    def is_stale(self) -> bool:
+        age = self.age()
+        return age is None or age > self.stale_timeout
+
+    def value(self, identifier: str) -> float:
+        if self.is_stale():
+            raise HMStaleSensorError(f'No sensor values received from remote agent "{self.name}" '
+                                     f'in the last {self.stale_timeout}s')
+        try:
+            value = self.values[self.positions[identifier]]
+        except KeyError as exc:
+            raise HMSensorNotFound(f'Sensor not found on remote agent "{self.name}": {identifier}') from exc
+        if math.isnan(value):
+            raise HMSensorNotFound(f'No value for sensor on remote agent "{self.name}": {identifier}')
+        return value
+
+    def sensors(self, device: str) -> List[RemoteSensor]:
+        return [RemoteSensor(name=entry.name, identifier=entry.identifier, sensor_type=entry.sensor_type,
+                             parent=entry.parent, index=index, source=self)
+                for index, entry in enumerate(self.entries) if entry.device == device]
+
+
+class RemoteSensorListener:
+    """Receives sensors from remote agents, in a daemon thread"""
+
+    def __init__(self, port: int = REMOTE_PORT, address: str = '', stale_timeout: float = 5.0):
+        self.stale_timeout = stale_timeout
+        self.sources: Dict[str, RemoteSource] = {}  # By lowercase agent name
+        self.catalog_event = Event()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((address, port))
+        self.socket.settimeout(0.5)
+        self.thread = Thread(target=self._run, name='RemoteSensorListener', daemon=True)
+        self.thread.start()
+        logger.debug(f'Listening for remote sensors on UDP port {port}')
+
+    def _run(self):
+        while not quit_event.is_set():
+            try:
+                data, (address, _) = self.socket.recvfrom(65535)
+            except socket.timeout:
+                pass
+            except OSError as exc:
+                logger.warning('Remote sensors receive failed: %s', exc, extra=RATE_LIMITED)
+            else:
+                self.handle(data, address)
+            self.check_stale()
+
+    def handle(self, data: bytes, address: str):
+        try:
+            kind, name, catalog_id, seq, first, total, items = decode(data)
+        except (ValueError, struct.error) as exc:
+            logger.debug('Invalid remote sensors datagram from %s: %s', address, exc, extra=RATE_LIMITED)
+            return
+        source = self.sources.get(name.lower())
+        if source is None:
+            source = self.sources[name.lower()] = RemoteSource(name, address, self.stale_timeout)
+        source.address = address
+        if kind == KIND_CATALOG:
+            had_catalog = source.catalog_id
+            source.add_catalog_chunk(catalog_id, first, total, items)
+            if source.catalog_id != had_catalog:
+                self.catalog_event.set()
+        else:
+            source.add_values_chunk(catalog_id, seq, first, total, items)
+
+    def check_stale(self):
+        for source in self.sources.values():
+            stale = source.received is not None and source.is_stale()
+            if stale and not source.stale:
+                logger.warning(f'Remote agent "{source.name}" stopped sending sensor values '
+                               f'(lost batches so far: {source.lost})')
+            elif source.stale and not stale:
+                logger.info(f'Remote agent "{source.name}" is sending sensor values again')
+            source.stale = stale
+
+    def find_source(self, host: str) -> Optional[RemoteSource]:
+        source = self.sources.get(host.lower())
+        if source is not None:
+            return source
+        try:
+            address = socket.gethostbyname(host)
+        except OSError:
+            return None
+        # Copied, the listener thread adds the sources of new agents meanwhile
+        return next((source for source in list(self.sources.values()) if source.address == address), None)
+
+    def sensors(self, host: str, device: str, timeout: Optional[float] = None) -> List[RemoteSensor]:
+        """
+        Sensors of the device category from the agent named or addressed `host`, waits for its catalog
+        (default for two catalog intervals, 0 to raise right away if it wasn't received yet)
+        """
+        deadline = monotonic() + (2 * CATALOG_INTERVAL if timeout is None else timeout)
+        while True:
+            source = self.find_source(host)
+            if source is not None and source.catalog_id is not None:
+                return source.sensors(device)
+            remaining = deadline - monotonic()
+            if remaining <= 0 or quit_event.is_set():
+                raise HMNoDeviceError(f'No sensors catalog received from remote agent "{host}"')
+            self.catalog_event.clear()
+            self.catalog_event.wait(min(remaining, 0.5))
+
+
+listener: Optional[RemoteSensorListener] = None
+
+
+def parse_address(value: str, default_port: int = REMOTE_PORT) -> Tuple[str, int]:
+    host, _, port = value.rpartition(':')
+    if not host:
+        return port, default_port
+    return host, int(port)
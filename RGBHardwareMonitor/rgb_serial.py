@@ -1,63 +1,288 @@
-from time import sleep
-from dataclasses import dataclass
-from typing import Mapping, ClassVar, List, Optional, Union
+import os
+import re
+from fnmatch import fnmatchcase
+from time import sleep, monotonic
+from threading import Thread, Event, Lock
+from dataclasses import dataclass, field
+from itertools import islice
+from collections import OrderedDict, deque
+from typing import Mapping, ClassVar, List, Optional, Union, Tuple, Dict, Deque, Set
 
 import serial
 from serial import SerialException
 from serial.tools import list_ports
 
-from .log import logger
+from . import remote
+from .log import logger, RATE_LIMITED
 from .runtime import quit_event, pause_event
-from .hardware_monitor import SystemInfo, Sensor, HMNoSensorsError, HMSensorNotFound, HMNoDeviceError
+from .hardware_monitor import (DEVICE_CATEGORIES, SystemInfo, Sensor, HardwareMonitorError, HMNoSensorsError,
+                               HMSensorNotFound, HMNoDeviceError, HMStaleSensorError, is_openhardwaremonitor_running,
+                               hardware_fingerprint, sensor_snapshot, read_catalog_cache, write_catalog_cache,
+                               query_system_info_async)
 from .systray import WaitIconAnimation, RunningIconAnimation
 
 
 arduino_id = None
+arduino_port = None  # Explicit serial port, bypasses the VID:PID lookup (eg. for the firmware host harness pty)
 
 RAW_MIN = 0
 RAW_MAX = 255
 
+HANDSHAKE_GREETING = 'EHLO RGBHardwareMonitor'
+SERIAL_BAUD = 115200  # Safe rate, the arduino always starts with it
+BAUD_CONFIRM_TIMEOUT = 2.0  # After which the firmware reverts an unconfirmed baud rate
+BAUD_MIN_GAIN = 1.2  # Throughput gain over the safe rate a higher baud rate must measure to be kept
+RESET_DELAY = 0.5  # Before the first handshake attempt, the bootloader runs right after opening the port
+HANDSHAKE_TIMEOUT = 4.0
+HANDSHAKE_RETRY_INTERVAL = 0.25
+FIRMWARE_LOG_LEVELS = {'none': 0, 'error': 1, 'debug': 2}
+MIN_UPDATE_INTERVAL = 0.1
+FPS_PROBE_INTERVAL = 1.0  # Between fps queries while the firmware, just booted, hasn't measured it yet
+SEQ_MODULO = 256
+THROUGHPUT_PAYLOAD = 512  # Bytes sent to measure the serial throughput, long enough to time the transfer, not latency
+THROUGHPUT_WINDOW = 2  # Padded commands in flight while measuring it, within the arduino's 64 bytes receive buffer
+HISTORY_LENGTH = 4  # Samples kept per ring to estimate how fast values change
+ADAPTIVE_RAW_STEP = 2  # Adaptive polling aims to sample again when values moved by about this many raw units
+FAULT_RETRY_MIN = 0.5  # Backoff between recovery attempts of a failed sensor spec
+FAULT_RETRY_MAX = 10.0
+CATALOG_RELOAD_INTERVAL = 5.0  # Minimum interval between catalog queries to bind missing sensors again
+
+
+class HMSensorCountMismatch(HMSensorNotFound):
+    """The sensors matching a wmean spec don't fit its weights, eg. after a device was gone or added"""
+
+
+# Faults scoped to a single sensor spec, that are recovered while the other rings keep updating
+SENSOR_FAULTS = (HMSensorNotFound, HMNoSensorsError, HMNoDeviceError, HMStaleSensorError)
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Linearly interpolated percentile of the values"""
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+AGGREGATES = {
+    'max': lambda values, weights: max(values),
+    'min': lambda values, weights: min(values),
+    'mean': lambda values, weights: sum(values) / len(values),
+    'wmean': lambda values, weights: sum(v * w for v, w in zip(values, weights)) / sum(weights),
+}
+
 
 @dataclass
 class SensorSpec:
-    device: str
-    filters: Mapping[str, str]
+    device: str  # Device category, or comma separated categories, eg. gpu or cpu, nas:cpu
+    filters: Mapping[str, str]  # Exact values or glob patterns, eg. CPU Core #*
     min: float = 0.0
     max: float = 100.0
+    alarm_threshold: Optional[float] = None  # Values at or above it trigger an immediate update of the ring
+    aggregate: Optional[str] = None  # max, min, mean, wmean or pNN (percentile) of all the matching sensors
+    weights: Optional[List[float]] = None  # For wmean, in the matching sensors order
 
     sensor: Sensor = None
+    sensors: List[Sensor] = field(default_factory=list, repr=False)  # All the matching sensors, if aggregating
+    failed_since: Optional[float] = field(default=None, repr=False, compare=False)
+    retry_time: float = field(default=0.0, repr=False, compare=False)
+    retry_delay: float = field(default=FAULT_RETRY_MIN, repr=False, compare=False)
 
     system_info: ClassVar[SystemInfo] = None
+    system_info_time: ClassVar[float] = float('-inf')  # When the catalog was loaded
+    catalog_bindings: ClassVar[List[str]] = []  # Local sensors used by the rings, as cached with the catalog
 
     def __post_init__(self):
-        if self.__class__.system_info is None:
-            self.__class__.system_info = SystemInfo(start_ohm=True)
+        if self.aggregate is not None:
+            self.check_aggregate()
         try:
-            sensors = getattr(self.__class__.system_info, self.device).sensors
-        except AttributeError:
-            raise HMNoDeviceError(f'Device not found: {self.device}')
+            self.resolve()
+        except HMSensorCountMismatch as exc:  # Weights not matching the configured sensors
+            raise ValueError(str(exc)) from exc
+        except SENSOR_FAULTS as exc:  # The other rings start anyway, this spec is bound later by `recover`
+            self.fail(exc)
+
+    def resolve(self, wait_remote=True):
+        """
+        Binds the spec to the matching sensor(s), querying the catalog again if they're gone from it.
+        Remote devices wait for their agent's catalog only if `wait_remote`, eg. not while the rings are updating
+        """
+        sensors, matching = self.find_sensors(wait_remote)
+        if self.catalog_reload_due() and not self.bound_sensors_present(matching):
+            logger.info('Sensors catalog is out of date, querying OpenHardwareMonitor')
+            self.load_system_info(use_cache=False)
+            sensors, matching = self.find_sensors(wait_remote)
         if not sensors:
             raise HMNoSensorsError('No sensors available from hardware monitor')
-        for sensor in sensors:
-            for f_attr, f_val in self.filters.items():
-                if getattr(sensor, f_attr) != f_val:  # if any filter fails, break loop
-                    break
-            else:  # didn't break loop, so all filters matched for sensor
-                self.sensor = sensor
-                break
-        else:
+        if not matching:
             raise HMSensorNotFound(f'Sensor not found (device: {self.device}, filters: {str(self.filters)})')
+        if self.aggregate == 'wmean' and len(self.weights) != len(matching):
+            raise HMSensorCountMismatch(f'Aggregate wmean needs one weight for each of the {len(matching)} '
+                                        f'matching sensors (device: {self.device}, filters: {str(self.filters)})')
+        self.sensor = matching[0]
+        if self.aggregate is not None:
+            self.sensors = matching
+
+    def __str__(self):
+        return f'{self.device} {dict(self.filters)}'
+
+    def read(self):
+        """Returns the value, a failure marks the spec as failed until `recover` succeeds"""
+        try:
+            return self.value
+        except SENSOR_FAULTS as exc:
+            self.fail(exc)
+            raise
+
+    def fail(self, exc):
+        now = monotonic()
+        if self.failed_since is None:
+            logger.warning(f'Sensor {self} failed: {exc}')
+            self.failed_since = now
+            self.retry_delay = FAULT_RETRY_MIN
+        self.retry_time = now + self.retry_delay
+        self.retry_delay = min(FAULT_RETRY_MAX, 2 * self.retry_delay)
+
+    def recover(self, now=None) -> bool:
+        """Whether the spec can be read. A failed one is retried when due, binding its sensor(s) again if missing"""
+        if self.failed_since is None:
+            return True
+        if (monotonic() if now is None else now) < self.retry_time:
+            return False
+        try:
+            try:
+                if self.sensor is None:
+                    raise HMSensorNotFound('Sensor not bound yet')
+                self.value
+            except HMSensorNotFound:
+                self.resolve(wait_remote=False)  # An offline agent must not stall the other rings
+                self.value
+        except SENSOR_FAULTS as exc:
+            self.fail(exc)
+            return False
+        record_recovery('sensor', monotonic() - self.failed_since)
+        logger.info(f'Sensor {self} recovered after {monotonic() - self.failed_since:.2f}s')
+        self.failed_since = None
+        return True
+
+    @classmethod
+    def load_system_info(cls, use_cache=True) -> SystemInfo:
+        """
+        Loads the sensors catalog from the on-disk cache when available, otherwise queries it (and caches it).
+        A cache from different hardware is still used, if the sensors bound by the specs are there, while it's
+        refreshed in background.
+        """
+        start = monotonic()
+        if use_cache and catalog_cache_path and is_openhardwaremonitor_running():
+            cached = read_catalog_cache(catalog_cache_path)
+            if cached is not None:
+                system_info, cls.catalog_bindings = cached
+                if system_info.fingerprint == hardware_fingerprint():
+                    logger.debug(f'Sensors catalog loaded from cache in {(monotonic() - start) * 1000:.1f}ms')
+                else:
+                    logger.info('Hardware changed since the sensors catalog was cached, refreshing it in background')
+                    query_system_info_async(cls.refreshed_system_info)
+                cls.system_info = system_info
+                cls.system_info_time = monotonic()
+                return system_info
+        cls.system_info = SystemInfo(start_ohm=True)
+        cls.system_info_time = monotonic()
+        logger.debug(f'Sensors catalog queried from OpenHardwareMonitor in {monotonic() - start:.2f}s')
+        if catalog_cache_path and cls.system_info.has_sensors():
+            write_catalog_cache(catalog_cache_path, cls.system_info, cls.catalog_bindings)
+        return cls.system_info
+
+    @classmethod
+    def refreshed_system_info(cls, system_info: SystemInfo):
+        if system_info.has_sensors():
+            write_catalog_cache(catalog_cache_path, system_info, cls.catalog_bindings)
+            cls.system_info = system_info  # The resolved specs keep their sensors, that are still there
+            cls.system_info_time = monotonic()
+
+    @classmethod
+    def catalog_reload_due(cls) -> bool:
+        """A cached catalog is checked right away, a queried one is queried again at most every few seconds"""
+        system_info = cls.system_info
+        return system_info is not None and (system_info.from_cache
+                                            or monotonic() - cls.system_info_time >= CATALOG_RELOAD_INTERVAL)
+
+    @staticmethod
+    def bound_sensors_present(sensors: List[Sensor]) -> bool:
+        """Cheap check of a catalog: whether the local sensors are in the current snapshot"""
+        if not sensors:
+            return False
+        snapshot = sensor_snapshot()  # Shared by all the specs resolved together
+        return all(sensor.identifier in snapshot for sensor in sensors if not isinstance(sensor, remote.RemoteSensor))
+
+    def find_sensors(self, wait_remote=True) -> Tuple[List[Sensor], List[Sensor]]:
+        """Returns all the sensors of the device(s) and the ones matching the filters"""
+        sensors = self.device_sensors(wait_remote)
+        return sensors, [sensor for sensor in sensors if self.matches(sensor)]
+
+    def matches(self, sensor: Sensor) -> bool:
+        return all(getattr(sensor, f_attr) == f_val or fnmatchcase(getattr(sensor, f_attr), f_val)
+                   for f_attr, f_val in self.filters.items())
+
+    def check_aggregate(self):
+        """Validates the aggregate config, the weights count is checked against the sensors by `resolve`"""
+        if self.aggregate not in AGGREGATES and not re.fullmatch(r'p\d+(\.\d+)?', self.aggregate):
+            raise ValueError(f'Unknown sensors aggregate function: {self.aggregate}')
+        if self.aggregate.startswith('p') and not 0 <= float(self.aggregate[1:]) <= 100:
+            raise ValueError(f'Percentile out of range: {self.aggregate}')
+        if self.aggregate == 'wmean' and not self.weights:
+            raise ValueError(f'Aggregate wmean needs weights (device: {self.device}, filters: {str(self.filters)})')
+
+    def device_sensors(self, wait_remote=True) -> List[Sensor]:
+        sensors = []
+        for device in self.device.split(','):
+            device = device.strip().lower()
+            if ':' in device:  # Remote device, eg. nas:cpu
+                host, device = device.rsplit(':', 1)
+                if remote.listener is None:
+                    raise HMNoDeviceError(f'Remote device {self.device} requires remote_sensors_port to be configured')
+                sensors += remote.listener.sensors(host, device, timeout=None if wait_remote else 0.0)
+                continue
+            if device not in DEVICE_CATEGORIES:
+                raise HMNoDeviceError(f'Device not found: {device}')
+            if self.__class__.system_info is None:
+                self.load_system_info()
+            sensors += [sensor for category, hw_device in self.__class__.system_info.iter_devices()
+                        if category == device for sensor in hw_device.sensors]
+        return sensors
 
     @property
     def value(self):
-        return self.sensor.value
+        if self.aggregate is None:
+            return self.sensor.value
+        # Local sensor values come from the same snapshot, so this costs at most one WMI query
+        values = [sensor.value for sensor in self.sensors]
+        if self.aggregate in AGGREGATES:
+            return AGGREGATES[self.aggregate](values, self.weights)
+        return percentile(values, float(self.aggregate[1:]))
 
     @property
     def raw_value(self):
-        normalized_value = (self.value - self.min) / (self.max - self.min)
+        return self.to_raw(self.value)
+
+    def alarm_active(self, value, was_active=False) -> bool:
+        """Whether the value is in alarm, with a 2% of range hysteresis to clear an active alarm"""
+        if self.alarm_threshold is None:
+            return False
+        threshold = self.alarm_threshold - (0.02 * (self.max - self.min) if was_active else 0.0)
+        return value >= threshold
+
+    def to_raw(self, value):
+        normalized_value = (value - self.min) / (self.max - self.min)
         return int(max(RAW_MIN, min(RAW_MAX, (RAW_MIN + normalized_value * (RAW_MAX - RAW_MIN)))))
 
 
+@dataclass
+class SensorSample:
+    time: float
+    raw_values: Tuple[int, int, int]
+
+
 @dataclass
 class RingLightSpec:
     id: int
@@ -65,20 +290,350 @@ class RingLightSpec:
     temp_sensor: SensorSpec
     load_sensor: SensorSpec
     fan_sensor: SensorSpec
+    min_interval: float = 0.25  # Adaptive polling bounds, in seconds
+    max_interval: float = 5.0
+    alarm_effect: bool = False  # Also blink the ring while any of its sensors is in alarm
 
-    def prepare_command(self):
-        logger.debug(f"Preparing command for ring #{self.id} \"{self.name}\" -> "
-                     f"Temp: {self.temp_sensor.value:.2f}°C, "
-                     f"Load: {self.load_sensor.value:.2f}%, "
-                     f"Fan: {self.fan_sensor.value:.2f}%")
-        command = f'U {self.id} {self.temp_sensor.raw_value} {self.load_sensor.raw_value} {self.fan_sensor.raw_value}\n'
+    history: Deque[SensorSample] = field(default_factory=lambda: deque(maxlen=HISTORY_LENGTH),
+                                         repr=False, compare=False)
+    next_update: float = field(default=0.0, repr=False, compare=False)
+    last_sent: float = field(default=0.0, repr=False, compare=False)
+    alarm: bool = field(default=False, repr=False, compare=False)
+    alarm_time: Optional[float] = field(default=None, repr=False, compare=False)  # When the alarm was detected
+
+    @property
+    def sensor_specs(self) -> Tuple[SensorSpec, SensorSpec, SensorSpec]:
+        return self.temp_sensor, self.load_sensor, self.fan_sensor
+
+    def recover(self, now=None) -> bool:
+        """Whether all the sensors can be read, retrying the failed ones when due"""
+        return all([spec.recover(now) for spec in self.sensor_specs])
+
+    @property
+    def retry_time(self) -> float:
+        """When all the failed sensors are due to be retried, 0 if none failed"""
+        return max((spec.retry_time for spec in self.sensor_specs if spec.failed_since is not None), default=0.0)
+
+    def sample(self, now=None) -> bool:
+        """Reads the sensors into the history, returns whether the raw values changed since the previous sample"""
+        previous = self.history[-1].raw_values if self.history else None
+        raw_values = self.raw_values()
+        self.history.append(SensorSample(monotonic() if now is None else now, raw_values))
+        return raw_values != previous
+
+    def latest_raw_values(self) -> Tuple[int, int, int]:
+        if not self.history:
+            self.sample()
+        return self.history[-1].raw_values
+
+    def change_rate(self) -> float:
+        """Fastest change of any value between consecutive samples in the history, in raw units per second"""
+        rates = [max(abs(new - old) for new, old in zip(current.raw_values, previous.raw_values))
+                 / (current.time - previous.time)
+                 for previous, current in zip(self.history, islice(self.history, 1, None))
+                 if current.time > previous.time]
+        return max(rates, default=0.0)
+
+    def adaptive_interval(self) -> float:
+        """
+        Time until the fastest changing value moves by `ADAPTIVE_RAW_STEP` at its current rate, within bounds.
+        Backs off gradually, at most doubling the last interval.
+        """
+        rate = self.change_rate()
+        interval = ADAPTIVE_RAW_STEP / rate if rate else self.max_interval
+        if len(self.history) >= 2:
+            interval = min(interval, 2 * (self.history[-1].time - self.history[-2].time))
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def raw_values(self) -> Tuple[int, int, int]:
+        # Every sensor value read is a WMI query: read each once, for both the raw values and the log
+        temp, load, fan = self.temp_sensor.read(), self.load_sensor.read(), self.fan_sensor.read()
+        logger.debug('Preparing command for ring #%d "%s" -> Temp: %.2f°C, Load: %.2f%%, Fan: %.2f%%',
+                     self.id, self.name, temp, load, fan, extra=RATE_LIMITED)
+        return self.temp_sensor.to_raw(temp), self.load_sensor.to_raw(load), self.fan_sensor.to_raw(fan)
+
+    def prepare_command(self, raw_values=None):
+        raw_temp, raw_load, raw_fan = raw_values or self.raw_values()
+        command = f'U {self.id} {raw_temp} {raw_load} {raw_fan}\n'
         return command
 
 
+@dataclass
+class FirmwareCapabilities:
+    """Capabilities record advertised by the firmware in the handshake reply"""
+    protocol: int = 1
+    rings: Optional[int] = None
+    leds: List[int] = field(default_factory=list)
+    commands: str = 'HU'
+    max_baud: int = 115200
+    max_command_length: int = 32
+    smoothing: Optional[int] = None
+    fps: float = 0.0
+
+    @classmethod
+    def from_handshake(cls, response: str) -> Optional['FirmwareCapabilities']:
+        """Parses the handshake reply, returns None if it's not a valid one. Older firmwares only send the greeting"""
+        if not response.startswith(HANDSHAKE_GREETING):
+            return None
+        fields = dict(f.partition('=')[::2] for f in response[len(HANDSHAKE_GREETING):].split())
+        capabilities = cls()
+        try:
+            if 'proto' in fields:
+                capabilities.protocol = int(fields['proto'])
+            if 'rings' in fields:
+                capabilities.rings = int(fields['rings'])
+            if 'leds' in fields:
+                capabilities.leds = [int(n) for n in fields['leds'].split(',') if n]
+            if 'cmds' in fields:
+                capabilities.commands = fields['cmds']
+            if 'baud' in fields:
+                capabilities.max_baud = int(fields['baud'])
+            if 'buf' in fields:
+                capabilities.max_command_length = int(fields['buf'])
+            if 'smooth' in fields:
+                capabilities.smoothing = int(fields['smooth'])
+            if 'fps' in fields:
+                capabilities.fps = float(fields['fps'])
+        except ValueError:
+            logger.warning(f'Malformed firmware capabilities, using defaults: {response}')
+            return cls()
+        return capabilities
+
+    @property
+    def supports_batch(self) -> bool:
+        return 'B' in self.commands
+
+    @property
+    def update_interval(self) -> float:
+        """
+        Seconds between sensor updates: the firmware eases towards new values over `smoothing` frames,
+        updating faster than that is wasted. Older firmwares get the original conservative 1s per ring.
+        """
+        if self.protocol < 2 or not self.smoothing or not self.fps:
+            return 1.0
+        return max(MIN_UPDATE_INTERVAL, min(1.0, self.smoothing / self.fps))
+
+    @property
+    def supports_sequence(self) -> bool:
+        return self.protocol >= 3
+
+    def prepare_commands(self, rings: List['RingLightSpec'], reserved_length=0) -> List[str]:
+        """
+        Update commands for all the rings, batched in as few lines as fit in the firmware command buffer,
+        leaving `reserved_length` characters free (eg. for sequence numbers)
+        """
+        max_command_length = self.max_command_length - reserved_length
+        if self.rings is not None:  # The firmware rejects a whole batch with an unknown ring, see check_capabilities
+            rings = [ring for ring in rings if 1 <= ring.id <= self.rings]
+        if not self.supports_batch:
+            return [ring.prepare_command(ring.latest_raw_values()) for ring in rings]
+        commands = []
+        batch_id, batch_values = None, []
+        for ring in sorted(rings, key=lambda r: r.id):
+            values = ' '.join(str(v) for v in ring.latest_raw_values())
+            if batch_id is not None and ring.id == batch_id + len(batch_values):  # Consecutive ring ids
+                command = f'B {batch_id} ' + ' '.join(batch_values + [values])
+                if len(command) <= max_command_length:
+                    batch_values.append(values)
+                    continue
+            if batch_id is not None:
+                commands.append(f'B {batch_id} ' + ' '.join(batch_values) + '\n')
+            batch_id, batch_values = ring.id, [values]
+        if batch_id is not None:
+            commands.append(f'B {batch_id} ' + ' '.join(batch_values) + '\n')
+        return commands
+
+
+@dataclass
+class PendingCommand:
+    command: bytes
+    sent_time: float
+    retries: int = 0
+
+
+class CommandPipeline:
+    """
+    Sends sequence numbered commands ("U17 1 128 64 32"), keeping up to `window` of them in flight
+    instead of waiting for each reply. The firmware acknowledges them with "A17" or "N17":
+    NAKed or timed out commands are retransmitted, up to `max_retries` times.
+    """
+
+    def __init__(self, window=4, timeout=0.5, max_retries=3):
+        self.window = window
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.next_seq = 0
+        self.outstanding: Dict[int, PendingCommand] = OrderedDict()
+        self.stats = dict(sent=0, acked=0, naked=0, timeouts=0, retransmitted=0, dropped=0)
+        self._buffer = b''
+
+    def send(self, command: str):
+        """Sends a command, first waiting for a free slot in the window if it's full"""
+        while len(self.outstanding) >= self.window:
+            self.process_replies(wait=True)
+        seq = self.next_seq
+        self.next_seq = (self.next_seq + 1) % SEQ_MODULO
+        command = f'{command[0]}{seq}{command[1:]}'.encode('utf8')
+        if command[-1:] != b'\n':
+            command += b'\n'
+        self.outstanding[seq] = PendingCommand(command, monotonic())
+        ser.write(command)
+        self.stats['sent'] += 1
+
+    def process_replies(self, wait=False):
+        """
+        Handles the replies received so far and retransmits timed out commands.
+        If `wait` is set, blocks until at least one outstanding command is settled.
+        """
+        pending_count = len(self.outstanding)
+        while True:
+            if ser.in_waiting:
+                self._buffer += ser.read(ser.in_waiting)
+            *lines, self._buffer = self._buffer.split(b'\n')
+            for line in lines:
+                self._handle_line(line.decode(errors='replace').strip())
+            now = monotonic()
+            for seq, pending in list(self.outstanding.items()):
+                if now - pending.sent_time >= self.timeout:
+                    self.stats['timeouts'] += 1
+                    self._retransmit(seq)
+            if not wait or not self.outstanding or len(self.outstanding) < pending_count:
+                return
+            sleep(0.001)
+
+    def drain(self):
+        """Waits until all outstanding commands are settled, eg. before a command expecting a plain response"""
+        while self.outstanding:
+            self.process_replies(wait=True)
+
+    def _handle_line(self, line: str):
+        if len(line) > 1 and line[0] in 'AN' and line[1:].isdigit():
+            seq = int(line[1:])
+            if seq not in self.outstanding:  # Late reply to an already retransmitted command
+                return
+            if line[0] == 'A':
+                self.stats['acked'] += 1
+                del self.outstanding[seq]
+            else:
+                self.stats['naked'] += 1
+                self._retransmit(seq)
+        elif line:
+            logger.debug('Received: %s', line, extra=RATE_LIMITED)
+
+    def _retransmit(self, seq: int):
+        pending = self.outstanding[seq]
+        if pending.retries >= self.max_retries:
+            logger.warning(f'Dropping command after {pending.retries} retries: {pending.command.decode().strip()}')
+            self.stats['dropped'] += 1
+            del self.outstanding[seq]
+            return
+        pending.retries += 1
+        pending.sent_time = monotonic()
+        ser.write(pending.command)
+        self.stats['retransmitted'] += 1
+
+
+class PortWatcher:
+    """
+    Polls the serial ports list from a background thread, tracking the ports of the arduino
+    (`arduino_port` if set, otherwise the ports matching the `arduino_id` VID:PID), to notice unplugging
+    and replugging without waiting for serial errors or timeouts.
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.ports: Set[str] = set()
+        self.changed = Event()
+        self._lock = Lock()
+        self._scan()
+        self._thread = Thread(target=self._watch_loop, name='SerialPortWatcher', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _list_arduino_ports() -> Set[str]:
+        if arduino_port:
+            listed = {port.device for port in list_ports.comports()}
+            return {arduino_port} if arduino_port in listed or os.path.exists(arduino_port) else set()
+        return {port.device for port in list_ports.grep(arduino_id)}
+
+    def _scan(self):
+        ports = self._list_arduino_ports()
+        with self._lock:
+            removed, arrived = self.ports - ports, ports - self.ports
+            self.ports = ports
+        if removed:
+            logger.info(f'Arduino serial port removed: {", ".join(sorted(removed))}')
+        if arrived:
+            logger.info(f'Arduino serial port arrived: {", ".join(sorted(arrived))}')
+        if removed or arrived:
+            self.changed.set()
+
+    def _watch_loop(self):
+        while True:
+            sleep(self.interval)
+            try:
+                self._scan()
+            except Exception as exc:  # Keep watching, ports enumeration can fail transiently while devices change
+                logger.debug(f'Serial ports scan failed: {exc}')
+
+    def is_present(self, port: str) -> bool:
+        with self._lock:
+            return port in self.ports
+
+    def wait_for_change(self, timeout=None) -> bool:
+        changed = self.changed.wait(timeout)
+        self.changed.clear()
+        return changed
+
+
 # TODO: Refactor module into classes, maybe rename it too
 rings: List[RingLightSpec] = []
 ser: Optional[serial.Serial] = None
+capabilities: Optional[FirmwareCapabilities] = None
 serial_timeout = 3
+telemetry_interval = 60.0
+firmware_log_level = 'error'
+baud_rates: List[int] = [1000000, 500000]  # Higher baud rates to try after the handshake, in order of preference
+failed_baud_rates: Dict[str, Set[int]] = {}  # By port, the rates that failed or weren't faster, not tried again
+pipeline_window = 4  # Sequence numbered commands in flight, 1 for stop-and-wait
+adaptive_polling = False  # Sample and send faster while sensor values change, slower while they're stable
+alarm_interval = 0.5  # Sampling period of the sensors with an alarm threshold
+catalog_cache_path: Optional[str] = None  # Sensors catalog cache file, None disables it
+port_watcher: Optional[PortWatcher] = None
+last_port: Optional[str] = None  # Tried first on reconnection
+alarm_metrics = dict(count=0, last_latency=None, max_latency=0.0)  # Alarm detection to acknowledged update, seconds
+telemetry: Mapping[str, float] = {}  # Last firmware telemetry counters
+pipeline_stats: Mapping[str, int] = {}  # Command pipeline counters of the current connection
+# Recoveries by fault class: sensor (a single spec re-bound or readable again), serial (port reconnected), seconds
+fault_metrics = {fault: dict(count=0, last_recovery=None, max_recovery=0.0) for fault in ('sensor', 'serial')}
+
+
+def record_recovery(fault: str, recovery_time: float):
+    metrics = fault_metrics[fault]
+    metrics['count'] += 1
+    metrics['last_recovery'] = recovery_time
+    metrics['max_recovery'] = max(metrics['max_recovery'], recovery_time)
+
+
+def bound_identifiers() -> List[str]:
+    """Identifiers of the local sensors used by the rings"""
+    return sorted({sensor.identifier for ring in rings for spec in ring.sensor_specs
+                   for sensor in (spec.sensors or [spec.sensor])
+                   if sensor is not None and not isinstance(sensor, remote.RemoteSensor)})
+
+
+def cached_bindings() -> List[str]:
+    """Identifiers of the local sensors the rings used on the last run, from the catalog cache"""
+    cached = read_catalog_cache(catalog_cache_path) if catalog_cache_path else None
+    return [] if cached is None else cached[1]
+
+
+def cache_bindings():
+    """Saves the sensors used by the rings with the cached catalog, so the next start can wait just for them"""
+    bindings = bound_identifiers()
+    if catalog_cache_path and SensorSpec.system_info is not None and bindings != SensorSpec.catalog_bindings:
+        SensorSpec.catalog_bindings = bindings
+        write_catalog_cache(catalog_cache_path, SensorSpec.system_info, bindings)
 
 
 def close_serial():
@@ -100,7 +655,7 @@ def read_serial(until=serial.LF):
 def log_serial(*args, **kwargs):
     buffer = read_serial(*args, **kwargs)
     if buffer:
-        logger.debug(f'Received: {buffer}')
+        logger.debug('Received: %s', buffer, extra=RATE_LIMITED)
 
 
 def flush_serial():
@@ -112,7 +667,7 @@ def flush_serial():
 def command_and_response(command: Union[str, bytes], ensure_line_end=True, flush=True):
     if isinstance(command, str):
         command = command.encode('utf8')
-    if ensure_line_end and command[-1] != b'\n':
+    if ensure_line_end and command[-1:] != b'\n':
         command += b'\n'
     ser.write(command)
     sleep(0.25)  # Wait for data
@@ -123,49 +678,437 @@ def command_and_response(command: Union[str, bytes], ensure_line_end=True, flush
     return response
 
 
+def send_command(command: Union[str, bytes], ensure_line_end=True):
+    """Writes a command without waiting for its response, logging whatever the firmware sent meanwhile"""
+    if isinstance(command, str):
+        command = command.encode('utf8')
+    if ensure_line_end and command[-1:] != b'\n':
+        command += b'\n'
+    ser.write(command)
+    flush_serial()
+
+
+def set_firmware_log_level(level: str):
+    """Sets the firmware serial log output level (none, error, debug), if supported"""
+    if 'L' not in capabilities.commands:
+        return
+    level_value = FIRMWARE_LOG_LEVELS.get(level.lower())
+    if level_value is None:
+        logger.warning(f'Invalid firmware log level "{level}", expected one of: {", ".join(FIRMWARE_LOG_LEVELS)}')
+        return
+    response = command_and_response(f'L {level_value}', flush=False)
+    if response != f'L {level_value}':
+        logger.warning(f'Failed setting firmware log level to "{level}", response: {response}')
+
+
+def measure_throughput(payload_size=THROUGHPUT_PAYLOAD):
+    """
+    Measures the serial link throughput, returns it in bytes/s (both ways): sends at least `payload_size` bytes of
+    handshakes, padded to the firmware command buffer, and reads their replies. At most `THROUGHPUT_WINDOW` are in
+    flight, so the arduino's serial receive buffer can't overflow while it's sending a reply
+    """
+    flush_serial()
+    command = 'H'.ljust(capabilities.max_command_length).encode() + b'\n'  # Spaces are skipped as delimiters
+    commands_count = -(-payload_size // len(command))
+    sent = replied = transferred = 0
+    start = monotonic()
+    while replied < commands_count:
+        while sent < commands_count and sent - replied < THROUGHPUT_WINDOW:
+            ser.write(command)
+            sent += 1
+            transferred += len(command)
+        line = ser.read_until(serial.LF)
+        if not line.endswith(serial.LF):
+            raise SerialException('Timed out measuring the serial throughput')
+        transferred += len(line)
+        if line.startswith(HANDSHAKE_GREETING.encode()):  # Else eg. a firmware debug line, still transferred
+            replied += 1
+    return transferred / (monotonic() - start)
+
+
+def negotiate_baud():
+    """
+    Switches to the fastest baud rate from `baud_rates` that both ends agree on, verified with a handshake, and kept
+    only if it measures faster than the safe rate. Otherwise both sides fall back to the safe rate and the next one is
+    tried. Failed rates are remembered for the port, so reconnections don't try them again.
+    """
+    global capabilities
+    if 'S' not in capabilities.commands:
+        return
+    failed = failed_baud_rates.setdefault(ser.port, set())
+    candidates = [baud for baud in baud_rates if SERIAL_BAUD < baud <= capabilities.max_baud and baud not in failed]
+    if not candidates:
+        return
+    base_throughput = measure_throughput()
+    for baud in candidates:
+        response = command_and_response(f'S {baud}', flush=False)
+        if response != f'S {baud}':
+            logger.debug(f'Baud rate {baud} refused by the arduino, response: {response}')
+            failed.add(baud)
+            continue
+        try:
+            ser.baudrate = baud
+        except (SerialException, ValueError) as exc:  # Not supported by the USB-serial chip or its driver
+            logger.debug(f'Baud rate {baud} not supported by the serial port: {exc}')
+            failed.add(baud)
+            fall_back_to_safe_baud()
+            continue
+        sleep(0.1)  # Let the arduino reopen its port
+        ser.reset_input_buffer()
+        verified_capabilities = FirmwareCapabilities.from_handshake(command_and_response('H', flush=False))
+        if verified_capabilities is None:
+            logger.debug(f'Baud rate {baud} verification failed, falling back to {SERIAL_BAUD}')
+            failed.add(baud)
+            fall_back_to_safe_baud()
+            continue
+        throughput = measure_throughput()
+        if throughput < BAUD_MIN_GAIN * base_throughput:
+            logger.info(f'Serial baud rate {baud} not faster, measured throughput {base_throughput:.0f} B/s -> '
+                        f'{throughput:.0f} B/s ({throughput / base_throughput:.1f}x), falling back to {SERIAL_BAUD}')
+            failed.add(baud)
+            command_and_response(f'S {SERIAL_BAUD}', flush=False)  # The firmware switches back right away
+            fall_back_to_safe_baud(wait_firmware=False)
+            continue
+        capabilities = verified_capabilities
+        logger.info(f'Serial baud rate set to {baud}, measured throughput '
+                    f'{base_throughput:.0f} B/s -> {throughput:.0f} B/s ({throughput / base_throughput:.1f}x)')
+        return
+    logger.info(f'Serial baud rate kept at {SERIAL_BAUD}, measured throughput {base_throughput:.0f} B/s')
+
+
+def fall_back_to_safe_baud(wait_firmware=True):
+    """Switches the port back to the safe baud rate, by default waiting for the firmware to revert unconfirmed"""
+    ser.baudrate = SERIAL_BAUD
+    sleep(BAUD_CONFIRM_TIMEOUT + 0.5 if wait_firmware else 0.1)
+    ser.reset_input_buffer()
+    if FirmwareCapabilities.from_handshake(command_and_response('H', flush=False)) is None:
+        raise SerialException(f'Lost arduino handshake falling back to baud rate {SERIAL_BAUD}')
+
+
+def query_telemetry():
+    """
+    Queries the firmware telemetry counters, returns them as a dict:
+    fps, shown / skipped frames, parse errors (err), dropped input bytes (drop), free ram (-1 if unknown)
+    """
+    response = command_and_response('T', flush=False)
+    fields = response.split()
+    if not fields or fields[0] != 'T':
+        logger.debug(f'Unexpected telemetry response: {response}')
+        return {}
+    telemetry = {}
+    for field in fields[1:]:
+        key, _, value = field.partition('=')
+        try:
+            telemetry[key] = float(value)
+        except ValueError:
+            telemetry[key] = value
+    return telemetry
+
+
+def update_telemetry():
+    """Polls the firmware telemetry, warning about new input errors since the previous poll"""
+    global telemetry
+    previous, telemetry = telemetry, query_telemetry()
+    logger.debug(f'Firmware telemetry: {telemetry}')
+    for key, description in (('err', 'parse errors'), ('drop', 'dropped input bytes')):
+        increase = telemetry.get(key, 0) - previous.get(key, 0)
+        if increase > 0:
+            logger.warning(f'Firmware reported {increase:.0f} new {description}')
+
+
+def probe_fps():
+    """
+    Reads the firmware fps again: the handshake right after boot reports 0, not measured yet,
+    which would hold the update interval at the legacy 1s. Uses the telemetry if supported, else the handshake.
+    """
+    if 'T' in capabilities.commands:
+        update_telemetry()
+        fps = telemetry.get('fps')
+    else:
+        handshake_capabilities = FirmwareCapabilities.from_handshake(command_and_response('H', flush=False))
+        fps = handshake_capabilities.fps if handshake_capabilities is not None else None
+    if isinstance(fps, float) and fps > 0:
+        capabilities.fps = fps
+        logger.debug(f'Firmware measured {fps:.2f} fps, update interval: {capabilities.update_interval:.2f}s')
+
+
+def wait_for_handshake(timeout=HANDSHAKE_TIMEOUT) -> Optional[FirmwareCapabilities]:
+    """
+    Repeats the handshake until the arduino, reset by the connection, answers it.
+    This takes as long as the board needs to boot, instead of a fixed delay.
+    """
+    deadline = monotonic() + timeout
+    ser.timeout = HANDSHAKE_RETRY_INTERVAL
+    try:
+        sleep(RESET_DELAY)
+        while monotonic() < deadline:
+            ser.reset_input_buffer()
+            ser.write(b'H\n')
+            attempt_deadline = monotonic() + HANDSHAKE_RETRY_INTERVAL
+            while monotonic() < attempt_deadline:
+                line = read_serial()
+                if not line:
+                    break
+                handshake_capabilities = FirmwareCapabilities.from_handshake(line)
+                if handshake_capabilities is not None:
+                    return handshake_capabilities
+    finally:
+        ser.timeout = serial_timeout
+    return None
+
+
 def setup_serial():
     def attempt_serial_handshake(arduino_port):
-        global ser, serial_timeout
+        global ser, serial_timeout, capabilities
         close_serial()
-        ser = serial.Serial(arduino_port, 115200, timeout=serial_timeout)
+        ser = serial.Serial(arduino_port, SERIAL_BAUD, timeout=serial_timeout)
         logger.debug(f'Connected to serial port {ser.name}, waiting for arduino to reset')
-        sleep(4)  # Wait for arduino reset on serial connection
-        logger.debug('Attempting handshake')
-        response = command_and_response('H')
-        return response == 'EHLO RGBHardwareMonitor'
-
-    arduino_list = serial.tools.list_ports.grep(arduino_id)
-    for device in arduino_list:
-        if attempt_serial_handshake(device.device):
-            logger.debug('Succesfully connected to arduino')
+        connect_start = monotonic()
+        capabilities = wait_for_handshake()
+        if capabilities is not None:
+            logger.debug(f'Handshake completed in {monotonic() - connect_start:.2f}s')
+        return capabilities is not None
+
+    global last_port
+    arduino_ports = sorted(port_watcher.ports, key=lambda port: port != last_port)  # Last connected port first
+    for port in arduino_ports:
+        if attempt_serial_handshake(port):
+            last_port = port
+            logger.debug(f'Succesfully connected to arduino, firmware capabilities: {capabilities}')
+            check_capabilities()
+            set_firmware_log_level(firmware_log_level)
+            negotiate_baud()
             break
         else:
             logger.debug('Handshake failed')
     else:
         close_serial()
-        raise ConnectionError(f'No arduino recognized for serial ports with specified VID:PID = {arduino_id}')
+        raise ConnectionError(f'No arduino recognized for serial ports with specified VID:PID = {arduino_id}'
+                              + (f' (port: {arduino_port})' if arduino_port else ''))
+
+
+def check_capabilities():
+    if capabilities.rings is None:
+        return
+    for ring in rings:
+        if not 1 <= ring.id <= capabilities.rings:
+            logger.warning(f'Ring #{ring.id} "{ring.name}" is not available on the arduino '
+                           f'(firmware has {capabilities.rings} rings), its updates are skipped')
+
+
+def update_due_rings(pipeline: Optional[CommandPipeline] = None):
+    """
+    Samples the rings due for an update and sends their commands, then schedules their next update.
+    With adaptive polling, unchanged values are only sent again after the ring's max interval.
+    """
+    now = monotonic()
+    update_rings = []
+    for ring in rings:
+        if ring.next_update > now:
+            continue
+        try:
+            if not ring.recover(now):
+                ring.next_update = max(now + capabilities.update_interval, ring.retry_time)
+                continue
+            changed = ring.sample(now)
+        except SENSOR_FAULTS:  # Only this ring waits for its sensor, the spec logged the failure
+            ring.next_update = max(now + capabilities.update_interval, ring.retry_time)
+            continue
+        if not adaptive_polling:
+            update_rings.append(ring)
+            ring.next_update = now + capabilities.update_interval
+        else:
+            if changed or now - ring.last_sent >= ring.max_interval:
+                update_rings.append(ring)
+            ring.next_update = now + ring.adaptive_interval()
+    for ring in update_rings:
+        ring.last_sent = now
+    # Sequence numbers take up to 3 characters
+    reserved_length = len(str(SEQ_MODULO - 1)) if pipeline is not None else 0
+    for command in capabilities.prepare_commands(update_rings, reserved_length=reserved_length):
+        transmit(command, pipeline)
+
+
+def update_rings_in_turn() -> bool:
+    """
+    Updates the rings one at a time for protocol 1 firmwares, waiting for each response and an update interval
+    after it. While no ring can be updated, waits for the first failed sensor retry instead (at most an interval).
+    Returns False if the loop has to stop, on quit or pause.
+    """
+    updated = False
+    for ring in rings:
+        if quit_event.is_set() or pause_event.is_set():
+            return False
+        check_port_present()
+        try:
+            if not ring.recover():
+                continue
+            command = ring.prepare_command()
+        except SENSOR_FAULTS:
+            continue
+        command_and_response(command)
+        updated = True
+        sleep(capabilities.update_interval)
+    if not updated:
+        next_retry = min((ring.retry_time for ring in rings), default=float('inf'))
+        sleep(max(0.0, min(capabilities.update_interval, next_retry - monotonic())))
+    return True
+
+
+def transmit(command: str, pipeline: Optional[CommandPipeline] = None):
+    if pipeline is not None:
+        pipeline.send(command)
+    else:
+        send_command(command)
+
+
+def check_alarms(pipeline: Optional[CommandPipeline] = None) -> bool:
+    """
+    Samples the sensors with an alarm threshold. Rings entering an alarm are updated right away,
+    preempting their schedule, and the latency to the acknowledged update is recorded in `alarm_metrics`.
+    Returns whether any ring was updated.
+    """
+    alarm_rings = []
+    for ring in rings:
+        alarm_specs = [spec for spec in ring.sensor_specs
+                       if spec.alarm_threshold is not None and spec.failed_since is None]
+        if not alarm_specs:
+            continue
+        try:
+            alarm = any(spec.alarm_active(spec.read(), was_active=ring.alarm) for spec in alarm_specs)
+        except SENSOR_FAULTS:
+            continue
+        if alarm == ring.alarm:
+            continue
+        ring.alarm = alarm
+        if alarm:
+            ring.alarm_time = monotonic()
+            ring.next_update = ring.last_sent = 0.0  # Due now, sent even if the raw values didn't change
+            alarm_rings.append(ring)
+        else:
+            logger.info(f'Alarm cleared for ring #{ring.id} "{ring.name}"')
+        if ring.alarm_effect and 'W' in capabilities.commands:
+            transmit(f'W {ring.id} {int(alarm)}', pipeline)
+    if not alarm_rings:
+        return False
+    update_due_rings(pipeline)
+    if pipeline is not None:
+        pipeline.drain()  # Acknowledged: applied by the firmware, shown on its next frame
+    now = monotonic()
+    for ring in alarm_rings:
+        latency = now - ring.alarm_time
+        alarm_metrics['count'] += 1
+        alarm_metrics['last_latency'] = latency
+        alarm_metrics['max_latency'] = max(alarm_metrics['max_latency'], latency)
+        logger.warning(f'Alarm for ring #{ring.id} "{ring.name}", update pushed in {latency * 1000:.0f}ms '
+                       f'(+ up to {alarm_interval * 1000:.0f}ms sampling)')
+    return True
+
+
+def wait_for_arduino_port(systray=None):
+    """
+    Waits for a change in the arduino serial ports (eg. the board plugged back in), or at most a few seconds
+    to retry a board that's present but didn't answer
+    """
+    if systray is not None:
+        systray.set_hover_text('Waiting for arduino' if not port_watcher.ports else 'Arduino not responding')
+    retry_time = monotonic() + 5.0
+    while monotonic() < retry_time and not quit_event.is_set() and not pause_event.is_set():
+        if port_watcher.wait_for_change(timeout=0.25):
+            return
+
+
+def check_port_present():
+    """Raises immediately if the arduino was unplugged, instead of waiting for a serial error or timeout"""
+    if not port_watcher.is_present(ser.port):
+        raise SerialException(f'Serial port {ser.port} removed')
 
 
 def update_loop(systray=None):
+    """
+    Keeps the rings updated. Serial errors only reconnect the port, and sensor faults only pause the rings using
+    the failed sensors, until recovered. Other hardware monitor errors are raised, keeping the connection open.
+    """
+    global telemetry, port_watcher, pipeline_stats
+    if port_watcher is None:
+        port_watcher = PortWatcher()
+    serial_fault_time = None
     while True:
-        if systray is not None:
-            systray.set_hover_text('Connecting to serial')
-            systray.set_animation(WaitIconAnimation, start_animation=True)
+        if quit_event.is_set() or pause_event.is_set():
+            close_serial()
+            return
+        keep_connection = False
         try:
-            setup_serial()
+            if ser is None or capabilities is None or not port_watcher.is_present(ser.port):
+                if systray is not None:
+                    systray.set_hover_text('Connecting to serial')
+                    systray.set_animation(WaitIconAnimation, start_animation=True)
+                port_watcher.changed.clear()
+                setup_serial()
+            if serial_fault_time is not None:
+                record_recovery('serial', monotonic() - serial_fault_time)
+                logger.info(f'Serial connection recovered in {monotonic() - serial_fault_time:.2f}s')
+                serial_fault_time = None
             if systray is not None:
                 systray.clear_hover_text()
                 systray.set_animation(RunningIconAnimation, start_animation=True)
+            telemetry = {}  # Counters restart with the arduino reset on connection
+            for ring in rings:
+                ring.next_update = ring.last_sent = 0.0
+                ring.alarm = False
+            next_alarm_check = 0.0
+            pipeline = CommandPipeline(window=pipeline_window) if capabilities.supports_sequence else None
+            pipeline_stats = pipeline.stats if pipeline is not None else {}
+            last_telemetry = last_fps_probe = monotonic()
             while True:
-                for ring in rings:
+                if capabilities.protocol < 2:
+                    if not update_rings_in_turn():
+                        return
+                else:
                     if quit_event.is_set() or pause_event.is_set():
                         return
-                    command = ring.prepare_command()
-                    command_and_response(command)
-                    sleep(1)
-        except SerialException as exc:
+                    update_due_rings(pipeline)
+                    next_update = min((ring.next_update for ring in rings),
+                                      default=monotonic() + capabilities.update_interval)
+                    while monotonic() < next_update:
+                        check_port_present()
+                        if pipeline is not None:
+                            pipeline.process_replies()
+                        if monotonic() >= next_alarm_check:
+                            next_alarm_check = monotonic() + alarm_interval
+                            if check_alarms(pipeline):
+                                break
+                        sleep(max(0.0, min(0.01, next_update - monotonic(), next_alarm_check - monotonic())))
+                if 'T' in capabilities.commands and monotonic() - last_telemetry >= telemetry_interval:
+                    if pipeline is not None:
+                        pipeline.drain()
+                        logger.debug(f'Command pipeline stats: {pipeline.stats}')
+                    if alarm_metrics['count']:
+                        logger.debug(f'Alarm metrics: {alarm_metrics}')
+                    if any(metrics['count'] for metrics in fault_metrics.values()):
+                        logger.debug(f'Fault recovery metrics: {fault_metrics}')
+                    update_telemetry()
+                    last_telemetry = monotonic()
+                if (capabilities.protocol >= 2 and capabilities.smoothing and not capabilities.fps
+                        and monotonic() - last_fps_probe >= FPS_PROBE_INTERVAL):
+                    if pipeline is not None:
+                        pipeline.drain()
+                    probe_fps()
+                    last_fps_probe = monotonic()
+        except HardwareMonitorError:
+            keep_connection = True  # Eg. OHM not running: the caller recovers it, then resumes on the same connection
+            raise
+        except ConnectionError as exc:
+            logger.warning(str(exc))
+            close_serial()
+            wait_for_arduino_port(systray)
+        except (SerialException, OSError) as exc:  # Unplugging can surface as a plain OSError from the port
             logger.warning(f'Serial exception: {str(exc)}', exc_info=True)
+            if serial_fault_time is None:
+                serial_fault_time = monotonic()
+            sleep(HANDSHAKE_RETRY_INTERVAL)  # Eg. a port just plugged in, but not ready to be opened yet
         except KeyboardInterrupt:
             logger.debug("Exit!")
         finally:
-            close_serial()
+            if not keep_connection:
+                close_serial()
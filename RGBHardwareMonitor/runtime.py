@@ -111,3 +111,9 @@ def app_path(relative_path):
         base_path = os.path.abspath(".")
 
     return os.path.join(base_path, relative_path)
+
+
+def user_data_path(relative_path):
+    """ Get absolute path to a per-user data file, that persists across runs and updates """
+    base_path = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    return os.path.join(base_path, 'RGBHardwareMonitor', relative_path)
@@ -0,0 +1,212 @@
+"""
+Publishes the sensors snapshot of every update into a fixed layout memory mapped file, so that any number of local
+processes (dashboards, scripts) can read the latest values without querying OpenHardwareMonitor's WMI themselves.
+
+Only depends on the standard library: `SnapshotReader` can be used by scripts without installing the app requirements.
+```python
+from RGBHardwareMonitor.shared_snapshot import SnapshotReader
+with SnapshotReader(path) as reader:
+    snapshot = reader.read()
+    print(snapshot.age, snapshot.values['/intelcpu/0/temperature/0'])
+```
+
+Layout (little endian): a header, the values (doubles, NaN for sensors without a value), and the identifiers
+(UTF-8, newline separated) in the same order as the values. Identifiers are rewritten only when the sensors change,
+which bumps `catalog`, so readers decode them again only then.
+The file is guarded by a seqlock: the writer makes `seq` odd while writing and even again once done, readers retry
+while it's odd or changed during their read. There's a single writer, readers never block it. Python can't emit
+memory barriers, this relies on x86/x64 keeping the order of stores, like all the machines running OHM.
+"""
+import os
+import mmap
+import math
+import time
+import struct
+import itertools
+import logging
+from array import array
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, Optional, List, Tuple
+
+
+logger = logging.getLogger('RGBHardwareMonitor')  # Not `.log`, which needs pywin32, so readers can import this module
+
+MAGIC = b'RGBS'
+VERSION = 1
+# magic, version, header size, seq, tick, time, capacity, count, identifiers capacity, identifiers size, catalog
+HEADER = struct.Struct('<4sHHQQdIIIII')
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = 8
+VALUES_OFFSET = 64  # Header padded, values aligned
+DEFAULT_CAPACITY = 4096
+IDENTIFIER_BYTES = 96  # Identifiers space for each sensor, eg. '/nvidiagpu/0/temperature/0' is 26
+READ_RETRIES = 1000
+
+
+class SharedSnapshotError(Exception):
+    """Exception class for missing, invalid or incompatible shared snapshot files"""
+
+
+@dataclass(frozen=True)
+class SharedSnapshot:
+    tick: int
+    """Number of the update that published the snapshot, increasing"""
+
+    time: float
+    """When the sensors were read, as `time.time()`"""
+
+    values: Dict[str, Optional[float]]
+    """Sensor values by identifier, None for sensors without a value"""
+
+    @property
+    def age(self) -> float:
+        """Seconds since the sensors were read: it keeps growing once the app stops publishing"""
+        return time.time() - self.time
+
+
+def _layout(capacity: int) -> Tuple[int, int, int]:
+    """Returns the identifiers offset and capacity, and the file size, for a capacity of sensors"""
+    identifiers_offset = VALUES_OFFSET + capacity * 8
+    identifiers_capacity = capacity * IDENTIFIER_BYTES
+    return identifiers_offset, identifiers_capacity, identifiers_offset + identifiers_capacity
+
+
+class SnapshotWriter:
+    """
+    Writes the snapshots: the file is created (or reused if it's already the right size, eg. after a restart, while
+    readers still map it) for up to `capacity` sensors, and never resized while running
+    """
+
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.identifiers_offset, self.identifiers_capacity, size = _layout(capacity)
+        self.identifiers: Optional[Tuple[str, ...]] = None
+        self.identifiers_size = 0
+        self.count = 0
+        self.truncated = 0  # Sensors left out of the snapshots, over capacity
+        self._lock = Lock()  # A single writer at a time, or the seqlock breaks
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.seq, self.tick, self.catalog = 0, 0, 0
+        magic, version, _, seq, tick, _, _, _, _, _, catalog = HEADER.unpack_from(self._mmap)
+        if magic == MAGIC and version == VERSION:  # Carry on numbering, readers of the previous run notice the changes
+            self.seq, self.tick, self.catalog = seq, tick, catalog
+        self._write_seq(self.seq | 1)
+        self._write_header(time.time())  # No sensors until the first snapshot
+        self._write_seq(self.seq + 1)
+
+    def publish(self, values: Dict[str, Optional[float]], timestamp: Optional[float] = None):
+        """Publishes the sensor values by identifier, read at `timestamp` (default now, as `time.time()`)"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if self._mmap.closed:
+                return
+            identifiers = tuple(values)
+            encoded = None
+            if identifiers != self.identifiers:
+                self.count, encoded = self._encode(identifiers)
+            packed = array('d', (math.nan if value is None else value
+                                 for value in itertools.islice(values.values(), self.count)))
+            self._write_seq(self.seq + 1)  # Odd: writing
+            if encoded is not None:
+                self.identifiers, self.identifiers_size = identifiers, len(encoded)
+                self.catalog += 1
+                self._mmap[self.identifiers_offset:self.identifiers_offset + len(encoded)] = encoded
+            self._mmap[VALUES_OFFSET:VALUES_OFFSET + len(packed) * packed.itemsize] = packed.tobytes()
+            self.tick += 1
+            self._write_header(timestamp)
+            self._write_seq(self.seq + 1)  # Even: done
+
+    def _encode(self, identifiers: Tuple[str, ...]) -> Tuple[int, bytes]:
+        """Returns how many identifiers fit in the capacity, and them encoded. Sensors over it are left out"""
+        fitting, size = [], 0
+        for identifier in identifiers[:self.capacity]:
+            encoded = identifier.encode('utf-8')
+            size += len(encoded) + bool(fitting)
+            if size > self.identifiers_capacity:
+                break
+            fitting.append(encoded)
+        truncated = len(identifiers) - len(fitting)
+        if truncated and truncated != self.truncated:
+            logger.warning(f'Shared sensor snapshot capacity exceeded, {truncated} sensors left out of it')
+        self.truncated = truncated
+        return len(fitting), b'\n'.join(fitting)
+
+    def _write_header(self, timestamp: float):
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, VALUES_OFFSET, self.seq, self.tick, timestamp,
+                         self.capacity, self.count, self.identifiers_capacity, self.identifiers_size, self.catalog)
+
+    def _write_seq(self, seq: int):
+        self.seq = seq
+        SEQ.pack_into(self._mmap, SEQ_OFFSET, seq)
+
+    def close(self):
+        with self._lock:
+            if not self._mmap.closed:
+                self._mmap.close()
+
+
+class SnapshotReader:
+    """Reads the latest snapshot published by the app, see the module docs. Use as a context manager, or `close()`"""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, 'rb') as fp:
+                self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:  # ValueError: empty file
+            raise SharedSnapshotError(f'Cannot open shared sensor snapshot {path}: {exc}') from exc
+        if len(self._mmap) < VALUES_OFFSET:
+            raise SharedSnapshotError(f'Not a shared sensor snapshot: {path}')
+        magic, version, _, _, _, _, capacity, *_ = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION or len(self._mmap) < _layout(capacity)[2]:
+            raise SharedSnapshotError(f'Not a shared sensor snapshot, or an incompatible version: {path}')
+        self.identifiers_offset = _layout(capacity)[0]
+        self._catalog: Optional[int] = None
+        self._identifiers: List[str] = []
+
+    @property
+    def tick(self) -> int:
+        """Number of the latest published snapshot, cheap to poll for new ones"""
+        return HEADER.unpack_from(self._mmap)[4]
+
+    def read(self) -> SharedSnapshot:
+        """Returns the latest snapshot, retrying while it's being written"""
+        mm = self._mmap
+        for _ in range(READ_RETRIES):
+            seq = SEQ.unpack_from(mm, SEQ_OFFSET)[0]
+            if seq & 1:
+                time.sleep(0)
+                continue
+            _, _, _, _, tick, timestamp, _, count, _, identifiers_size, catalog = HEADER.unpack_from(mm)
+            encoded = None
+            if catalog != self._catalog:
+                encoded = mm[self.identifiers_offset:self.identifiers_offset + identifiers_size]
+            values = array('d')
+            values.frombytes(mm[VALUES_OFFSET:VALUES_OFFSET + count * values.itemsize])
+            if SEQ.unpack_from(mm, SEQ_OFFSET)[0] != seq:
+                continue  # Written meanwhile, what was read could be mixed up
+            if encoded is not None:
+                self._identifiers = encoded.decode('utf-8').split('\n') if encoded else []
+                self._catalog = catalog
+            return SharedSnapshot(tick=tick, time=timestamp,
+                                  values={identifier: None if math.isnan(value) else value
+                                          for identifier, value in zip(self._identifiers, values)})
+        raise SharedSnapshotError('Timed out waiting for a consistent shared sensor snapshot')
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,20 +1,67 @@
 import os
-import time
 import traceback
 import atexit
+from time import monotonic
 from tempfile import NamedTemporaryFile
-from threading import Thread, Event
+from threading import Thread, Event, RLock
+from typing import Dict, List, Optional
+
+import win32api
+import win32con
+import win32gui
 
 # TODO: Replace import with installable library once done?
 from modules.systray.src.systray import SysTrayIcon, CheckBoxMenuOption, MenuOption
 
 from . import autorun
 from . import hardware_monitor
+from . import profiler
 from . import runtime
 from .log import logger, error_popup, message_popup
 from .runtime import quit_event, pause_event, app_path
 
 
+class AnimationScheduler:
+    """Steps all the running icon animations from a single long-lived thread"""
+
+    def __init__(self):
+        self._animations: Dict['IconAnimation', float] = {}  # Animation -> next frame time
+        self._lock = RLock()  # Also held while stepping, so no frame runs after an animation is removed
+        self._wakeup = Event()
+        self._thread: Optional[Thread] = None
+
+    def add(self, animation: 'IconAnimation'):
+        with self._lock:
+            self._animations[animation] = monotonic()
+            if self._thread is None:
+                self._thread = Thread(target=self._scheduler_loop, name='IconAnimationScheduler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def remove(self, animation: 'IconAnimation'):
+        with self._lock:
+            self._animations.pop(animation, None)
+
+    def _scheduler_loop(self):
+        while True:
+            with self._lock:
+                now = monotonic()
+                for animation, frame_time in list(self._animations.items()):
+                    if frame_time > now or animation not in self._animations:  # Removed by a previous callback
+                        continue
+                    animation.step()
+                    if animation.frames_interval is None:  # Static, single frame
+                        self._animations.pop(animation, None)
+                    elif animation in self._animations:
+                        self._animations[animation] = now + animation.frames_interval
+                next_frame_time = min(self._animations.values(), default=None)
+            self._wakeup.wait(None if next_frame_time is None else max(0.0, next_frame_time - monotonic()))
+            self._wakeup.clear()
+
+
+animation_scheduler = AnimationScheduler()
+
+
 class IconAnimation:
     icons = []
     frames_interval = 0.2
@@ -23,25 +70,32 @@ class IconAnimation:
         self.frame_callback = frame_callback
 
         self.icon_index = 0
-        self.thread = None
-        self.thread_quit_event = None
+        self.running = False
 
         if start_animation:
             self.start()
 
+    @classmethod
+    def icon_handles(cls) -> List[int]:
+        """Icon handles for the animation frames at the tray (small icon) size, loaded once per animation class"""
+        if '_icon_handles' not in cls.__dict__:
+            width = win32api.GetSystemMetrics(win32con.SM_CXSMICON)
+            height = win32api.GetSystemMetrics(win32con.SM_CYSMICON)
+            cls._icon_handles = [
+                win32gui.LoadImage(0, icon, win32con.IMAGE_ICON, width, height, win32con.LR_LOADFROMFILE)
+                for icon in cls.icons
+            ]
+        return cls._icon_handles
+
     def start(self):
-        if self.thread is None:
-            self.thread = Thread(target=self._animation_loop)
-            self.thread_quit_event = Event()
-            self.thread_quit_event.clear()
-            self.thread.start()
-        self._icon_callback()
+        if not self.running:
+            self.running = True
+            animation_scheduler.add(self)
 
     def stop(self):
-        if self.thread is not None:
-            self.thread_quit_event.set()
-            self.thread.join(self.frames_interval)
-            self.thread = None
+        if self.running:
+            animation_scheduler.remove(self)
+            self.running = False
 
     @property
     def current_icon(self):
@@ -50,23 +104,17 @@ class IconAnimation:
     def _icon_callback(self):
         self.frame_callback(self.current_icon)
 
-    def _animation_loop(self):
-        while not self.thread_quit_event.is_set():
-            self._icon_callback()
-            self.icon_index += 1
-            self.icon_index = self.icon_index % len(self.icons)
-            time.sleep(self.frames_interval)
+    def step(self):
+        self._icon_callback()
+        self.icon_index += 1
+        self.icon_index = self.icon_index % len(self.icons)
 
     def __del__(self):
         self.stop()
 
 
 class IconStaticAnimation(IconAnimation):
-    frames_interval = 5
-
-    def _animation_loop(self):
-        self._icon_callback()
-        # No frame stepping
+    frames_interval = None  # No frame stepping
 
 
 class RunningIconAnimation(IconAnimation):
@@ -92,9 +140,9 @@ def systray_error_handler(exc):
 
 
 def display_hardware_info():
-    info = hardware_monitor.SystemInfo().formatted_info()
+    system_info = hardware_monitor.SystemInfo()
     with NamedTemporaryFile(mode='w', encoding='utf8', prefix='hardware_info_', suffix='.txt', delete=False) as tempfp:
-        tempfp.write(info)
+        system_info.write_inventory(tempfp)
         file_name = tempfp.name
     os.startfile(file_name)
     atexit.register(lambda fn: os.remove(fn), file_name)
@@ -134,10 +182,16 @@ class RGBHardwareMonitorSysTray(SysTrayIcon):  # TODO: Instead of inheriting, wr
             CheckBoxMenuOption('Run at startup',
                                check_hook=lambda: autorun.is_enabled,
                                callback=lambda t: autorun.toggle_autorun()),
+            CheckBoxMenuOption('Profile CPU usage',
+                               check_hook=profiler.is_running,
+                               callback=lambda t: profiler.toggle()),
         ]
 
         animation_cls = animation_cls if animation_cls else self.default_animation
 
+        self._update_lock = RLock()
+        self._icon_handles: Dict[str, int] = {}
+        self.updates_count = 0  # Tray updates actually sent, after coalescing unchanged ones
         super().__init__(animation_cls.icons[0], self.default_hover_text,
                          menu_options=menu_options,
                          default_menu_index=0,
@@ -154,7 +208,13 @@ class RGBHardwareMonitorSysTray(SysTrayIcon):  # TODO: Instead of inheriting, wr
 
     def set_animation(self, animation_cls, start_animation=True):
         if self.animation is not None:
+            if type(self.animation) is animation_cls:
+                if start_animation:
+                    self.animation.start()
+                return
             self.animation.stop()
+        with self._update_lock:
+            self._icon_handles.update(zip(animation_cls.icons, animation_cls.icon_handles()))
         self.animation = animation_cls(self.set_icon, start_animation=start_animation)
 
     def animation_start(self):
@@ -172,6 +232,28 @@ class RGBHardwareMonitorSysTray(SysTrayIcon):  # TODO: Instead of inheriting, wr
     def set_icon(self, icon):
         self.update(icon=icon)
 
+    def update(self, icon=None, hover_text=None):
+        """Updates the tray icon and/or hover text, skipping values that didn't change"""
+        with self._update_lock:
+            if icon == self._icon:
+                icon = None
+            if hover_text == self._hover_text:
+                hover_text = None
+            if icon is None and hover_text is None:
+                return
+            self.updates_count += 1
+            super().update(icon=icon, hover_text=hover_text)
+
+    def _load_icon(self):
+        hicon = self._icon_handles.get(self._icon)
+        if not hicon:
+            super()._load_icon()
+            return
+        if not self._icon_shared and self._hicon:
+            win32gui.DestroyIcon(self._hicon)
+        self._hicon = hicon
+        self._icon_shared = True  # Owned by the animation class, must not be destroyed by the tray
+
     @staticmethod
     def _on_quit_default(systray):
         quit_event.set()
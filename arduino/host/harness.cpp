@@ -0,0 +1,216 @@
+/*
+ * Host harness for the rgb_temps sketch: compiles the sketch with g++ against the stand-ins in stubs/.
+ *
+ * Usage:
+ *   harness render [-f frames] [-t frame_us] [-s seed] [-c "frame:command"]... [-i commands_file]
+ *       Runs the sketch on a deterministic clock and prints every strip show() as
+ *       "<frame> <pin> r g b r g b ..." lines on stdout, serial output goes to stderr.
+ *   harness bench [-n iterations]
+ *       Benchmarks parseCommand(), RingLights::loopStep() and the full loop().
+ *   harness pty [-t frame_us]
+ *       Runs the sketch in real time on a pseudo-terminal, prints the pty path on stdout:
+ *       the python side can then connect to it as if it were the board.
+ */
+
+#include <algorithm>
+#include <chrono>
+#include <string>
+#include <vector>
+#include <utility>
+#include <stdio.h>
+#include <stdlib.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <termios.h>
+
+#include "Arduino.h"
+#include "host.h"
+
+#include "rgb_temps.ino"
+
+
+void (*Adafruit_NeoPixel::onShow)(Adafruit_NeoPixel& strip) = nullptr;
+
+static unsigned long currentFrame = 0;
+
+static void printShow(Adafruit_NeoPixel& strip) {
+    printf("%lu %u", currentFrame, strip.pin);
+    for (uint16_t i=0; i<strip.numLEDs*3; i++)
+        printf(" %u", strip.pixels[i]);
+    printf("\n");
+}
+
+static void drainSerial(FILE* stream) {
+    std::string output = Serial.takeOutput();
+    if (stream && !output.empty())
+        fwrite(output.data(), 1, output.size(), stream);
+}
+
+static double elapsedSeconds(std::chrono::steady_clock::time_point start) {
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+}
+
+static void printBench(const char* name, unsigned long iterations, double seconds) {
+    printf("%-24s %10lu iterations  %10.3f us/op  %12.0f ops/s\n",
+           name, iterations, 1e6 * seconds / iterations, iterations / seconds);
+}
+
+
+/* --------------------------------- MODES --------------------------------- */
+
+
+static int runRender(unsigned long frames, unsigned long frameMicros,
+                     std::vector<std::pair<unsigned long, std::string> >& commands) {
+    setup();
+    drainSerial(stderr);
+    Adafruit_NeoPixel::onShow = printShow;
+    size_t nextCommand = 0;
+    for (currentFrame=0; currentFrame<frames; currentFrame++) {
+        while (nextCommand < commands.size() && commands[nextCommand].first <= currentFrame) {
+            Serial.feed(commands[nextCommand].second.c_str());
+            Serial.feed("\n");
+            nextCommand++;
+        }
+        hostClockAdvance(frameMicros);
+        loop();
+        drainSerial(stderr);
+    }
+    return 0;
+}
+
+static int runBench(unsigned long iterations) {
+    setup();
+    drainSerial(nullptr);
+
+    char cmdBuffer[CMD_BUFFER_SIZE+1];
+    const char* command = "U 1 128 64 32";
+    auto start = std::chrono::steady_clock::now();
+    for (unsigned long n=0; n<iterations; n++) {
+        strncpy(cmdBuffer, command, CMD_BUFFER_SIZE);  // strtok modifies the buffer
+        parseCommand(cmdBuffer);
+        Serial.output.clear();
+    }
+    printBench("parseCommand", iterations, elapsedSeconds(start));
+
+    for (uint8_t i=0; i<ringsCount; i++) {
+        start = std::chrono::steady_clock::now();
+        for (unsigned long n=0; n<iterations; n++)
+            rings[i]->loopStep();
+        char name[32];
+        snprintf(name, sizeof(name), "loopStep (ring %d)", i + 1);
+        printBench(name, iterations, elapsedSeconds(start));
+    }
+
+    start = std::chrono::steady_clock::now();
+    for (unsigned long n=0; n<iterations; n++) {
+        hostClockAdvance(1000);
+        loop();
+    }
+    printBench("loop", iterations, elapsedSeconds(start));
+    return 0;
+}
+
+static int runPty(unsigned long frameMicros) {
+    int master = posix_openpt(O_RDWR | O_NOCTTY);
+    if (master < 0 || grantpt(master) < 0 || unlockpt(master) < 0) {
+        perror("Failed creating pty");
+        return 1;
+    }
+    const char* slavePath = ptsname(master);
+    // Keep a slave descriptor open, so the master doesn't hang up when the python side reconnects
+    int slave = open(slavePath, O_RDWR | O_NOCTTY);
+    struct termios tio;
+    tcgetattr(slave, &tio);
+    cfmakeraw(&tio);
+    tcsetattr(slave, TCSANOW, &tio);
+    fcntl(master, F_SETFL, fcntl(master, F_GETFL) | O_NONBLOCK);
+
+    printf("%s\n", slavePath);
+    fflush(stdout);
+
+    hostClockRealtime(true);
+    Serial.fd = master;
+    Serial.captureOutput = false;
+    setup();
+    while (true) {
+        loop();
+        if (frameMicros)
+            usleep(frameMicros);
+    }
+    close(slave);
+    return 0;
+}
+
+
+/* ---------------------------------- MAIN --------------------------------- */
+
+
+static void usage(const char* name) {
+    fprintf(stderr, "Usage: %s render|bench|pty [-f frames] [-t frame_us] [-n iterations] [-s seed]"
+                    " [-c frame:command]... [-i commands_file]\n", name);
+}
+
+static bool parseTimedCommand(const char* spec, std::vector<std::pair<unsigned long, std::string> >& commands) {
+    const char* sep = strchr(spec, ':');
+    if (!sep)
+        return false;
+    commands.push_back(std::make_pair(strtoul(spec, nullptr, 10), std::string(sep + 1)));
+    return true;
+}
+
+int main(int argc, char** argv) {
+    if (argc < 2) {
+        usage(argv[0]);
+        return 2;
+    }
+    std::string mode = argv[1];
+    unsigned long frames = 1000, frameMicros = 10000, iterations = 100000;
+    std::vector<std::pair<unsigned long, std::string> > commands;
+
+    int opt;
+    optind = 2;
+    while ((opt = getopt(argc, argv, "f:t:n:s:c:i:")) != -1) {
+        switch (opt) {
+            case 'f': frames = strtoul(optarg, nullptr, 10); break;
+            case 't': frameMicros = strtoul(optarg, nullptr, 10); break;
+            case 'n': iterations = strtoul(optarg, nullptr, 10); break;
+            case 's': randomSeed(strtoul(optarg, nullptr, 10)); break;
+            case 'c':
+                if (!parseTimedCommand(optarg, commands)) {
+                    usage(argv[0]);
+                    return 2;
+                }
+                break;
+            case 'i': {
+                FILE* fp = fopen(optarg, "r");
+                if (!fp) {
+                    perror(optarg);
+                    return 1;
+                }
+                char line[256];
+                while (fgets(line, sizeof(line), fp)) {
+                    line[strcspn(line, "\r\n")] = '\0';
+                    if (line[0] && line[0] != '#')
+                        parseTimedCommand(line, commands);
+                }
+                fclose(fp);
+                break;
+            }
+            default:
+                usage(argv[0]);
+                return 2;
+        }
+    }
+    std::stable_sort(commands.begin(), commands.end(),
+                     [](const std::pair<unsigned long, std::string>& a,
+                        const std::pair<unsigned long, std::string>& b) { return a.first < b.first; });
+
+    if (mode == "render")
+        return runRender(frames, frameMicros, commands);
+    if (mode == "bench")
+        return runBench(iterations);
+    if (mode == "pty")
+        return runPty(frameMicros);
+    usage(argv[0]);
+    return 2;
+}
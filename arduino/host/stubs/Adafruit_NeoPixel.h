@@ -0,0 +1,55 @@
+#ifndef __HOST_ADAFRUIT_NEOPIXEL_H__
+#define __HOST_ADAFRUIT_NEOPIXEL_H__
+
+#include "Arduino.h"
+
+typedef uint16_t neoPixelType;
+
+#define NEO_RGB  ((0<<6) | (0<<4) | (1<<2) | (2))
+#define NEO_GRB  ((1<<6) | (1<<4) | (0<<2) | (2))
+#define NEO_KHZ800 0x0000
+#define NEO_KHZ400 0x0100
+
+/*
+ * NeoPixel strip stand-in: keeps the RGB pixel buffer and reports every show() to the harness.
+ */
+class Adafruit_NeoPixel {
+    public:
+        typedef void (*ShowCallback)(Adafruit_NeoPixel& strip);
+        static ShowCallback onShow;
+
+        uint16_t numLEDs;
+        uint16_t pin;
+        uint8_t brightness = 0;
+        uint8_t* pixels;
+        unsigned long showCount = 0;
+
+        Adafruit_NeoPixel(uint16_t n, uint16_t p=6, neoPixelType t=NEO_GRB + NEO_KHZ800) : numLEDs(n), pin(p) {
+            pixels = new uint8_t[n * 3]();
+        }
+        ~Adafruit_NeoPixel() { delete[] pixels; }
+        void begin() {}
+        void show() {
+            showCount++;
+            if (onShow)
+                onShow(*this);
+        }
+        void setBrightness(uint8_t b) { brightness = b; }
+        void setPixelColor(uint16_t n, uint8_t r, uint8_t g, uint8_t b) {
+            if (n >= numLEDs)
+                return;
+            pixels[3*n] = r; pixels[3*n+1] = g; pixels[3*n+2] = b;
+        }
+        uint32_t getPixelColor(uint16_t n) const {
+            if (n >= numLEDs)
+                return 0;
+            return ((uint32_t)pixels[3*n] << 16) | ((uint32_t)pixels[3*n+1] << 8) | pixels[3*n+2];
+        }
+        static uint32_t Color(uint8_t r, uint8_t g, uint8_t b) {
+            return ((uint32_t)r << 16) | ((uint32_t)g << 8) | b;
+        }
+        uint16_t numPixels() const { return numLEDs; }
+        uint8_t* getPixels() const { return pixels; }
+};
+
+#endif
@@ -0,0 +1,40 @@
+#ifndef __HOST_ARDUINO_H__
+#define __HOST_ARDUINO_H__
+
+/*
+ * Minimal host (g++) stand-in for the Arduino core, only covering what the rgb_temps sketch uses.
+ */
+
+#include <stdint.h>
+#include <stdlib.h>
+#include <stdarg.h>
+#include <string.h>
+#include <math.h>
+
+#include "HardwareSerial.h"
+
+// NOTE: like the real core, this defines min/max macros: include standard C++ headers before this one
+
+#define PROGMEM
+#define pgm_read_byte(addr)  (*(const uint8_t*)(addr))
+
+#ifndef PI
+#define PI 3.1415926535897932384626433832795
+#endif
+
+#define min(a,b) ((a)<(b)?(a):(b))
+#define max(a,b) ((a)>(b)?(a):(b))
+#define constrain(amt,low,high) ((amt)<(low)?(low):((amt)>(high)?(high):(amt)))
+
+typedef uint8_t byte;
+
+unsigned long micros();
+unsigned long millis();
+void delay(unsigned long ms);
+void delayMicroseconds(unsigned int us);
+
+long random(long howbig);
+long random(long howsmall, long howbig);
+void randomSeed(unsigned long seed);
+
+#endif
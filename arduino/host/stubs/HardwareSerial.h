@@ -0,0 +1,66 @@
+#ifndef __HOST_HARDWARESERIAL_H__
+#define __HOST_HARDWARESERIAL_H__
+
+#include <stdint.h>
+#include <stddef.h>
+#include <stdarg.h>
+#include <string>
+#include <deque>
+
+#define DEC 10
+#define HEX 16
+#define OCT 8
+#define BIN 2
+
+/*
+ * Serial stand-in: input is fed by the harness (or read from a pty), output is captured and optionally
+ * forwarded to the pty.
+ */
+class HardwareSerial {
+    public:
+        std::deque<uint8_t> input;
+        std::string output;
+        bool captureOutput = true;
+        int fd = -1;  // pty master, if any
+        unsigned long baud = 0;
+        unsigned long timeout = 1000;
+
+        void begin(unsigned long _baud) { baud = _baud; }
+        void end() {}
+        void setTimeout(unsigned long _timeout) { timeout = _timeout; }
+        void feed(const char* data);
+        void feed(const uint8_t* data, size_t len);
+
+        int available();
+        int peek();
+        int read();
+        size_t readBytesUntil(char terminator, char* buffer, size_t length);
+        size_t readBytes(char* buffer, size_t length);
+        void flush() {}
+
+        size_t write(uint8_t c);
+        size_t write(const uint8_t* buffer, size_t size);
+        size_t print(const char* s);
+        size_t print(const std::string& s) { return print(s.c_str()); }
+        size_t print(char c) { return write((uint8_t)c); }
+        size_t print(unsigned char n, int base=DEC) { return print((unsigned long)n, base); }
+        size_t print(int n, int base=DEC) { return print((long)n, base); }
+        size_t print(unsigned int n, int base=DEC) { return print((unsigned long)n, base); }
+        size_t print(long n, int base=DEC);
+        size_t print(unsigned long n, int base=DEC);
+        size_t print(double n, int digits=2);
+        template <typename T> size_t println(T value) { size_t n = print(value); return n + println(); }
+        template <typename T> size_t println(T value, int format) { size_t n = print(value, format); return n + println(); }
+        size_t println() { return print("\r\n"); }
+
+        std::string takeOutput() { std::string out; out.swap(output); return out; }
+
+        operator bool() { return true; }
+
+    private:
+        void pollFd();
+};
+
+extern HardwareSerial Serial;
+
+#endif
@@ -0,0 +1,221 @@
+#include <chrono>
+#include <thread>
+#include <string>
+#include <stdio.h>
+#include <unistd.h>
+#include <poll.h>
+
+#include "Arduino.h"
+#include "host.h"
+
+
+/* --------------------------------- CLOCK --------------------------------- */
+
+
+static bool clockRealtime = false;
+static uint64_t clockMicros = 0;
+static const std::chrono::steady_clock::time_point clockStart = std::chrono::steady_clock::now();
+
+void hostClockRealtime(bool realtime) {
+    clockRealtime = realtime;
+}
+
+void hostClockAdvance(unsigned long us) {
+    if (!clockRealtime)
+        clockMicros += us;
+}
+
+uint64_t hostClockMicros() {
+    if (clockRealtime)
+        return std::chrono::duration_cast<std::chrono::microseconds>(
+            std::chrono::steady_clock::now() - clockStart).count();
+    return clockMicros;
+}
+
+unsigned long micros() {
+    return (unsigned long)hostClockMicros();
+}
+
+unsigned long millis() {
+    return (unsigned long)(hostClockMicros() / 1000);
+}
+
+void delay(unsigned long ms) {
+    delayMicroseconds(ms * 1000);
+}
+
+void delayMicroseconds(unsigned int us) {
+    if (clockRealtime)
+        std::this_thread::sleep_for(std::chrono::microseconds(us));
+    else
+        hostClockAdvance(us);
+}
+
+
+/* --------------------------------- RANDOM -------------------------------- */
+
+
+// Same "minimal standard" generator as avr-libc random(), so sequences match the board for the same seed
+static uint32_t randomState = 1;
+
+static long doRandom() {
+    long hi, lo, x;
+    x = randomState;
+    if (x == 0)
+        x = 123459876L;
+    hi = x / 127773L;
+    lo = x % 127773L;
+    x = 16807L * lo - 2836L * hi;
+    if (x < 0)
+        x += 0x7fffffffL;
+    randomState = x;
+    return x % ((uint32_t)0x7fffffffL + 1);
+}
+
+long random(long howbig) {
+    if (howbig == 0)
+        return 0;
+    return doRandom() % howbig;
+}
+
+long random(long howsmall, long howbig) {
+    if (howsmall >= howbig)
+        return howsmall;
+    return random(howbig - howsmall) + howsmall;
+}
+
+void randomSeed(unsigned long seed) {
+    if (seed != 0)
+        randomState = seed;
+}
+
+
+/* --------------------------------- SERIAL -------------------------------- */
+
+
+HardwareSerial Serial;
+
+void HardwareSerial::feed(const char* data) {
+    feed((const uint8_t*)data, strlen(data));
+}
+
+void HardwareSerial::feed(const uint8_t* data, size_t len) {
+    input.insert(input.end(), data, data + len);
+}
+
+void HardwareSerial::pollFd() {
+    if (fd < 0)
+        return;
+    uint8_t buffer[256];
+    ssize_t n;
+    while ((n = ::read(fd, buffer, sizeof(buffer))) > 0)
+        feed(buffer, n);
+}
+
+int HardwareSerial::available() {
+    pollFd();
+    return input.size();
+}
+
+int HardwareSerial::peek() {
+    if (!available())
+        return -1;
+    return input.front();
+}
+
+int HardwareSerial::read() {
+    if (!available())
+        return -1;
+    uint8_t c = input.front();
+    input.pop_front();
+    return c;
+}
+
+static int timedRead(HardwareSerial& serial) {
+    unsigned long start = millis();
+    do {
+        int c = serial.read();
+        if (c >= 0)
+            return c;
+        if (!clockRealtime) {  // Nothing else will ever arrive: account for the full wait and give up
+            hostClockAdvance(serial.timeout * 1000);
+            return -1;
+        }
+        if (serial.fd >= 0) {
+            struct pollfd pfd = {serial.fd, POLLIN, 0};
+            poll(&pfd, 1, 1);
+        }
+    } while (millis() - start < serial.timeout);
+    return -1;
+}
+
+size_t HardwareSerial::readBytesUntil(char terminator, char* buffer, size_t length) {
+    size_t index = 0;
+    while (index < length) {
+        int c = timedRead(*this);
+        if (c < 0 || c == terminator)
+            break;
+        buffer[index++] = (char)c;
+    }
+    return index;
+}
+
+size_t HardwareSerial::readBytes(char* buffer, size_t length) {
+    size_t count = 0;
+    while (count < length) {
+        int c = timedRead(*this);
+        if (c < 0)
+            break;
+        buffer[count++] = (char)c;
+    }
+    return count;
+}
+
+size_t HardwareSerial::write(uint8_t c) {
+    return write(&c, 1);
+}
+
+size_t HardwareSerial::write(const uint8_t* buffer, size_t size) {
+    if (captureOutput)
+        output.append((const char*)buffer, size);
+    if (fd >= 0) {
+        size_t written = 0;
+        while (written < size) {
+            ssize_t n = ::write(fd, buffer + written, size - written);
+            if (n < 0)
+                break;
+            written += n;
+        }
+    }
+    return size;
+}
+
+size_t HardwareSerial::print(const char* s) {
+    return write((const uint8_t*)s, strlen(s));
+}
+
+size_t HardwareSerial::print(unsigned long n, int base) {
+    char buffer[8 * sizeof(long) + 1];
+    char* str = &buffer[sizeof(buffer) - 1];
+    *str = '\0';
+    if (base < 2)
+        base = 10;
+    do {
+        char c = n % base;
+        n /= base;
+        *--str = c < 10 ? c + '0' : c + 'A' - 10;
+    } while (n);
+    return print(str);
+}
+
+size_t HardwareSerial::print(long n, int base) {
+    if (base == 10 && n < 0)
+        return print('-') + print((unsigned long)-n, base);
+    return print((unsigned long)n, base);
+}
+
+size_t HardwareSerial::print(double n, int digits) {
+    char buffer[64];
+    snprintf(buffer, sizeof(buffer), "%.*f", digits, n);
+    return print(buffer);
+}
@@ -0,0 +1,15 @@
+#ifndef __HOST_HOST_H__
+#define __HOST_HOST_H__
+
+/*
+ * Harness controls for the host stand-ins of the Arduino core.
+ */
+
+#include <stdint.h>
+
+// Deterministic clock (default): time only advances through hostClockAdvance() or blocking serial reads
+void hostClockRealtime(bool realtime);
+void hostClockAdvance(unsigned long us);
+uint64_t hostClockMicros();
+
+#endif
@@ -0,0 +1,48 @@
+#ifndef __FIXED_POINT_H__
+#define __FIXED_POINT_H__
+
+#include <stdint.h>
+#include <Arduino.h>
+
+/*
+ * Fixed-point helpers for the integer effects engine (see LIGHTS_FIXED_POINT in lights.h).
+ *
+ * q8_t:   Q8.8 signed, used for per-pixel strengths (Q8_ONE == 1.0)
+ * q16_t:  Q16.16 signed, used for LED positions / offsets (Q16_ONE == 1.0)
+ * frac16: unsigned 0.16 fraction, used for smoothed sensor values and wrapping phases (65535 ~= 1.0)
+ */
+
+typedef int16_t q8_t;
+typedef int32_t q16_t;
+typedef uint16_t frac16_t;
+
+#define Q8_ONE   256
+#define Q16_ONE  65536L
+#define FRAC16_MAX  65535U
+
+#define FLOAT_TO_Q8(x)  ((q8_t)((x) * Q8_ONE + 0.5))
+
+// Products are rounded to nearest, truncating would bias colors towards darker values
+
+inline q8_t mulQ8(q8_t a, q8_t b) {
+    return ((int32_t)a * b + 128) >> 8;
+}
+
+inline int16_t mixQ8(int16_t first, int16_t second, q8_t strength) {
+    return first + (((int32_t)(second - first) * strength + 128) >> 8);
+}
+
+inline q8_t frac16ToQ8(frac16_t x) {
+    return ((uint32_t)x + 128) >> 8;
+}
+
+inline frac16_t mulFrac16(frac16_t a, frac16_t b) {
+    return ((uint32_t)a * b + 32768) >> 16;
+}
+
+inline q8_t clampQ8(int32_t x) {
+    return x < 0 ? 0 : (x > Q8_ONE ? Q8_ONE : x);
+}
+
+
+#endif
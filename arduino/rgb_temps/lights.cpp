@@ -1,14 +1,46 @@
 #include "lights.h"
 
 
-float randFloat() {
-    return random(512) / 511.0;
-}
-
 float mixValues(float firstValue, float secondValue, float strength) {
     return (1.0 - strength) * firstValue + strength * secondValue;
 }
 
+// Only marks the frame dirty when the (gamma mapped) output color actually changes
+void RingLights::setPixel(uint16_t i, uint8_t r, uint8_t g, uint8_t b) {
+    if (strip->getPixelColor(i) != Adafruit_NeoPixel::Color(r, g, b)) {
+        strip->setPixelColor(i, r, g, b);
+        frameDirty = true;
+    }
+}
+
+// Pushing the strip disables interrupts for ~30us per LED (serial bytes can get lost): skip unchanged frames
+void RingLights::showStrip() {
+    unsigned long now = millis();
+    if (frameDirty || now - lastShowMillis >= SHOW_MAX_AGE_MS) {
+        strip->show();
+        lastShowMillis = now;
+        frameDirty = false;
+        shownFrames++;
+    } else
+        skippedFrames++;
+}
+
+// Shows the alarm blink "on" phase instead of the effects, returns false if there's nothing to show
+bool RingLights::displayAlarm() {
+    if (!alarm || (millis() / ALARM_BLINK_MS) % 2)
+        return false;
+    for (uint16_t i=0; i<numLEDs; i++)
+        setPixel(i, ALARM_COLOR);
+    showStrip();
+    return true;
+}
+
+#ifndef LIGHTS_FIXED_POINT  // Fixed-point implementation in lights_fixed.cpp
+
+float randFloat() {
+    return random(512) / 511.0;
+}
+
 uint8_t applyGamma(float input) {
     uint32_t index = min(GAMMA_TABLE_SIZE - 1, uint32_t((GAMMA_TABLE_SIZE - 1) * input / 255.0));
     return pgm_read_byte(&_GammaTable[index]);
@@ -26,6 +58,10 @@ RingLights::RingLights(uint16_t _stripPin, uint16_t _numLEDs, neoPixelType strip
 }
 
 void RingLights::initRing() {
+    // Effect tables phase per LED: the hue wheel spans the whole ring, the dim curve repeats twice
+    hueScale = EFFECT_TABLE_SIZE / float(numLEDs);
+    dimScale = 2 * EFFECT_TABLE_SIZE / float(numLEDs);
+
     for (uint16_t i=0; i<numLEDs; i++)
         ringFlameForce[i] = 0.0;
 
@@ -55,7 +91,7 @@ void RingLights::mixFlame(Color& outColor, Color& idleColor, float flameForce, f
 
 // TODO: Consider making this function signature a generic interface for more effects (per pixel calculation?)
 Color RingLights::makeIdle(float pos, float offset=0.0) {
-    return Color::fromHSV(fmod((pos + offset) / numLEDs, 1.0), 1.0, 1.0);
+    return Color::fromWheel(uint16_t((pos + offset) * hueScale));  // uint8_t phase wraps like fmod
 }
 
 void RingLights::mixIdle(Color& outColor, float pos, float offset=0.0, float mixStrength=1.0) {
@@ -66,18 +102,9 @@ void RingLights::mixIdle(Color& outColor, float pos, float offset=0.0, float mix
 }
 
 void RingLights::mixDim(Color& outColor, float pos, float offset=0.0, float mixStrength=1.0) {
-//    float baseDim = fabs(((fmod(pos + offset, period)) - (period / 2)) / float(period / 2));
-    const uint8_t repeats = 2;
-    float baseDim = (pos + offset) / (numLEDs / float(repeats));
-    baseDim -= int(baseDim);  // == FMOD 1.0
-    baseDim = 1.0 - baseDim; baseDim *= baseDim; baseDim = 1.0 - baseDim;
-//    baseDim = pow(baseDim, 0.33333333);
-    baseDim = (1.0 + sin(2.0 * PI * (baseDim + 0.25))) / 2.0;
-//    baseDim *= baseDim;
-//    baseDim = pow(baseDim, 1.5);
-//    baseDim = 1.0 - baseDim;
-//    float baseDim = (1.0 + cos(2.0 * PI * (pos + offset) / (numLEDs / 2.0))) / 2.0;
-    if (baseDim) {
+    uint8_t dim = dimCurve(uint16_t((pos + offset) * dimScale));  // uint8_t phase wraps like fmod
+    if (dim) {
+        float baseDim = dim / 255.0;
 //        baseDim *= 1.125;
 //        mixStrength = pow(mixStrength, 0.5);
 //        baseDim *= (1.0 - 0.125 * randFloat());
@@ -88,6 +115,8 @@ void RingLights::mixDim(Color& outColor, float pos, float offset=0.0, float mixS
 }
 
 void RingLights::displayRing() {
+    if (displayAlarm())
+        return;
     for (uint16_t i=0; i<numLEDs; i++) {
         // Get actual decimal offset based on rotation for current position
         Color mix;
@@ -123,9 +152,9 @@ void RingLights::displayRing() {
         uint8_t g = applyGamma(max(0.0, min(255.0, mix.g)));
         uint8_t b = applyGamma(max(0.0, min(255.0, mix.b)));
         // Gamma and set
-        strip->setPixelColor(i, r, g, b);
+        setPixel(i, r, g, b);
     }
-    strip->show();
+    showStrip();
 }
 
 void RingLights::updateContext() {
@@ -182,6 +211,10 @@ void RingLights::setSensors(float _heat, float _load, float _rpm) {
     settingRpm = _rpm;
 }
 
+void RingLights::setRawSensors(uint8_t rawHeat, uint8_t rawLoad, uint8_t rawRpm) {
+    setSensors(rawHeat / 255.0, rawLoad / 255.0, rawRpm / 255.0);
+}
+
 void RingLights::setFps(float _fps) {
     fpsAvg = _fps;
 }
@@ -191,3 +224,4 @@ void RingLights::loopStep() {
     displayRing();
 }
 
+#endif
@@ -1,6 +1,18 @@
 #include <math.h>
 #include <Adafruit_NeoPixel.h>
 #include "fast_hsv2rgb.h"
+#include "effect_tables.h"
+
+
+// Use the integer (fixed-point) effects engine instead of float math: much faster on AVR boards without FPU.
+// Comment out (or define LIGHTS_FLOAT_POINT) to build the reference float implementation.
+#ifndef LIGHTS_FLOAT_POINT
+    #define LIGHTS_FIXED_POINT
+#endif
+
+#ifdef LIGHTS_FIXED_POINT
+    #include "fixed_point.h"
+#endif
 
 
 
@@ -13,6 +25,9 @@
 #define RING_HOT_COLOR        191.0,   0.0,   0.0
 #define RINGFLAME_HOT_COLOR   255.0, 159.0,   0.0
 #define SETTING_SMOOTHING        64
+#define SHOW_MAX_AGE_MS        1000  // Unchanged frames are pushed to the strip again after this time anyway
+#define ALARM_COLOR      255, 0, 0  // Gamma mapped
+#define ALARM_BLINK_MS          250
 #define INITIAL_VALUES          0.5
 
 #define GAMMA_TABLE_SIZE 512
@@ -55,10 +70,12 @@ const uint8_t PROGMEM _GammaTable[GAMMA_TABLE_SIZE] = {  /* gamma = 1.4 */
 /* -------------------------------- CLASSES -------------------------------- */
 
 
-float randFloat();
-
 float mixValues(float firstValue, float secondValue, float strength);
 
+#ifndef LIGHTS_FIXED_POINT
+
+float randFloat();
+
 class Color {
     public:
         float r, g, b;
@@ -74,9 +91,11 @@ class Color {
         }
         Color operator *= (Color const &other) {
             r *= other.r; g *= other.g; b *= other.b;
+            return *this;
         }
         Color operator *= (float const other) {
             r *= other; g *= other; b *= other;
+            return *this;
         }
         Color operator * (Color const &other) {
             Color result = Color(r, g, b);
@@ -111,20 +130,73 @@ class Color {
             fast_hsv2rgb_32bit(h, s, v, &r, &g, &b);
             return Color(r, g, b);
         }
+        static Color fromWheel(uint8_t phase) {
+            uint8_t r, g, b;
+            hueWheel(phase, &r, &g, &b);
+            return Color(r, g, b);
+        }
 };
 
 
 uint8_t applyGamma(float input);
 
+#else
+
+// Integer color, channels are 0-255 but may temporarily overshoot (eg. flame cool color) before clipping
+class Color {
+    public:
+        int16_t r, g, b;
+
+        Color() {
+            r = 0; g = 0; b = 0;
+        }
+        Color(int16_t _r, int16_t _g, int16_t _b) {
+            set(_r, _g, _b);
+        }
+        void set(int16_t _r, int16_t _g, int16_t _b) {
+            r = _r; g = _g; b = _b;
+        }
+        void scale(q8_t strength) {
+            r = mulQ8(r, strength); g = mulQ8(g, strength); b = mulQ8(b, strength);
+        }
+        void setMixed(Color& firstColor, Color& secondColor, q8_t strength) {
+            r = mixQ8(firstColor.r, secondColor.r, strength);
+            g = mixQ8(firstColor.g, secondColor.g, strength);
+            b = mixQ8(firstColor.b, secondColor.b, strength);
+        }
+        static Color fromMix(Color& firstColor, Color& secondColor, q8_t strength) {
+            Color newColor;
+            newColor.setMixed(firstColor, secondColor, strength);
+            return newColor;
+        }
+        void mixWith(Color& secondColor, q8_t strength) {
+            setMixed(*this, secondColor, strength);
+        }
+        static Color fromWheel(uint8_t phase) {
+            uint8_t r, g, b;
+            hueWheel(phase, &r, &g, &b);
+            return Color(r, g, b);
+        }
+};
+
+
+uint8_t applyGamma(int16_t input);
+
+#endif
+
 
 // TODO: Add more light effects
 // TODO: Add idle effect mode (like rainbow, when load & temp < threshold%)
 
+#ifndef LIGHTS_FIXED_POINT
+
 class RingLights {
     private:
         uint16_t stripPin, numLEDs;
         Adafruit_NeoPixel* strip;
         uint16_t period = 8;
+        bool frameDirty = true;
+        unsigned long lastShowMillis = 0;
 
         // Update Context
         float invSmooth = 1.0 / SETTING_SMOOTHING;
@@ -135,6 +207,7 @@ class RingLights {
         float entropy = 0.0;
         float fade = 0.0;
         float fpsAvg = 30.0;
+        float hueScale, dimScale;  // Effect table phase per LED
 
         void mixFlame(Color& outColor, Color& idleColor, float flameForce, float heat, float dim=1.0);
         Color makeIdle(float pos, float offset=0.0);
@@ -142,6 +215,9 @@ class RingLights {
         void mixDim(Color& outColor, float pos, float offset, float mixStrength);
         void updateIdle();
         void updateContext();
+        void setPixel(uint16_t i, uint8_t r, uint8_t g, uint8_t b);
+        void showStrip();
+        bool displayAlarm();
 
     public:
         Color* ringPixels;
@@ -156,6 +232,9 @@ class RingLights {
         bool idleDynamic = true;
         float dimSpeedup = 1.125;
 
+        uint32_t shownFrames = 0, skippedFrames = 0;
+        bool alarm = false;  // Blinks the whole ring with ALARM_COLOR, overriding the other effects
+
         uint16_t settingSmoothing = SETTING_SMOOTHING;
         float settingHeat = INITIAL_VALUES, settingLoad = INITIAL_VALUES, settingRpm = INITIAL_VALUES;
         float heat, load, rpm;
@@ -166,7 +245,70 @@ class RingLights {
         void displayRing();
         void updateRing();
         void setSensors(float _heat, float _load, float _rpm);
+        void setRawSensors(uint8_t rawHeat, uint8_t rawLoad, uint8_t rawRpm);
+        void setFps(float _fps);
+        void loopStep();
+        uint16_t getNumLEDs() { return numLEDs; }
+};
+
+#else
+
+#define FLAME_FORCE_MID  (100L << 8)  // Flame force is Q8.8, range 0.0-200.0
+#define FLAME_FORCE_MAX  (200L << 8)
+
+class RingLights {
+    private:
+        uint16_t stripPin, numLEDs;
+        Adafruit_NeoPixel* strip;
+        uint16_t period = 8;
+        bool frameDirty = true;
+        unsigned long lastShowMillis = 0;
+
+        // Update Context
+        q16_t rotationScale = 1.5 * 24.0 / 30.0 * Q16_ONE;  // LEDs per frame at full rpm
+        uint16_t rotationFps = 0;  // Whole fps rotationScale was computed for
+        uint32_t entropy = 0;
+        frac16_t hueStep, dimStep;  // Effect table phase per LED
+
+        frac16_t phaseStep(uint32_t turn);
+        void updateIdle();
+        void updateContext();
+        void setPixel(uint16_t i, uint8_t r, uint8_t g, uint8_t b);
+        void showStrip();
+        bool displayAlarm();
+
+    public:
+        Color* ringPixels;
+        float rotationBaseSpeed = 24.0;
+        q16_t ringOffset = 0;
+        Color ringBaseColor = Color(RING_BASE_COLOR);
+        Color ringHotColor  = Color(RING_HOT_COLOR);
+        uint16_t* ringFlameForce;
+        Color ringFlameHotColor  = Color(RINGFLAME_HOT_COLOR);
+        q8_t ringBrightness = Q8_ONE;
+        q8_t idleBrightness = FLOAT_TO_Q8(0.5);
+        bool idleDynamic = true;
+        q8_t dimSpeedup = FLOAT_TO_Q8(1.125);
+
+        uint32_t shownFrames = 0, skippedFrames = 0;
+        bool alarm = false;  // Blinks the whole ring with ALARM_COLOR, overriding the other effects
+
+        uint16_t settingSmoothing = SETTING_SMOOTHING;
+        frac16_t settingHeat = INITIAL_VALUES * FRAC16_MAX;
+        frac16_t settingLoad = INITIAL_VALUES * FRAC16_MAX;
+        frac16_t settingRpm = INITIAL_VALUES * FRAC16_MAX;
+        frac16_t heat, load, rpm;
+
+        RingLights();
+        RingLights(uint16_t stripPin, uint16_t numLEDs, neoPixelType stripType=DEFAULT_STRIP_TYPE);
+        void initRing();
+        void displayRing();
+        void updateRing();
+        void setSensors(float _heat, float _load, float _rpm);
+        void setRawSensors(uint8_t rawHeat, uint8_t rawLoad, uint8_t rawRpm);
         void setFps(float _fps);
         void loopStep();
+        uint16_t getNumLEDs() { return numLEDs; }
 };
 
+#endif
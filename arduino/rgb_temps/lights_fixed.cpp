@@ -0,0 +1,201 @@
+#include "lights.h"
+
+#ifdef LIGHTS_FIXED_POINT  // Reference float implementation in lights.cpp
+
+
+uint8_t applyGamma(int16_t input) {
+    if (input <= 0)
+        return pgm_read_byte(&_GammaTable[0]);
+    if (input >= 255)
+        return pgm_read_byte(&_GammaTable[GAMMA_TABLE_SIZE - 1]);
+    // Integer equivalent of (GAMMA_TABLE_SIZE - 1) * input / 255.0 for inputs below 255
+    return pgm_read_byte(&_GammaTable[input * (GAMMA_TABLE_SIZE / 256)]);
+}
+
+RingLights::RingLights(uint16_t _stripPin, uint16_t _numLEDs, neoPixelType stripType) {
+    stripPin = _stripPin;
+    numLEDs = _numLEDs;
+    ringPixels = new Color[numLEDs];
+    ringFlameForce = new uint16_t[numLEDs];
+    strip = new Adafruit_NeoPixel(numLEDs, stripPin, stripType);
+    initRing();
+}
+
+// Rounded, and kept within 1..FRAC16_MAX: a whole turn per LED (1 or 2 LEDs rings) would wrap to a 0 step
+frac16_t RingLights::phaseStep(uint32_t turn) {
+    uint32_t step = (turn + numLEDs / 2) / numLEDs;
+    return constrain(step, 1UL, (uint32_t)FRAC16_MAX);
+}
+
+void RingLights::initRing() {
+    // Effect tables phase per LED (0.16 fraction, the tables are indexed by its high byte)
+    hueStep = phaseStep(65536UL);  // Hue wheel spans the whole ring
+    dimStep = phaseStep(131072UL);  // Dim curve repeats twice per ring
+
+    for (uint16_t i=0; i<numLEDs; i++)
+        ringFlameForce[i] = 0;
+
+    for (uint16_t i=0; i<numLEDs; i++)
+        ringPixels[i].set(0, 0, 0);
+
+    heat = settingHeat;
+    load = settingLoad;
+    rpm = settingRpm;
+
+    strip->begin();
+    strip->show();
+    strip->setBrightness(255);
+
+    updateIdle();
+    displayRing();
+}
+
+void RingLights::displayRing() {
+    if (displayAlarm())
+        return;
+
+    // Per-frame context, Q8.8 strengths
+    q8_t heat8 = frac16ToQ8(heat);
+    q8_t load8 = frac16ToQ8(load);
+    q8_t load2 = mulQ8(load8, load8);
+    q8_t idleScale = mixQ8(idleBrightness, Q8_ONE, load8);
+    q8_t flameHeatScale = (Q8_ONE + heat8) / 2;
+    q8_t invHeat8 = Q8_ONE - heat8;
+    q8_t flameHotStrength = Q8_ONE - mulQ8(invHeat8, invHeat8);
+    q8_t dimStrength = clampQ8(6L * frac16ToQ8(rpm));
+
+    // Per-LED phases are accumulated, 16-bit overflow wraps them like fmod(..., 1.0)
+    frac16_t hue = ringOffset / numLEDs;
+    frac16_t dimPhase = (((ringOffset >> 8) * dimSpeedup) * 2) / numLEDs;
+    uint16_t srcPix0 = (ringOffset >> 16) % numLEDs;
+    q8_t pixOffset = (ringOffset >> 8) & 0xFF;
+
+    for (uint16_t i=0; i<numLEDs; i++) {
+        Color mix;
+        if (idleDynamic)
+            mix = Color::fromWheel(hue >> 8);
+        else {
+            // Mix colors from offsets to create actual output base color
+            mix = ringPixels[srcPix0];
+            if (pixOffset) {
+                uint16_t srcPix1 = (srcPix0 + 1 < numLEDs) ? srcPix0 + 1 : 0;
+                mix.mixWith(ringPixels[srcPix1], pixOffset);
+            }
+        }
+        Color flameCoolColor = Color(mix.r * 3, mix.g * 3, mix.b * 3);
+        // Apply idle brightness
+        mix.scale(idleScale);
+        // Apply hot color
+        mix.mixWith(ringHotColor, heat8);
+        // Mix flame effect
+        uint16_t flameForce = ringFlameForce[i];
+        if (flameForce) {
+            int32_t flameDelta = (int32_t)flameForce - FLAME_FORCE_MID;
+            if (flameDelta < 0)
+                flameDelta = -flameDelta;
+            // (100.0 - abs(flameForce - 100.0)) / 100.0, with 655 ~= 65536 / 100
+            q8_t flameStrength = ((uint32_t)(FLAME_FORCE_MID - flameDelta) * 655) >> 16;
+            q8_t flameDim = Q8_ONE - ((192L * random(256) * load2) >> 16);  // 1.0 - 0.75 * rand * load^2
+            flameStrength = mulQ8(mulQ8(flameStrength, flameHeatScale), flameDim);
+            Color flameColor = Color::fromMix(flameCoolColor, ringFlameHotColor, flameHotStrength);
+            mix.mixWith(flameColor, flameStrength);
+        }
+        // Dim based on rotation speed
+        q8_t dimMix = ((uint16_t)dimStrength * dimCurve(dimPhase >> 8)) >> 8;
+        if (dimMix)
+            mix.mixWith(ringBaseColor, dimMix);
+        // Global brightness
+        if (ringBrightness != Q8_ONE)
+            mix.scale(ringBrightness);
+        // Value clipping, gamma and set
+        setPixel(i, applyGamma(mix.r), applyGamma(mix.g), applyGamma(mix.b));
+
+        hue += hueStep;
+        dimPhase += dimStep;
+        if (++srcPix0 >= numLEDs)
+            srcPix0 = 0;
+    }
+    showStrip();
+}
+
+void RingLights::updateContext() {
+    int32_t invSmooth = 32768L / settingSmoothing;  // Q0.15
+    heat += (((int32_t)settingHeat - heat) * invSmooth + 16384) >> 15;
+    load += (((int32_t)settingLoad - load) * invSmooth + 16384) >> 15;
+    rpm += (((int32_t)settingRpm - rpm) * invSmooth + 16384) >> 15;
+
+    frac16_t rpm3 = mulFrac16(mulFrac16(rpm, rpm), rpm);
+    // rotationScale * rpm3, split on rpm3 bytes to fit 32 bits
+    q16_t rotation = (((uint32_t)rotationScale * (rpm3 >> 8)) >> 8) + (((uint32_t)rotationScale * (rpm3 & 0xFF)) >> 16);
+    entropy = (12375UL * mulFrac16(load, load)) >> 13;  // 99000 * load^2
+
+    ringOffset += rotation;
+    q16_t wrapPeriod = ((q16_t)numLEDs * period) << 16;
+    if (ringOffset >= wrapPeriod)
+        ringOffset -= wrapPeriod;
+    else if (ringOffset < 0)
+        ringOffset += wrapPeriod;
+}
+
+void RingLights::updateIdle() {
+    frac16_t hue = 0;
+    for (uint16_t i=0; i<numLEDs; i++) {
+        ringPixels[i] = Color::fromWheel(hue >> 8);
+        hue += hueStep;
+    }
+}
+
+void RingLights::updateRing() {
+    updateContext();
+
+    for (uint8_t c=0; c<=(numLEDs / 8); c++) {
+        if (random(100000) <= entropy) {
+            uint16_t i = random(numLEDs);
+            if (ringFlameForce[i] < FLAME_FORCE_MID)
+                ringFlameForce[i] = FLAME_FORCE_MAX - ringFlameForce[i];
+            else
+                ringFlameForce[i] = FLAME_FORCE_MID + ((ringFlameForce[i] - FLAME_FORCE_MID) >> 2);
+        }
+    }
+    // flameForce *= 0.9 * (1.0 - (entropy / 150000.0) * (flameForce / 200.0)), with 129 / 2^24 ~= 0.9 / 150000 / 200 / 256 * 65536
+    uint32_t decayScale = (entropy * 129) >> 8;
+    for (uint16_t i=0; i<numLEDs; i++) {
+        uint16_t flameForce = ringFlameForce[i];
+        if (flameForce) {
+            uint32_t decay = 58982UL - ((decayScale * flameForce) >> 16);  // 58982 ~= 0.9 * 65536
+            flameForce = ((uint32_t)flameForce * decay) >> 16;
+            if (flameForce <= (1 << 8))
+                flameForce = 0;
+            ringFlameForce[i] = flameForce;
+        }
+    }
+}
+
+void RingLights::setSensors(float _heat, float _load, float _rpm) {
+    settingHeat = max(0.0, min(1.0, _heat)) * FRAC16_MAX;
+    settingLoad = max(0.0, min(1.0, _load)) * FRAC16_MAX;
+    settingRpm = max(0.0, min(1.0, _rpm)) * FRAC16_MAX;
+}
+
+void RingLights::setRawSensors(uint8_t rawHeat, uint8_t rawLoad, uint8_t rawRpm) {
+    // 255 * 257 == FRAC16_MAX
+    settingHeat = rawHeat * 257U;
+    settingLoad = rawLoad * 257U;
+    settingRpm = rawRpm * 257U;
+}
+
+void RingLights::setFps(float _fps) {
+    // Called every frame with the running average: only divides again once the whole fps changes
+    uint16_t fps = max(_fps, 1.0);
+    if (fps == rotationFps)
+        return;
+    rotationFps = fps;
+    rotationScale = rotationBaseSpeed * 1.5 * Q16_ONE / _fps;
+}
+
+void RingLights::loopStep() {
+    updateRing();
+    displayRing();
+}
+
+#endif
@@ -1,23 +1,38 @@
 #include "lights.h"
 
 
-// TODO: Consider possibility to enable debug at runtime (make it a function instead?)
+// Compiles in the log output, which is then enabled at runtime with the L command
 #define DEBUG
 
+#define LOG_NONE   0
+#define LOG_ERROR  1  // Invalid input only
+#define LOG_DEBUG  2  // Every parsed command and the current fps
+#define DEFAULT_LOG_LEVEL  LOG_ERROR
+
+uint8_t logLevel = DEFAULT_LOG_LEVEL;
+
 #ifdef DEBUG
     #include "serial_printf.h"
-    #define DEBUG_PRINT(fmt, ...)  serial_printf((Serial), (fmt "\n"), ##__VA_ARGS__)
+    #define LOG_PRINT(level, fmt, ...)  do { if (logLevel >= (level)) serial_printf((Serial), (fmt "\n"), ##__VA_ARGS__); } while (0)
 #else
-    #define DEBUG_PRINT(fmt, ...)
+    #define LOG_PRINT(level, fmt, ...)  do {} while (0)
 #endif
+#define ERROR_PRINT(fmt, ...)  LOG_PRINT(LOG_ERROR, fmt, ##__VA_ARGS__)
+#define DEBUG_PRINT(fmt, ...)  LOG_PRINT(LOG_DEBUG, fmt, ##__VA_ARGS__)
+#define PARSE_ERROR(fmt, ...)  do { parseErrors++; ERROR_PRINT(fmt, ##__VA_ARGS__); } while (0)
 
 
 
 /* ------------------------------- CONSTANTS ------------------------------- */
 
 
-#define CMD_BUFFER_SIZE  32
-#define CMD_DELIMITERS   " "
+#define PROTOCOL_VERSION  3  // 3: sequence numbered commands
+#define SERIAL_BAUD       115200   // Safe rate, used after reset and as fallback
+#define SERIAL_MAX_BAUD   1000000  // Exact on 16MHz boards (double speed mode), as is 500000
+#define BAUD_CONFIRM_MS   2000     // A new baud rate is kept only if a handshake is received at it within this time
+#define CMD_BUFFER_SIZE   32
+#define CMD_DELIMITERS    " "
+#define COMMANDS          "HTUBLSW"  // Advertised in the handshake capabilities
 
 // TODO: Consider allowing to set these parameters directly from python config (serial resets on connection anyways)
 const uint8_t ringsCount = 2;
@@ -34,36 +49,115 @@ void setupRings() {
 
 
 uint8_t mode = 1;
-const unsigned int readDelay = 1;
+
+char cmdBuffer[CMD_BUFFER_SIZE+1];
+uint8_t cmdLength = 0;
+bool cmdOverflow = false;
 
 unsigned long lastus = micros();
 float fps = 0.0;
 float fpsAvg = 0.0;
 const float fpsAvgSamples = 300.0;
 
+uint16_t parseErrors = 0;
+uint16_t droppedBytes = 0;
+
+int16_t cmdSeq = -1;  // Sequence number of the command being parsed, -1 if none
+
+bool baudPending = false;
+unsigned long baudSwitchMillis = 0;
+
 void setup() {
-    Serial.begin(115200);
-    Serial.setTimeout(readDelay);
+    Serial.begin(SERIAL_BAUD);
     setupRings();
 }
 
-void flushSerialInput() {
-    while (Serial.available())
-        Serial.read();
+// Reopens the serial port at a new rate, once the pending output has been sent at the current one
+void setBaud(unsigned long baud) {
+    Serial.flush();
+    Serial.end();
+    Serial.begin(baud);
+    cmdLength = 0;
+    cmdOverflow = false;
+}
+
+// Handshake reply, the capabilities record follows the greeting as "key=value" fields on the same line:
+// older hosts only need the greeting, unknown fields are ignored by newer ones
+void printCapabilities() {
+    Serial.print("EHLO RGBHardwareMonitor proto=");
+    Serial.print(PROTOCOL_VERSION);
+    Serial.print(" rings=");
+    Serial.print(ringsCount);
+    Serial.print(" leds=");
+    for (uint8_t i=0; i<ringsCount; i++) {
+        if (i)
+            Serial.print(',');
+        Serial.print(rings[i]->getNumLEDs());
+    }
+    Serial.print(" cmds=" COMMANDS " baud=");
+    Serial.print(SERIAL_MAX_BAUD);
+    Serial.print(" buf=");
+    Serial.print(CMD_BUFFER_SIZE);
+    Serial.print(" smooth=");
+    Serial.print(SETTING_SMOOTHING);
+    Serial.print(" fps=");
+    Serial.println(fpsAvg);
+}
+
+#ifdef __AVR__
+extern int __heap_start, *__brkval;
+
+// Bytes between the top of the heap and the stack
+int freeRam() {
+    int v;
+    return (int) &v - (__brkval == 0 ? (int) &__heap_start : (int) __brkval);
+}
+#else
+int freeRam() {
+    return -1;  // Unknown
+}
+#endif
+
+// Telemetry reply, as a single "T key=value ..." line
+void printTelemetry() {
+    uint32_t shownFrames = 0, skippedFrames = 0;
+    for (uint8_t i=0; i<ringsCount; i++) {
+        shownFrames += rings[i]->shownFrames;
+        skippedFrames += rings[i]->skippedFrames;
+    }
+    Serial.print("T fps=");
+    Serial.print(fpsAvg);
+    Serial.print(" shown=");
+    Serial.print(shownFrames);
+    Serial.print(" skipped=");
+    Serial.print(skippedFrames);
+    Serial.print(" err=");
+    Serial.print(parseErrors);
+    Serial.print(" drop=");
+    Serial.print(droppedBytes);
+    Serial.print(" ram=");
+    Serial.println(freeRam());
 }
 
 // TODO: Improve commands validation (some values get out of sync / go to zero sometimes)
 void parseCommand(char* cmdBuffer) {  // TODO: Implement commands to set custom colors, then save in Flash/EEPROM
     char cmd = NULL;
     uint8_t ringId, rawHeat, rawLoad, rawRpm;
+    uint8_t batchValues[3 * ringsCount];  // Heat, load, rpm triplets of the B command
+    uint8_t batchLength = 0;
+    uint8_t level, alarmOn;
+    unsigned long baud;
 
     uint8_t cmdPartNum = 0;
     char* cmdPart = strtok(cmdBuffer, CMD_DELIMITERS);
     while (cmdPart != NULL) {
-        if (!cmdPartNum)
+        if (!cmdPartNum) {
             cmd = cmdPart[0];
+            if (cmdPart[1])  // Sequence numbered command, eg. "U17 1 128 64 32", acknowledged with "A17" / "N17"
+                cmdSeq = atoi(cmdPart + 1);
+        }
         else {
-            if (cmd == 'H') {
+            if (cmd == 'H' || cmd == 'T') {
                 // Does not accept args for now
             } else if (cmd == 'U') {
                 int val = atoi(cmdPart);
@@ -73,8 +167,30 @@ void parseCommand(char* cmdBuffer) {  // TODO: Implement commands to set custom
                     case 3: rawLoad = val; break;
                     case 4: rawRpm = val; break;
                 }
+            } else if (cmd == 'L') {
+                if (cmdPartNum == 1)
+                    level = atoi(cmdPart);
+            } else if (cmd == 'W') {
+                int val = atoi(cmdPart);
+                switch (cmdPartNum) {
+                    case 1: ringId = val; break;
+                    case 2: alarmOn = val; break;
+                }
+            } else if (cmd == 'S') {
+                if (cmdPartNum == 1)
+                    baud = strtoul(cmdPart, NULL, 10);  // Doesn't fit an int
+            } else if (cmd == 'B') {
+                int val = atoi(cmdPart);
+                if (cmdPartNum == 1)
+                    ringId = val;
+                else if (batchLength < sizeof(batchValues))
+                    batchValues[batchLength++] = val;
+                else {
+                    PARSE_ERROR("Too many values for command %c (max %d rings)", cmd, ringsCount);
+                    return;  // Stop parsing
+                }
             } else {
-                DEBUG_PRINT("Invalid command: %c", cmd);
+                PARSE_ERROR("Invalid command: %c", cmd);
                 return;  // Stop parsing
             }
         }
@@ -88,7 +204,7 @@ void parseCommand(char* cmdBuffer) {  // TODO: Implement commands to set custom
 
     auto check_args_num = [cmd, cmdPartNum](uint8_t expectedNumArgs) -> bool {
         if ((cmdPartNum - 1) != expectedNumArgs) {
-            DEBUG_PRINT("Invalid arguments length for command %c (given %d, expected %d)",
+            PARSE_ERROR("Invalid arguments length for command %c (given %d, expected %d)",
                         cmd, cmdPartNum - 1, expectedNumArgs);
             return false;
         }
@@ -98,35 +214,107 @@ void parseCommand(char* cmdBuffer) {  // TODO: Implement commands to set custom
     if (cmd == 'H') {
         if (!check_args_num(0))
             return;
-        Serial.println("EHLO RGBHardwareMonitor");
+        printCapabilities();
+        baudPending = false;  // Handshake received at the new baud rate, confirmed
+    } else if (cmd == 'T') {
+        if (!check_args_num(0))
+            return;
+        printTelemetry();
+    } else if (cmd == 'L') {  // Log level: 0 none, 1 errors, 2 debug
+        if (!check_args_num(1))
+            return;
+        logLevel = min(level, LOG_DEBUG);
+        Serial.print("L ");
+        Serial.println(logLevel);
     } else if (cmd == 'U') {
         if (!check_args_num(4))
             return;
         if (!ringId || ringId > ringsCount) {
-            DEBUG_PRINT("Invalid ring id: %d", ringId);
+            PARSE_ERROR("Invalid ring id: %d", ringId);
         } else {
-            float inHeat = max(0.0, min(1.0, (rawHeat / 255.0)));
-            float inLoad = max(0.0, min(1.0, (rawLoad / 255.0)));
-            float inRpm  = max(0.0, min(1.0, (rawRpm / 255.0)));
-            DEBUG_PRINT("Parsed input (mode: %d, ring: %d, heat: %f, load: %f, rpm: %f)",
-                        mode, ringId, inHeat, inLoad, inRpm);
-            rings[ringId-1]->setSensors(inHeat, inLoad, inRpm);
+            DEBUG_PRINT("Parsed input (mode: %d, ring: %d, heat: %d, load: %d, rpm: %d)",
+                        mode, ringId, rawHeat, rawLoad, rawRpm);
+            rings[ringId-1]->setRawSensors(rawHeat, rawLoad, rawRpm);
+        }
+    } else if (cmd == 'W') {  // Alarm effect: W <ring id> <0 off, 1 on>
+        if (!check_args_num(2))
+            return;
+        if (!ringId || ringId > ringsCount) {
+            PARSE_ERROR("Invalid ring id: %d", ringId);
+        } else {
+            rings[ringId-1]->alarm = alarmOn;
+            DEBUG_PRINT("Alarm %o for ring %d", alarmOn, ringId);
+        }
+    } else if (cmd == 'S') {  // Serial baud rate: the reply is sent at the current rate, then the host must confirm
+        if (!check_args_num(1))
+            return;
+        if (baud < SERIAL_BAUD || baud > SERIAL_MAX_BAUD) {
+            PARSE_ERROR("Unsupported baud rate: %l", baud);
+        } else {
+            Serial.print("S ");
+            Serial.println(baud);
+            setBaud(baud);
+            baudPending = baud != SERIAL_BAUD;
+            baudSwitchMillis = millis();
+        }
+        return;  // The current fps debug line would be garbled
+    } else if (cmd == 'B') {  // Batched update: B <first ring id> heat load rpm [heat load rpm ...]
+        uint8_t batchRings = batchLength / 3;
+        if (cmdPartNum < 2 || !batchRings || batchLength % 3) {
+            PARSE_ERROR("Invalid arguments length for command %c (given %d)", cmd, cmdPartNum - 1);
+        } else if (!ringId || ringId + batchRings - 1 > ringsCount) {
+            PARSE_ERROR("Invalid ring id: %d (batch of %d)", ringId, batchRings);
+        } else {
+            for (uint8_t i=0; i<batchRings; i++)
+                rings[ringId-1+i]->setRawSensors(batchValues[3*i], batchValues[3*i+1], batchValues[3*i+2]);
+            DEBUG_PRINT("Parsed batch input (mode: %d, rings: %d-%d)", mode, ringId, ringId + batchRings - 1);
         }
     } else {
-        DEBUG_PRINT("Invalid command: %c", cmd);
+        PARSE_ERROR("Invalid command: %c", cmd);
     }
     DEBUG_PRINT("Current fps: %f, average fps: %f", fps, fpsAvg);
 }
 
+// Consumes the bytes already received without ever waiting for more, parsing every completed line.
+// Partial lines are kept in cmdBuffer until their line end arrives in a later loop.
+void readSerialInput() {
+    int16_t pending = Serial.available();  // Only what's available now, so a continuous stream can't stall frames
+    while (pending-- > 0) {
+        char c = Serial.read();
+        if (c == '\r')
+            continue;
+        if (c != '\n') {
+            if (cmdLength < CMD_BUFFER_SIZE)
+                cmdBuffer[cmdLength++] = c;
+            else {
+                cmdOverflow = true;
+                droppedBytes++;
+            }
+            continue;
+        }
+        cmdBuffer[cmdLength] = NULL;
+        if (cmdOverflow)
+            ERROR_PRINT("Discarded command exceeding %d characters", CMD_BUFFER_SIZE);  // Not acknowledged: times out
+        else {
+            uint16_t prevParseErrors = parseErrors;
+            cmdSeq = -1;
+            parseCommand(cmdBuffer);
+            if (cmdSeq >= 0) {
+                Serial.print(parseErrors == prevParseErrors ? 'A' : 'N');
+                Serial.println(cmdSeq);
+            }
+        }
+        cmdLength = 0;
+        cmdOverflow = false;
+    }
+}
+
 void loop() {
-    if (Serial.available()) {
-        char cmdBuffer[CMD_BUFFER_SIZE+1];
-        Serial.setTimeout(100);  // Set timeout to long wait to make sure all data is received (should only take 1ms tho)
-        uint8_t readBytes = Serial.readBytesUntil('\n', cmdBuffer, CMD_BUFFER_SIZE);
-        Serial.setTimeout(readDelay);
-        cmdBuffer[readBytes] = NULL;
-        parseCommand(cmdBuffer);
-        flushSerialInput();
+    readSerialInput();
+    if (baudPending && millis() - baudSwitchMillis >= BAUD_CONFIRM_MS) {
+        setBaud(SERIAL_BAUD);
+        baudPending = false;
+        ERROR_PRINT("Baud rate not confirmed, reverted to %l", (long) SERIAL_BAUD);
     }
     for (uint8_t i=0; i<ringsCount; i++) {
         rings[i]->loopStep();
@@ -0,0 +1,134 @@
+"""
+Lets the tests run without Windows: pywin32, WMI and the systray submodule are replaced with stand-ins when they
+can't be imported, and OpenHardwareMonitor is faked with in-memory WMI query results (see `FakeOHM`).
+"""
+import re
+import sys
+import types
+import importlib
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _stub_missing(name, module):
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        sys.modules[name] = module
+
+
+for _name in ('win32api', 'win32con', 'win32gui', 'win32event', 'win32process', 'pythoncom',
+              'win32comext', 'win32comext.shell', 'win32comext.shell.shell', 'win32comext.shell.shellcon'):
+    _stub_missing(_name, mock.MagicMock(name=_name))
+
+_wmi = types.ModuleType('wmi')
+_wmi.x_wmi = type('x_wmi', (Exception,), {})
+_wmi.WMI = mock.MagicMock(name='WMI')  # Patched with `FakeOHM` by the tests that query sensors
+_stub_missing('wmi', _wmi)
+
+
+class FakeSysTrayIcon:
+    """Stand-in for the systray library icon: keeps the state instead of drawing it"""
+
+    def __init__(self, icon, hover_text, menu_options=None, default_menu_index=None, on_quit=None,
+                 window_class_name=None, error_handler=None):
+        self._icon = icon
+        self._hover_text = hover_text
+        self._hicon = None
+        self._icon_shared = False
+        self.native_updates = 0
+
+    def update(self, icon=None, hover_text=None):
+        if icon is not None:
+            self._icon = icon
+        if hover_text is not None:
+            self._hover_text = hover_text
+        self.native_updates += 1
+
+    def shutdown(self):
+        pass
+
+
+_systray = types.ModuleType('modules.systray.src.systray')
+_systray.SysTrayIcon = FakeSysTrayIcon
+_systray.MenuOption = _systray.CheckBoxMenuOption = mock.MagicMock
+for _name in ('modules.systray.src', 'modules.systray.src.systray'):
+    _stub_missing(_name, _systray)
+
+
+class WMIObject:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class FakeOHM:
+    """OpenHardwareMonitor's WMI namespace, with the devices and sensors that tests add, remove or change"""
+
+    def __init__(self):
+        self.hardware = []
+        self.sensors = []
+        self.sensor_queries = 0  # Queries returning sensors, eg. to check that a snapshot costs a single one
+
+    def add_device(self, identifier, hardware_type, name=None):
+        self.hardware.append(WMIObject(Name=name or identifier, Identifier=identifier, HardwareType=hardware_type,
+                                       Parent=''))
+
+    def add_sensor(self, identifier, sensor_type, value, name=None, index=0):
+        self.sensors.append(WMIObject(Name=name or identifier, Identifier=identifier, SensorType=sensor_type,
+                                      Parent=identifier.rsplit('/', 2)[0], Index=index, Value=value))
+
+    def remove_sensor(self, identifier):
+        self.sensors = [sensor for sensor in self.sensors if sensor.Identifier != identifier]
+
+    def set_value(self, identifier, value):
+        next(sensor for sensor in self.sensors if sensor.Identifier == identifier).Value = value
+
+    # WMI API
+    def __call__(self, namespace=None):
+        return self
+
+    def Hardware(self, HardwareType=None):
+        return [device for device in self.hardware if HardwareType in (None, device.HardwareType)]
+
+    def Sensor(self, Identifier=None):
+        self.sensor_queries += 1
+        return [sensor for sensor in self.sensors if Identifier in (None, sensor.Identifier)]
+
+    def query(self, wql):
+        self.sensor_queries += 1
+        identifiers = set(re.findall(r"Identifier = '([^']*)'", wql))
+        return [sensor for sensor in self.sensors if not identifiers or sensor.Identifier in identifiers]
+
+    def Win32_ComputerSystem(self):
+        return [WMIObject(Name='TESTPC')]
+
+    def Win32_OperatingSystem(self):
+        return [WMIObject(Caption='Windows', OSArchitecture='64-bit')]
+
+
+@pytest.fixture
+def fake_ohm(monkeypatch):
+    """A running OHM with a CPU and a GPU, the app caches and rings reset"""
+    from RGBHardwareMonitor import hardware_monitor, rgb_serial
+    ohm = FakeOHM()
+    ohm.add_device('/intelcpu/0', 'CPU', name='Intel Core i7')
+    for core in range(4):
+        ohm.add_sensor(f'/intelcpu/0/temperature/{core}', 'Temperature', 40.0 + core, name=f'CPU Core #{core + 1}',
+                       index=core)
+    ohm.add_sensor('/intelcpu/0/load/0', 'Load', 25.0, name='CPU Total')
+    ohm.add_device('/nvidiagpu/0', 'GpuNvidia', name='GeForce')
+    ohm.add_sensor('/nvidiagpu/0/temperature/0', 'Temperature', 55.0, name='GPU Core')
+    ohm.add_sensor('/nvidiagpu/0/load/0', 'Load', 10.0, name='GPU Core')
+    ohm.add_sensor('/nvidiagpu/0/control/0', 'Control', 30.0, name='GPU Fan')
+    monkeypatch.setattr(hardware_monitor, 'WMI', ohm)
+    monkeypatch.setattr(hardware_monitor, '_snapshot', (float('-inf'), {}))
+    monkeypatch.setattr(hardware_monitor, 'snapshot_listeners', [])
+    monkeypatch.setattr(rgb_serial.SensorSpec, 'system_info', None)
+    monkeypatch.setattr(rgb_serial, 'catalog_cache_path', None)
+    monkeypatch.setattr(rgb_serial, 'rings', [])
+    return ohm
@@ -0,0 +1,111 @@
+import io
+import csv
+import json
+
+import pytest
+
+from RGBHardwareMonitor import hardware_monitor
+
+
+@pytest.fixture
+def queries(fake_ohm, monkeypatch):
+    """WQL queries run on OHM's namespace"""
+    wql_queries = []
+    query = fake_ohm.query
+    monkeypatch.setattr(fake_ohm, 'query', lambda wql: wql_queries.append(wql) or query(wql))
+    monkeypatch.setattr(hardware_monitor, 'READY_POLL_INTERVALS', (0.01,))
+    monkeypatch.setattr(hardware_monitor, 'SENSORS_SETTLE_TIME', 0.1)
+    return wql_queries
+
+
+def test_wait_queries_only_the_needed_sensors(queries):
+    needed = ['/intelcpu/0/temperature/0', '/nvidiagpu/0/control/0']
+    hardware_monitor.wait_for_openhardwaremonitor(needed, timeout=1.0)
+    assert len(queries) == 2  # Ready once reporting in two consecutive polls
+    assert all(wql.startswith('SELECT Identifier, Value FROM Sensor WHERE ') for wql in queries)
+
+
+def test_wait_settles_on_missing_sensors(queries):
+    needed = ['/intelcpu/0/temperature/0', '/intelcpu/0/temperature/9']
+    hardware_monitor.wait_for_openhardwaremonitor(needed, timeout=1.0)
+    assert all(' WHERE ' in wql for wql in queries)
+
+
+def test_wait_counts_sensors_without_needed_ones(queries):
+    hardware_monitor.wait_for_openhardwaremonitor(timeout=1.0)
+    assert set(queries) == {'SELECT Identifier FROM Sensor'}
+
+
+def test_catalog_views(fake_ohm, monkeypatch):
+    fake_ohm.add_sensor('/unknown/0/temperature/0', 'Temperature', 1.0)  # No device, left out
+    catalog = hardware_monitor.SensorCatalog.from_wmi(fake_ohm.Hardware(), fake_ohm.Sensor())
+    assert len(catalog) == 8
+    cpu, = catalog.devices('CPU')
+    assert (cpu.name, cpu.identifier, cpu.hardware_type, cpu.parent) == ('Intel Core i7', '/intelcpu/0', 'CPU', '')
+    assert [sensor.identifier for sensor in cpu.sensors] == [
+        '/intelcpu/0/load/0'] + [f'/intelcpu/0/temperature/{core}' for core in range(4)]
+    core2 = cpu.sensors[2]
+    assert (core2.name, core2.sensor_type, core2.parent, core2.index) == (
+        'CPU Core #2', 'Temperature', '/intelcpu/0', 1)
+    assert core2.value == 41.0
+    fake_ohm.set_value('/intelcpu/0/temperature/1', 50.0)
+    monkeypatch.setattr(hardware_monitor, '_snapshot', (float('-inf'), {}))  # Expired
+    assert core2.value == 50.0
+    assert [device.identifier for device in catalog.devices('GpuAti', 'GpuNvidia')] == ['/nvidiagpu/0']
+    assert catalog.devices('HDD') == []
+
+
+def test_catalog_round_trip(fake_ohm):
+    catalog = hardware_monitor.SensorCatalog.from_wmi(fake_ohm.Hardware(), fake_ohm.Sensor())
+    data = json.loads(json.dumps(catalog.to_dict()))  # As in the catalog cache file
+    restored = hardware_monitor.SensorCatalog.from_dict(data)
+    assert restored.to_dict() == catalog.to_dict()
+    assert [(sensor.identifier, sensor.name, sensor.sensor_type, sensor.index)
+            for device in restored.devices('CPU', 'GpuNvidia') for sensor in device.sensors] == \
+           [(sensor.identifier, sensor.name, sensor.sensor_type, sensor.index)
+            for device in catalog.devices('CPU', 'GpuNvidia') for sensor in device.sensors]
+
+
+@pytest.fixture
+def system_info(fake_ohm):
+    fake_ohm.add_device('/ram', 'RAM', name='Generic Memory')  # Without sensors
+    return hardware_monitor.SystemInfo()
+
+
+def test_json_inventory(fake_ohm, system_info):
+    fp = io.StringIO()
+    queries = fake_ohm.sensor_queries
+    system_info.write_inventory(fp, 'json')
+    assert fake_ohm.sensor_queries == queries + 1  # All the values from a single snapshot
+    inventory = json.loads(fp.getvalue())
+    assert (inventory['name'], inventory['os_name']) == ('TESTPC', 'Windows')
+    devices = {device['identifier']: device for device in inventory['devices']}
+    assert devices['/ram'] == dict(category='ram', hardware_type='RAM', name='Generic Memory', identifier='/ram',
+                                   parent=None, sensors=[])
+    gpu = devices['/nvidiagpu/0']
+    assert gpu['category'] == 'gpu'
+    assert {sensor['identifier']: sensor['value'] for sensor in gpu['sensors']} == {
+        '/nvidiagpu/0/control/0': 30.0, '/nvidiagpu/0/load/0': 10.0, '/nvidiagpu/0/temperature/0': 55.0}
+    core1 = next(sensor for sensor in devices['/intelcpu/0']['sensors'] if sensor['name'] == 'CPU Core #1')
+    assert core1 == dict(name='CPU Core #1', identifier='/intelcpu/0/temperature/0', sensor_type='Temperature',
+                         index=0, value=40.0)
+
+
+def test_csv_inventory(system_info):
+    fp = io.StringIO()
+    system_info.write_inventory(fp, 'csv', values={'/intelcpu/0/temperature/0': 70.0})
+    rows = list(csv.DictReader(io.StringIO(fp.getvalue())))
+    assert tuple(rows[0]) == hardware_monitor.INVENTORY_CSV_FIELDS
+    assert len(rows) == 8 + 1  # A row per sensor, and one for the device without sensors
+    ram, = (row for row in rows if row['device_identifier'] == '/ram')
+    assert (ram['category'], ram['device_name'], ram['sensor_identifier']) == ('ram', 'Generic Memory', '')
+    core1, = (row for row in rows if row['sensor_identifier'] == '/intelcpu/0/temperature/0')
+    assert (core1['category'], core1['sensor_name'], core1['sensor_index'], core1['value']) == (
+        'cpu', 'CPU Core #1', '0', '70.0')
+    total, = (row for row in rows if row['sensor_name'] == 'CPU Total')
+    assert total['value'] == ''  # Not in the given values
+
+
+def test_unknown_inventory_format(system_info):
+    with pytest.raises(ValueError):
+        system_info.write_inventory(io.StringIO(), 'xml', values={})
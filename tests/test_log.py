@@ -0,0 +1,50 @@
+import logging
+
+import pytest
+
+from RGBHardwareMonitor import log
+from RGBHardwareMonitor.log import RATE_LIMITED, RateLimitFilter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def rate_limited_logger(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(log, 'monotonic', lambda: now[0])
+    handler = ListHandler()
+    handler.addFilter(RateLimitFilter(interval=10.0))
+    test_logger = logging.getLogger('RGBHardwareMonitor.test_log')
+    test_logger.propagate = False
+    test_logger.addHandler(handler)
+    yield test_logger, handler.messages, now
+    test_logger.removeHandler(handler)
+
+
+def warn_write_failed(test_logger, value):
+    test_logger.warning(f'Serial write failed after {value} bytes', extra=RATE_LIMITED)
+
+
+def test_repeated_fstring_warning_is_rate_limited(rate_limited_logger):
+    test_logger, messages, now = rate_limited_logger
+    for value in range(5):
+        warn_write_failed(test_logger, value)
+        test_logger.warning(f'Another call site: {value}', extra=RATE_LIMITED)
+        test_logger.warning(f'Not rate limited: {value}')
+    assert messages[:3] == ['Serial write failed after 0 bytes', 'Another call site: 0', 'Not rate limited: 0']
+    assert messages[3:] == [f'Not rate limited: {value}' for value in range(1, 5)]
+
+    now[0] = 10.0
+    messages.clear()
+    warn_write_failed(test_logger, 5)
+    warn_write_failed(test_logger, 6)
+    test_logger.warning('Serial write failed after 6 bytes', extra=RATE_LIMITED)  # Same text, other call site
+    assert messages == ['Serial write failed after 5 bytes (4 similar messages suppressed)',
+                        'Serial write failed after 6 bytes']
@@ -0,0 +1,48 @@
+import re
+import threading
+from time import sleep
+
+import pytest
+
+from RGBHardwareMonitor import profiler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name='BusyWorker', daemon=True)
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_sampling_profiler(busy_thread, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, 'output_dir', str(tmp_path))
+    profiler.toggle()
+    assert profiler.is_running()
+    sampler = profiler.active
+    sleep(0.3)
+    profiler.toggle()
+    assert not profiler.is_running()
+    assert not sampler._thread.is_alive()
+    assert sampler.samples >= 5
+
+    folded, = tmp_path.glob('profile_*.folded')
+    lines = folded.read_text(encoding='utf-8').splitlines()
+    # Flame graph tools format: thread;module.function;... count
+    assert all(re.fullmatch(r'[^;]+(;[^;]+\.[^;]+)+ \d+', line) for line in lines)
+    busy = [line for line in lines if line.startswith('BusyWorker;')]
+    assert busy and all('test_profiler.busy_loop' in line for line in busy)
+    assert sum(int(line.rsplit(' ', 1)[1]) for line in busy) >= sampler.samples - 1
+    assert not any(line.startswith('SamplingProfiler;') for line in lines)  # Doesn't sample itself
+
+    summary, = tmp_path.glob('profile_*_summary.txt')
+    summary = summary.read_text(encoding='utf-8')
+    assert summary.startswith(f'{sampler.samples} samples every 10ms')
+    assert re.search(r'^ +\d+ BusyWorker$', summary, re.MULTILINE)
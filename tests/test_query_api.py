@@ -0,0 +1,36 @@
+import json
+from http.client import HTTPConnection
+
+import pytest
+
+from RGBHardwareMonitor import hardware_monitor, query_api
+
+
+@pytest.fixture
+def server(fake_ohm):
+    server = query_api.QueryServer(port=0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path):
+    connection = HTTPConnection(*server.server_address, timeout=2.0)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_sensors_query(server):
+    hardware_monitor.sensor_snapshot()
+    status, data = get(server, '/sensors?prefix=/intelcpu/0/temperature/')
+    assert status == 200
+    assert data['values'] == {f'/intelcpu/0/temperature/{core}': 40.0 + core for core in range(4)}
+
+    status, data = get(server, '/history?id=/nvidiagpu/0/control/0')
+    assert status == 200
+    assert [value for _, value in data['/nvidiagpu/0/control/0']] == [30.0]
+    assert get(server, '/unknown')[0] == 404
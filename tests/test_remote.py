@@ -0,0 +1,54 @@
+from time import monotonic, sleep
+
+import pytest
+
+from RGBHardwareMonitor import remote
+from RGBHardwareMonitor.hardware_monitor import HMStaleSensorError
+
+
+@pytest.fixture
+def listener():
+    listener = remote.RemoteSensorListener(port=0, address='127.0.0.1', stale_timeout=0.5)
+    listener.port = listener.socket.getsockname()[1]
+    return listener
+
+
+def publish(agent, listener, timeout=2.0):
+    """Publishes the agent's values and waits for the listener to receive them"""
+    source = listener.find_source(agent.name)
+    received = source.received if source is not None else None
+    agent.publish()
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        source = listener.find_source(agent.name)
+        if source is not None and source.received != received:
+            return source
+        sleep(0.005)
+    raise AssertionError('Values not received')
+
+
+def test_agent_to_listener_loopback(fake_ohm, listener):
+    agent = remote.SensorAgent(('127.0.0.1', listener.port), name='RemotePC')
+    agent.build_catalog()
+    publish(agent, listener)
+
+    sensors = {sensor.name: sensor for sensor in listener.sensors('remotepc', 'cpu', timeout=2.0)}
+    assert {name: sensor.value for name, sensor in sensors.items()} == {
+        'CPU Core #1': 40.0, 'CPU Core #2': 41.0, 'CPU Core #3': 42.0, 'CPU Core #4': 43.0, 'CPU Total': 25.0}
+    assert listener.find_source('127.0.0.1').name == 'RemotePC'
+
+    fake_ohm.set_value('/intelcpu/0/temperature/0', 70.0)
+    source = publish(agent, listener)
+    assert sensors['CPU Core #1'].value == 70.0
+    assert source.lost == 0
+
+
+def test_remote_sensors_go_stale(fake_ohm, listener):
+    agent = remote.SensorAgent(('127.0.0.1', listener.port), name='RemotePC')
+    agent.build_catalog()
+    source = publish(agent, listener)
+    sensor = next(sensor for sensor in listener.sensors('remotepc', 'gpu') if sensor.name == 'GPU Fan')
+    assert sensor.value == 30.0
+    source.received -= source.stale_timeout + 0.1
+    with pytest.raises(HMStaleSensorError):
+        sensor.value
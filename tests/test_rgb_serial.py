@@ -0,0 +1,645 @@
+import configparser
+from types import SimpleNamespace
+from time import monotonic, sleep
+
+import pytest
+
+from RGBHardwareMonitor import hardware_monitor, remote, rgb_serial
+from RGBHardwareMonitor.__main__ import ring_lights_from_cfg
+from RGBHardwareMonitor.rgb_serial import SensorSpec, RingLightSpec, FirmwareCapabilities
+
+
+def make_ring(ring_id, temp_filters, load_filters=None, fan_filters=None):
+    return RingLightSpec(
+        id=ring_id, name=f'Ring {ring_id}',
+        temp_sensor=SensorSpec(device='cpu', filters=temp_filters, max=100.0),
+        load_sensor=SensorSpec(device='cpu', filters=load_filters or {'name': 'CPU Total'}),
+        fan_sensor=SensorSpec(device='gpu', filters=fan_filters or {'name': 'GPU Fan'}),
+    )
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Commands sent to the arduino, with a protocol 2 firmware updating every 0.1s"""
+    commands = []
+    monkeypatch.setattr(rgb_serial, 'capabilities',
+                        FirmwareCapabilities(protocol=2, rings=4, commands='HUB', smoothing=10, fps=100))
+    monkeypatch.setattr(rgb_serial, 'transmit', lambda command, pipeline=None: commands.append(command))
+    monkeypatch.setattr(rgb_serial, 'FAULT_RETRY_MIN', 0.05)
+    monkeypatch.setattr(rgb_serial, 'FAULT_RETRY_MAX', 0.2)
+    monkeypatch.setattr(rgb_serial, 'CATALOG_RELOAD_INTERVAL', 0.0)
+    monkeypatch.setattr(rgb_serial, 'fault_metrics',
+                        {fault: dict(count=0, last_recovery=None, max_recovery=0.0) for fault in ('sensor', 'serial')})
+    return commands
+
+
+def updated_rings(commands):
+    """Ids of the rings updated by batch commands, eg. 'B 1 10 20 30 40 50 60' updates rings 1 and 2"""
+    ids = set()
+    for command in commands:
+        _, first, *values = command.split()
+        ids.update(range(int(first), int(first) + len(values) // 3))
+    return ids
+
+
+def run_schedule(duration):
+    """Runs the rings scheduling of `update_loop` for a while, returns how many scheduling passes ran"""
+    passes = 0
+    end = monotonic() + duration
+    while monotonic() < end:
+        rgb_serial.update_due_rings()
+        passes += 1
+        next_update = min(ring.next_update for ring in rgb_serial.rings)
+        while monotonic() < min(next_update, end):
+            sleep(0.005)
+    return passes
+
+
+def test_missing_sensor_doesnt_stop_startup(fake_ohm):
+    config = configparser.ConfigParser()
+    config.read_dict({
+        'RingLight1': {'name': 'CPU'},
+        'RingLight1.TempSensor': {'device': 'cpu', 'filters_name': 'CPU Core #9'},  # Missing
+        'RingLight1.LoadSensor': {'device': 'cpu', 'filters_name': 'CPU Total'},
+        'RingLight1.FanSensor': {'device': 'gpu', 'filters_name': 'GPU Fan'},
+        'RingLight2': {'name': 'GPU'},
+        'RingLight2.TempSensor': {'device': 'gpu', 'filters_sensor_type': 'Temperature'},
+        'RingLight2.LoadSensor': {'device': 'gpu', 'filters_sensor_type': 'Load'},
+        'RingLight2.FanSensor': {'device': 'gpu', 'filters_name': 'GPU Fan'},
+    })
+    rings = ring_lights_from_cfg(config)
+    assert [ring.id for ring in rings] == [1, 2]
+    assert rings[0].temp_sensor.failed_since is not None
+    assert rings[0].temp_sensor.sensor is None
+    assert all(spec.failed_since is None for spec in rings[1].sensor_specs)
+
+
+def test_faulted_ring_is_rescheduled(fake_ohm, sent):
+    rgb_serial.rings = [make_ring(1, {'name': 'CPU Core #1'}), make_ring(2, {'name': 'CPU Core #9'})]
+    now = monotonic()
+    rgb_serial.update_due_rings()
+    faulted = rgb_serial.rings[1]
+    assert faulted.next_update >= now + rgb_serial.capabilities.update_interval
+    assert faulted.next_update >= faulted.temp_sensor.retry_time
+    assert sent == ['B 1 102 63 76\n']
+
+
+def test_faulted_ring_doesnt_spin(fake_ohm, sent):
+    rgb_serial.rings = [make_ring(1, {'name': 'CPU Core #9'})]  # Its only ring never updates
+    passes = run_schedule(0.5)
+    assert passes <= 0.5 / rgb_serial.capabilities.update_interval + 2
+    assert not sent
+
+
+def test_sensor_recovery_time(fake_ohm, sent):
+    rgb_serial.rings = [make_ring(1, {'name': 'CPU Core #1'}), make_ring(2, {'name': 'GPU Core'})]
+    rgb_serial.rings[1].temp_sensor = SensorSpec(device='gpu', filters={'name': 'GPU Core',
+                                                                        'sensor_type': 'Temperature'})
+    run_schedule(0.15)
+    fake_ohm.remove_sensor('/nvidiagpu/0/temperature/0')
+    run_schedule(0.3)
+    assert rgb_serial.rings[1].temp_sensor.failed_since is not None
+    sent.clear()
+    run_schedule(0.3)
+    assert updated_rings(sent) == {1}  # The healthy ring kept updating
+
+    fake_ohm.add_sensor('/nvidiagpu/0/temperature/0', 'Temperature', 60.0, name='GPU Core')
+    restored = monotonic()
+    while 2 not in updated_rings(sent) and monotonic() - restored < 2.0:
+        sent.clear()
+        run_schedule(0.05)
+    assert rgb_serial.rings[1].temp_sensor.failed_since is None
+    assert rgb_serial.fault_metrics['sensor']['count'] == 1
+    # Within the longest retry backoff, plus an update interval
+    assert monotonic() - restored < rgb_serial.FAULT_RETRY_MAX + rgb_serial.capabilities.update_interval + 0.1
+
+
+def test_batches_skip_rings_missing_on_the_firmware(fake_ohm):
+    rings = [make_ring(ring_id, {'name': 'CPU Core #1'}) for ring_id in (1, 2, 3)]
+    for ring, raw_values in zip(rings, ((10, 20, 30), (1, 2, 3), (4, 5, 6))):
+        ring.history.append(rgb_serial.SensorSample(monotonic(), raw_values))
+    capabilities = FirmwareCapabilities(protocol=2, rings=2, commands='HUB', max_command_length=64)
+    assert capabilities.prepare_commands(rings) == ['B 1 10 20 30 1 2 3\n']
+    capabilities.commands = 'HU'
+    assert capabilities.prepare_commands(rings) == ['U 1 10 20 30\n', 'U 2 1 2 3\n']
+
+
+class EchoingArduino:
+    """Serial port of a firmware replying to each handshake, tracking how many commands were in flight"""
+
+    def __init__(self):
+        self.written = b''
+        self.replies = []
+        self.max_in_flight = 0
+        self.in_waiting = 0
+
+    def write(self, data):
+        self.written += data
+        self.replies.append(b'EHLO RGBHardwareMonitor proto=3 rings=2 leds=16,20 cmds=HTUBLSW buf=32\n')
+        self.max_in_flight = max(self.max_in_flight, len(self.replies))
+
+    def read_until(self, terminator):
+        return self.replies.pop(0) if self.replies else b''
+
+    def flush(self):
+        pass
+
+
+def test_throughput_is_measured_on_a_bulk_payload(monkeypatch):
+    arduino = EchoingArduino()
+    monkeypatch.setattr(rgb_serial, 'ser', arduino, raising=False)
+    monkeypatch.setattr(rgb_serial, 'capabilities', FirmwareCapabilities(protocol=3, max_command_length=32))
+    assert rgb_serial.measure_throughput() > 0
+    commands = arduino.written.split(b'\n')[:-1]
+    assert len(arduino.written) >= rgb_serial.THROUGHPUT_PAYLOAD
+    assert all(command.strip() == b'H' and len(command) == 32 for command in commands)
+    assert arduino.max_in_flight <= rgb_serial.THROUGHPUT_WINDOW
+
+
+def test_fps_probed_after_boot_handshake(monkeypatch):
+    replies = ['T fps=0.00 shown=0 skipped=0 err=0 drop=0 ram=-1', 'T fps=62.50 shown=60 skipped=0 err=0 drop=0 ram=-1']
+    monkeypatch.setattr(rgb_serial, 'command_and_response', lambda command, flush=True: replies.pop(0))
+    monkeypatch.setattr(rgb_serial, 'telemetry', {})
+    capabilities = FirmwareCapabilities.from_handshake(
+        'EHLO RGBHardwareMonitor proto=3 rings=2 leds=16,20 cmds=HTUBLSW buf=32 smooth=10 fps=0.00')
+    monkeypatch.setattr(rgb_serial, 'capabilities', capabilities)
+    assert capabilities.update_interval == 1.0  # Not measured yet right after boot
+    rgb_serial.probe_fps()
+    assert capabilities.update_interval == 1.0
+    rgb_serial.probe_fps()
+    assert capabilities.fps == 62.5
+    assert capabilities.update_interval == pytest.approx(10 / 62.5)
+
+    capabilities.commands, capabilities.fps = 'HU', 0.0  # Without telemetry the handshake is repeated
+    replies.append('EHLO RGBHardwareMonitor proto=2 rings=2 cmds=HU smooth=10 fps=50.00')
+    rgb_serial.probe_fps()
+    assert capabilities.update_interval == pytest.approx(0.2)
+
+
+def test_legacy_firmware_waits_while_all_rings_faulted(fake_ohm, sent, monkeypatch):
+    monkeypatch.setattr(rgb_serial, 'capabilities', FirmwareCapabilities(protocol=1))
+    monkeypatch.setattr(rgb_serial, 'check_port_present', lambda: None)
+    monkeypatch.setattr(rgb_serial, 'command_and_response', lambda command: sent.append(command))
+    rgb_serial.rings = [make_ring(1, {'name': 'CPU Core #8'}), make_ring(2, {'name': 'CPU Core #9'})]
+    passes = 0
+    end = monotonic() + 0.5
+    while monotonic() < end:
+        assert rgb_serial.update_rings_in_turn()
+        passes += 1
+    # Each pass waits for the next retry, at least FAULT_RETRY_MIN, instead of spinning
+    assert passes <= 0.5 / rgb_serial.FAULT_RETRY_MIN + 2
+    assert not sent
+
+
+def test_wmean_weights_not_matching_the_sensors(fake_ohm, sent):
+    with pytest.raises(ValueError):  # A config error at startup
+        SensorSpec(device='cpu', filters={'sensor_type': 'Temperature'}, aggregate='wmean', weights=[1.0, 2.0])
+
+    spec = SensorSpec(device='cpu', filters={'sensor_type': 'Temperature'}, aggregate='wmean',
+                      weights=[1.0, 1.0, 1.0, 1.0])
+    assert spec.value == 41.5
+    fake_ohm.remove_sensor('/intelcpu/0/temperature/3')  # Eg. a remote device restarted with fewer cores
+    hardware_monitor._snapshot = (float('-inf'), {})
+    with pytest.raises(rgb_serial.SENSOR_FAULTS):
+        spec.read()
+    sleep(rgb_serial.FAULT_RETRY_MIN)
+    assert not spec.recover()  # A sensor fault, that doesn't stop the update loop
+    assert spec.failed_since is not None
+
+
+def test_offline_remote_ring_doesnt_stall_local_ones(fake_ohm, sent, monkeypatch):
+    monkeypatch.setattr(remote, 'CATALOG_INTERVAL', 0.05)  # Startup binding waits for two intervals
+    monkeypatch.setattr(remote, 'listener', remote.RemoteSensorListener(port=0, address='127.0.0.1'))
+    offline = make_ring(2, {'name': 'CPU Core #1'})
+    offline.temp_sensor = SensorSpec(device='nas:cpu', filters={'name': 'CPU Core #1'})
+    assert offline.temp_sensor.failed_since is not None
+    rgb_serial.rings = [make_ring(1, {'name': 'CPU Core #1'}), offline]
+    monkeypatch.setattr(remote, 'CATALOG_INTERVAL', 10.0)  # Recovery would block for 20s if it waited
+
+    start = monotonic()
+    run_schedule(1.0)
+    assert monotonic() - start < 1.1
+    assert updated_rings(sent) == {1}
+    assert len(sent) >= 1.0 / rgb_serial.capabilities.update_interval - 1
+    assert offline.temp_sensor.retry_delay == rgb_serial.FAULT_RETRY_MAX  # Retried meanwhile, without waiting
+
+
+class BaudArduino:
+    """Serial port of a firmware switching baud rate with the S command, reverting it if not confirmed in time"""
+
+    handshake = b'EHLO RGBHardwareMonitor proto=3 rings=2 cmds=HUBS baud=1000000 buf=32\n'
+
+    def __init__(self, unsupported=(), throughputs=None):
+        self.port = 'COM3'
+        self.unsupported = set(unsupported)  # Rates the USB-serial chip rejects
+        self.throughputs = throughputs or {}
+        self._baudrate = self.firmware_baud = 115200
+        self.pending = False  # Firmware baud rate not confirmed by a handshake yet
+        self.commands = []
+        self.replies = []
+
+    @property
+    def baudrate(self):
+        return self._baudrate
+
+    @baudrate.setter
+    def baudrate(self, baud):
+        if baud in self.unsupported:
+            raise ValueError(f'Invalid baud rate: {baud}')
+        self._baudrate = baud
+
+    def write(self, data):
+        command = data.decode().strip()
+        self.commands.append(command)
+        if command.startswith('S '):
+            self.replies.append(f'{command}\n'.encode())  # Sent at the current rate
+            self.firmware_baud = int(command.split()[1])
+            self.pending = self.firmware_baud != 115200
+        elif command == 'H':
+            if self._baudrate == self.firmware_baud:
+                self.pending = False
+                self.replies.append(self.handshake)
+            else:
+                self.replies.append(b'\xfe\x80\n')  # Garbled
+
+    def sleep(self, seconds):
+        if self.pending and seconds >= rgb_serial.BAUD_CONFIRM_TIMEOUT:
+            self.firmware_baud, self.pending = 115200, False
+
+    def read_until(self, terminator=b'\n'):
+        return self.replies.pop(0) if self.replies else b''
+
+    def read_all(self):
+        replies, self.replies = b''.join(self.replies), []
+        return replies
+
+    @property
+    def in_waiting(self):
+        return sum(len(reply) for reply in self.replies)
+
+    def reset_input_buffer(self):
+        self.replies.clear()
+
+    def flush(self):
+        pass
+
+
+@pytest.fixture
+def baud_arduino(monkeypatch):
+    def connect(**kwargs):
+        arduino = BaudArduino(**kwargs)
+        monkeypatch.setattr(rgb_serial, 'ser', arduino)
+        monkeypatch.setattr(rgb_serial, 'sleep', arduino.sleep)
+        monkeypatch.setattr(rgb_serial, 'measure_throughput', lambda: arduino.throughputs[arduino.baudrate])
+        monkeypatch.setattr(rgb_serial, 'capabilities', FirmwareCapabilities.from_handshake(
+            BaudArduino.handshake.decode().strip()))
+        return arduino
+    monkeypatch.setattr(rgb_serial, 'baud_rates', [1000000, 500000])
+    monkeypatch.setattr(rgb_serial, 'failed_baud_rates', {})
+    return connect
+
+
+def test_baud_rate_rejected_by_the_port(baud_arduino):
+    arduino = baud_arduino(unsupported={1000000}, throughputs={115200: 10000, 500000: 40000})
+    rgb_serial.negotiate_baud()
+    assert (arduino.baudrate, arduino.firmware_baud) == (500000, 500000)
+    assert not arduino.pending
+    assert rgb_serial.failed_baud_rates == {'COM3': {1000000}}
+
+    arduino = baud_arduino(unsupported={1000000}, throughputs={115200: 10000, 500000: 40000})
+    rgb_serial.failed_baud_rates = {'COM3': {1000000}}
+    rgb_serial.negotiate_baud()  # Reconnected
+    assert 'S 1000000' not in arduino.commands
+    assert arduino.baudrate == 500000
+
+
+def test_baud_rate_kept_only_if_faster(baud_arduino):
+    arduino = baud_arduino(throughputs={115200: 10000, 1000000: 9000, 500000: 10500})
+    rgb_serial.negotiate_baud()
+    assert (arduino.baudrate, arduino.firmware_baud) == (115200, 115200)
+    assert [command for command in arduino.commands if command.startswith('S ')] == [
+        'S 1000000', 'S 115200', 'S 500000', 'S 115200']
+    assert rgb_serial.failed_baud_rates == {'COM3': {1000000, 500000}}
+
+
+@pytest.mark.parametrize('percent, expected', [(0, 1.0), (25, 1.75), (50, 2.5), (90, 3.7), (100, 4.0)])
+def test_percentile(percent, expected):
+    assert rgb_serial.percentile([4.0, 1.0, 3.0, 2.0], percent) == pytest.approx(expected)
+    assert rgb_serial.percentile([7.0], percent) == 7.0
+
+
+def expire_snapshot(monkeypatch):
+    monkeypatch.setattr(hardware_monitor, '_snapshot', (float('-inf'), {}))
+
+
+def cpu_temps(aggregate, weights=None):
+    return SensorSpec(device='cpu', filters={'name': 'CPU Core #*'}, aggregate=aggregate, weights=weights)
+
+
+@pytest.mark.parametrize('aggregate, weights, expected', [
+    ('max', None, 43.0), ('min', None, 40.0), ('mean', None, 41.5), ('wmean', [3, 1, 0, 0], 40.25),
+    ('p50', None, 41.5), ('p25', None, 40.75), ('p100', None, 43.0), ('p99.5', None, 42.985),
+])
+def test_aggregates(fake_ohm, aggregate, weights, expected):
+    assert cpu_temps(aggregate, weights).value == pytest.approx(expected)
+
+
+def test_aggregate_config_errors(fake_ohm):
+    for aggregate in ('median', 'p101', 'p', 'wmean'):  # wmean without weights
+        with pytest.raises(ValueError):
+            cpu_temps(aggregate)
+
+
+def test_aggregates_follow_their_sensors(fake_ohm, sent, monkeypatch):
+    hottest, mean = cpu_temps('max'), cpu_temps('mean')
+    fake_ohm.set_value('/intelcpu/0/temperature/1', 80.0)
+    expire_snapshot(monkeypatch)
+    assert (hottest.value, mean.value) == (80.0, 51.25)
+
+    fake_ohm.remove_sensor('/intelcpu/0/temperature/1')
+    expire_snapshot(monkeypatch)
+    for spec in (hottest, mean):
+        with pytest.raises(rgb_serial.SENSOR_FAULTS):
+            spec.read()
+    sleep(rgb_serial.FAULT_RETRY_MIN)
+    assert hottest.recover() and mean.recover()  # Bound again to the remaining sensors
+    assert len(hottest.sensors) == 3
+    assert (hottest.value, mean.value) == (43.0, pytest.approx(125 / 3))
+
+    fake_ohm.add_sensor('/intelcpu/0/temperature/4', 'Temperature', 90.0, name='CPU Core #5', index=4)
+    expire_snapshot(monkeypatch)
+    assert hottest.value == 43.0  # A new sensor is only covered once a catalog query finds it
+
+
+class AckingArduino:
+    """
+    Serial port of a firmware acknowledging sequence numbered commands after `latency`: each attempt of a command
+    takes the next action from `faults` for its sequence number, 'nak' or 'drop' (no reply), else it's acknowledged
+    """
+
+    def __init__(self, faults=None, latency=0.005):
+        self.faults = faults or {}
+        self.latency = latency
+        self.written = []  # Sequence numbers, including retransmissions
+        self.acked = set()
+        self.received = set()  # Acknowledged, and the pipeline read it
+        self.max_in_flight = 0
+        self._replies = []  # (time due, reply)
+
+    def write(self, data):
+        seq = int(data.split()[0][1:])
+        self.written.append(seq)
+        self.max_in_flight = max(self.max_in_flight, len(set(self.written) - self.received))
+        actions = self.faults.get(seq, [])
+        action = actions.pop(0) if actions else 'ack'
+        if action == 'ack':
+            self.acked.add(seq)
+            self._replies.append((monotonic() + self.latency, f'A{seq}\n'.encode()))
+        elif action == 'nak':
+            self._replies.append((monotonic() + self.latency, f'N{seq}\n'.encode()))
+
+    @property
+    def in_waiting(self):
+        return sum(len(reply) for due, reply in self._replies if due <= monotonic())
+
+    def read(self, size):
+        now = monotonic()
+        ready = [reply for due, reply in self._replies if due <= now]
+        self._replies = [(due, reply) for due, reply in self._replies if due > now]
+        self.received.update(int(reply[1:]) for reply in ready if reply.startswith(b'A'))
+        return b''.join(ready)
+
+
+@pytest.fixture
+def acking_arduino(monkeypatch):
+    def connect(**kwargs):
+        arduino = AckingArduino(**kwargs)
+        monkeypatch.setattr(rgb_serial, 'ser', arduino)
+        return arduino
+    return connect
+
+
+def test_pipeline_keeps_the_window(acking_arduino):
+    arduino = acking_arduino(latency=0.02)
+    pipeline = rgb_serial.CommandPipeline(window=2, timeout=0.5)
+    for ring_id in range(1, 7):
+        pipeline.send(f'U {ring_id} 1 2 3')
+    pipeline.drain()
+    assert arduino.written == [0, 1, 2, 3, 4, 5]  # In order, no retransmissions
+    assert arduino.max_in_flight == 2
+    assert pipeline.stats == dict(sent=6, acked=6, naked=0, timeouts=0, retransmitted=0, dropped=0)
+
+
+def test_pipeline_retransmits_naked_and_lost_commands(acking_arduino):
+    arduino = acking_arduino(faults={1: ['nak'], 2: ['drop', 'nak']})
+    pipeline = rgb_serial.CommandPipeline(window=4, timeout=0.05)
+    for ring_id in range(1, 5):
+        pipeline.send(f'U {ring_id} 1 2 3')
+    pipeline.drain()
+    assert arduino.acked == {0, 1, 2, 3}
+    assert arduino.written[:4] == [0, 1, 2, 3]
+    assert sorted(arduino.written[4:]) == [1, 2, 2]
+    assert pipeline.stats == dict(sent=4, acked=4, naked=2, timeouts=1, retransmitted=3, dropped=0)
+
+
+def test_pipeline_drops_after_max_retries(acking_arduino):
+    arduino = acking_arduino(faults={0: ['drop'] * 10})
+    pipeline = rgb_serial.CommandPipeline(window=1, timeout=0.02, max_retries=2)
+    pipeline.send('U 1 1 2 3')
+    pipeline.send('U 2 1 2 3')  # Waits for the first one to be settled, dropped
+    pipeline.drain()
+    assert arduino.written == [0, 0, 0, 1]
+    assert not pipeline.outstanding
+    assert pipeline.stats == dict(sent=2, acked=1, naked=0, timeouts=3, retransmitted=2, dropped=1)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fixed `monotonic` time of the rgb_serial module, set by the test"""
+    now = [0.0]
+    monkeypatch.setattr(rgb_serial, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_adaptive_interval_ramp():
+    ring = make_ring(1, {'name': 'CPU Core #1'})
+    ring.max_interval = 5.0
+    ring.history.extend([rgb_serial.SensorSample(0.0, (100, 50, 50)), rgb_serial.SensorSample(0.25, (110, 50, 50))])
+    assert ring.adaptive_interval() == ring.min_interval  # 40 raw/s, moves by 2 in 0.05s
+    now, intervals = 0.25, []
+    for _ in range(8):  # Stable values
+        interval = ring.adaptive_interval()
+        intervals.append(interval)
+        now += interval
+        ring.history.append(rgb_serial.SensorSample(now, (110, 50, 50)))
+    # Sampled fast while the change is in the history, then backing off, at most doubling
+    assert intervals == [0.25, 0.25, 0.25, 0.5, 1.0, 2.0, 4.0, 5.0]
+
+
+def test_adaptive_polling_resends_unchanged_values(fake_ohm, sent, clock, monkeypatch):
+    monkeypatch.setattr(rgb_serial, 'adaptive_polling', True)
+    ring = make_ring(1, {'name': 'CPU Core #1'})
+    ring.max_interval = 2.0
+    rgb_serial.rings = [ring]
+    samples, sent_times = [], []
+    while clock[0] < 7.0:
+        clock[0] = ring.next_update
+        if clock[0] == 2.0:
+            fake_ohm.set_value('/intelcpu/0/temperature/0', 50.0)
+            expire_snapshot(monkeypatch)
+        sent.clear()
+        rgb_serial.update_due_rings()
+        samples.append(clock[0])
+        if sent:
+            sent_times.append(clock[0])
+    assert samples == [0.0, 2.0, 2.25, 2.5, 2.75, 3.25, 4.25, 6.25, 8.25]
+    # Sent when changed, and again once unchanged for max_interval
+    assert sent_times == [0.0, 2.0, 4.25, 6.25, 8.25]
+
+
+class FakePipeline:
+    def __init__(self):
+        self.commands = []
+        self.drained = 0
+
+    def send(self, command):
+        self.commands.append(command.strip())
+
+    def drain(self):
+        self.drained += 1
+
+
+def test_alarms(fake_ohm, monkeypatch):
+    monkeypatch.setattr(rgb_serial, 'capabilities', FirmwareCapabilities(protocol=3, rings=2, commands='HUBW',
+                                                                         smoothing=10, fps=100))
+    monkeypatch.setattr(rgb_serial, 'alarm_metrics', dict(count=0, last_latency=None, max_latency=0.0))
+    alarmed = make_ring(1, {'name': 'CPU Core #1'})
+    alarmed.temp_sensor.alarm_threshold = 70.0
+    alarmed.alarm_effect = True
+    quiet = make_ring(2, {'name': 'CPU Core #1'})
+    quiet.temp_sensor = SensorSpec(device='gpu', filters={'name': 'GPU Core', 'sensor_type': 'Temperature'},
+                                   alarm_threshold=90.0)
+    rgb_serial.rings = [alarmed, quiet]
+    for ring in rgb_serial.rings:
+        ring.next_update = float('inf')  # Only updated by alarms
+
+    def check(temp, gpu_temp=55.0):
+        fake_ohm.set_value('/intelcpu/0/temperature/0', temp)
+        fake_ohm.set_value('/nvidiagpu/0/temperature/0', gpu_temp)
+        monkeypatch.setattr(hardware_monitor, '_snapshot', (float('-inf'), {}))
+        pipeline = FakePipeline()
+        return rgb_serial.check_alarms(pipeline), pipeline
+
+    updated, pipeline = check(40.0)
+    assert not updated and not pipeline.commands
+    updated, pipeline = check(75.0)
+    assert updated and alarmed.alarm and not quiet.alarm
+    # The W blink, then the ring update preempting its schedule, acknowledged before measuring the latency
+    assert pipeline.commands == ['W 1 1', 'B 1 191 63 76']
+    assert pipeline.drained == 1
+    assert rgb_serial.alarm_metrics['count'] == 1 and rgb_serial.alarm_metrics['last_latency'] is not None
+
+    updated, pipeline = check(69.0)  # Within the hysteresis, still in alarm
+    assert not updated and alarmed.alarm and not pipeline.commands
+    updated, pipeline = check(67.0)  # Cleared
+    assert not updated and not alarmed.alarm
+    assert pipeline.commands == ['W 1 0']
+
+    updated, pipeline = check(40.0, gpu_temp=95.0)  # Without the alarm effect, just the update
+    assert updated and quiet.alarm
+    assert pipeline.commands == ['B 2 242 63 76']
+    assert rgb_serial.alarm_metrics['count'] == 2
+
+
+@pytest.fixture
+def listed_ports(monkeypatch):
+    """Serial ports matching the arduino VID:PID, as listed by pyserial. Listing raises `failing` while it's set"""
+    listed = SimpleNamespace(ports=set(), failing=None)
+
+    def grep(pattern):
+        if listed.failing is not None:
+            raise listed.failing
+        return [SimpleNamespace(device=port) for port in sorted(listed.ports)]
+
+    monkeypatch.setattr(rgb_serial.list_ports, 'grep', grep)
+    monkeypatch.setattr(rgb_serial, 'arduino_port', None)
+    return listed
+
+
+@pytest.fixture
+def port_watcher(listed_ports):
+    watcher = rgb_serial.PortWatcher(interval=0.01)
+    yield watcher
+    watcher.interval = 3600  # Idle once the ports stub is gone
+
+
+def test_port_arrival_and_removal(listed_ports, port_watcher):
+    assert not port_watcher.wait_for_change(timeout=0.05)
+    assert not port_watcher.is_present('COM3')
+    listed_ports.ports.add('COM3')
+    assert port_watcher.wait_for_change(timeout=1.0)
+    assert port_watcher.is_present('COM3') and port_watcher.ports == {'COM3'}
+    listed_ports.ports.discard('COM3')
+    assert port_watcher.wait_for_change(timeout=1.0)
+    assert not port_watcher.is_present('COM3')
+
+
+def test_port_watcher_survives_scan_errors(listed_ports, port_watcher):
+    listed_ports.failing = OSError('Device enumeration failed')
+    sleep(0.05)
+    listed_ports.failing = None
+    listed_ports.ports.add('COM4')
+    assert port_watcher.wait_for_change(timeout=1.0)
+    assert port_watcher.is_present('COM4')
+
+
+@pytest.fixture
+def catalog_cache(fake_ohm, tmp_path, monkeypatch):
+    path = tmp_path / 'catalog.json'
+    monkeypatch.setattr(rgb_serial, 'catalog_cache_path', str(path))
+    monkeypatch.setattr(SensorSpec, 'catalog_bindings', [])
+    return path
+
+
+def reset_catalog(monkeypatch):
+    """As a restarted app: no catalog loaded yet"""
+    monkeypatch.setattr(SensorSpec, 'system_info', None)
+
+
+def test_catalog_cache_miss_and_hit(fake_ohm, catalog_cache, monkeypatch):
+    system_info = SensorSpec.load_system_info()
+    assert not system_info.from_cache
+    assert catalog_cache.exists()
+
+    reset_catalog(monkeypatch)
+    queries = fake_ohm.sensor_queries
+    system_info = SensorSpec.load_system_info()
+    assert system_info.from_cache
+    assert fake_ohm.sensor_queries == queries  # Only the devices list, for the fingerprint
+    assert [sensor.identifier for sensor in system_info.cpu.sensors][:2] == [
+        '/intelcpu/0/load/0', '/intelcpu/0/temperature/0']
+
+
+def test_catalog_cache_of_other_hardware(fake_ohm, catalog_cache, monkeypatch):
+    SensorSpec.load_system_info()
+    fake_ohm.add_device('/hdd/0', 'HDD', name='SSD')
+    fake_ohm.add_sensor('/hdd/0/temperature/0', 'Temperature', 35.0, name='Temperature')
+    reset_catalog(monkeypatch)
+
+    cached = SensorSpec.load_system_info()  # Used right away, refreshed in background
+    assert cached.from_cache and cached.hdd is None
+    deadline = monotonic() + 2.0
+    while SensorSpec.system_info is cached and monotonic() < deadline:
+        sleep(0.01)
+    assert SensorSpec.system_info is not cached
+    assert SensorSpec.system_info.hdd.identifier == '/hdd/0'
+    system_info, _ = hardware_monitor.read_catalog_cache(str(catalog_cache))
+    assert system_info.fingerprint == hardware_monitor.hardware_fingerprint()
+
+
+def test_corrupt_catalog_cache(fake_ohm, catalog_cache, caplog):
+    catalog_cache.write_text('{"version": 2, "system_info": {"name": ')
+    system_info = SensorSpec.load_system_info()
+    assert not system_info.from_cache
+    assert any('Ignoring unreadable sensor catalog cache' in record.getMessage() for record in caplog.records)
+    assert hardware_monitor.read_catalog_cache(str(catalog_cache)) is not None  # Rewritten
@@ -0,0 +1,78 @@
+import logging
+from threading import Thread, Event
+
+import pytest
+
+from RGBHardwareMonitor import shared_snapshot
+from RGBHardwareMonitor.shared_snapshot import SnapshotWriter, SnapshotReader, SharedSnapshotError
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'snapshot.bin')
+
+
+def test_snapshot_round_trip(path):
+    writer = SnapshotWriter(path, capacity=8)
+    with SnapshotReader(path) as reader:
+        assert reader.read().values == {}
+        writer.publish({'/intelcpu/0/temperature/0': 40.0, '/intelcpu/0/load/0': None}, timestamp=1000.0)
+        snapshot = reader.read()
+        assert (snapshot.tick, snapshot.time) == (1, 1000.0)
+        assert snapshot.values == {'/intelcpu/0/temperature/0': 40.0, '/intelcpu/0/load/0': None}
+        writer.publish({'/nvidiagpu/0/temperature/0': 55.0}, timestamp=1001.0)  # Sensors changed
+        assert reader.read().values == {'/nvidiagpu/0/temperature/0': 55.0}
+        assert reader.tick == 2
+    writer.close()
+
+    writer = SnapshotWriter(path, capacity=8)  # Restarted, the numbering carries on
+    writer.publish({'/nvidiagpu/0/temperature/0': 56.0})
+    with SnapshotReader(path) as reader:
+        assert reader.read().tick == 3
+    writer.close()
+
+
+def test_snapshot_over_capacity(path, caplog):
+    writer = SnapshotWriter(path, capacity=2)
+    values = {f'/intelcpu/0/temperature/{core}': 40.0 + core for core in range(4)}
+    with caplog.at_level(logging.WARNING, logger='RGBHardwareMonitor'):
+        writer.publish(values)
+        writer.publish(values)
+    assert writer.truncated == 2
+    assert [record.getMessage() for record in caplog.records] == [
+        'Shared sensor snapshot capacity exceeded, 2 sensors left out of it']  # Once, until it changes
+    with SnapshotReader(path) as reader:
+        assert reader.read().values == {'/intelcpu/0/temperature/0': 40.0, '/intelcpu/0/temperature/1': 41.0}
+    writer.close()
+
+
+def test_snapshot_reads_are_consistent(path):
+    writer = SnapshotWriter(path, capacity=64)
+    identifiers = [f'/lpc/0/fan/{index}' for index in range(64)]
+    writer.publish(dict.fromkeys(identifiers, 0.0))
+    stop = Event()
+
+    def publish():
+        tick = 0
+        while not stop.is_set():
+            tick += 1
+            writer.publish(dict.fromkeys(identifiers, float(tick)))
+
+    thread = Thread(target=publish, daemon=True)
+    thread.start()
+    try:
+        with SnapshotReader(path) as reader:
+            for _ in range(2000):
+                values = set(reader.read().values.values())
+                assert len(values) == 1  # Never a mix of two snapshots
+    finally:
+        stop.set()
+        thread.join()
+        writer.close()
+
+
+def test_invalid_snapshot_file(path):
+    with open(path, 'wb') as fp:
+        fp.write(b'\0' * shared_snapshot.VALUES_OFFSET)
+    with pytest.raises(SharedSnapshotError):
+        SnapshotReader(path)
@@ -0,0 +1,51 @@
+import threading
+from collections import Counter
+from time import sleep
+
+import pytest
+
+from RGBHardwareMonitor import systray
+from RGBHardwareMonitor.systray import AnimationScheduler, IconAnimation, RGBHardwareMonitorSysTray
+
+from conftest import FakeSysTrayIcon
+
+
+class FastAnimation(IconAnimation):
+    icons = ['frame0.ico', 'frame1.ico']
+    frames_interval = 0.01
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = AnimationScheduler()
+    monkeypatch.setattr(systray, 'animation_scheduler', scheduler)
+    return scheduler
+
+
+def test_animations_share_one_thread(scheduler):
+    frames = Counter()
+    threads_before = threading.active_count()
+    animations = [FastAnimation(lambda icon, number=number: frames.update([number])) for number in range(5)]
+    sleep(0.2)
+    assert threading.active_count() == threads_before + 1
+    assert all(frames[number] >= 5 for number in range(5))
+    for animation in animations:
+        animation.stop()
+    stopped_frames = sum(frames.values())
+    sleep(0.05)
+    assert sum(frames.values()) == stopped_frames
+
+
+def test_unchanged_updates_are_coalesced(scheduler):
+    if systray.SysTrayIcon is not FakeSysTrayIcon:
+        pytest.skip('Would create a real tray icon')
+    tray = RGBHardwareMonitorSysTray(animation_cls=FastAnimation, start_animation=False)
+    updates = tray.updates_count
+    for _ in range(3):
+        tray.set_hover_text('Connecting to serial')
+    tray.set_icon('frame1.ico')
+    tray.set_icon('frame1.ico')
+    tray.clear_hover_text()
+    tray.clear_hover_text()
+    assert tray.updates_count == updates + 3
+    assert tray.native_updates == tray.updates_count
@@ -0,0 +1,111 @@
+"""
+Memory and build time benchmark of the sensors catalog.
+
+Builds the columnar `SensorCatalog` and, for comparison, the per-object `Device`/`Sensor` dataclasses it replaced,
+from the same synthetic WMI query results (eg. a big server with hundreds of disks), and measures the build time,
+the memory allocated, and the time to scan all the sensors with a filter like `SensorSpec` does.
+Runs where the app runs (it imports the app modules), but doesn't need OpenHardwareMonitor.
+
+Example:
+    python utils/catalog_benchmark.py --sensors 10000 --devices 500
+"""
+import sys
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from RGBHardwareMonitor.hardware_monitor import SensorCatalog, Device  # noqa: E402
+
+
+SENSOR_TYPES = ('Temperature', 'Load', 'Fan', 'Control', 'Clock', 'Voltage', 'Data', 'Level')
+HARDWARE_TYPES = ('HDD', 'CPU', 'GpuNvidia', 'RAM', 'SuperIO')
+
+
+class WMIObject:
+    """Stand-in for WMI query results: like pywin32's COM objects, every attribute access returns a new string"""
+
+    def __init__(self, **attributes):
+        self._attributes = attributes
+
+    def __getattr__(self, name):
+        value = self._attributes[name]
+        return (value + ' ')[:-1] if isinstance(value, str) else value
+
+
+def synthetic_wmi(n_sensors, n_devices):
+    devices = [WMIObject(Name=f'Device {i}', Identifier=f'/{HARDWARE_TYPES[i % len(HARDWARE_TYPES)].lower()}/{i}',
+                         HardwareType=HARDWARE_TYPES[i % len(HARDWARE_TYPES)], Parent='')
+               for i in range(n_devices)]
+    sensors = []
+    for i in range(n_sensors):
+        device = devices[i % n_devices]
+        sensor_type = SENSOR_TYPES[i % len(SENSOR_TYPES)]
+        index = i // n_devices
+        sensors.append(WMIObject(Name=f'{sensor_type} #{index}',
+                                 Identifier=f'{device.Identifier}/{sensor_type.lower()}/{index}',
+                                 SensorType=sensor_type, Parent=device.Identifier, Index=index))
+    return devices, sensors
+
+
+def build_objects(wmi_devices, wmi_sensors):
+    return [Device.from_wmi(device, wmi_sensors) for device in wmi_devices]
+
+
+def build_objects_grouped(wmi_devices, wmi_sensors):
+    """Dataclasses, grouping the sensors by parent first instead of scanning them all for each device"""
+    by_parent = {}
+    for sensor in wmi_sensors:
+        by_parent.setdefault(sensor.Parent, []).append(sensor)
+    return [Device.from_wmi(device, by_parent.get(device.Identifier, [])) for device in wmi_devices]
+
+
+def scan_objects(devices):
+    return [sensor for device in devices for sensor in device.sensors if sensor.sensor_type == 'Temperature']
+
+
+def scan_catalog(catalog):
+    code = catalog.sensor_types.get('Temperature')
+    return [row for row, sensor_type in enumerate(catalog.sensor_type_codes) if sensor_type == code]
+
+
+def measure(label, func, *args, repeat=3):
+    best_time, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    tracemalloc.start()
+    kept = func(*args)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    print(f'{label:40} {best_time * 1000:9.2f}ms {memory / 1024:10.1f}KiB')
+    return result
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    argparser.add_argument('--sensors', type=int, default=10000)
+    argparser.add_argument('--devices', type=int, default=500)
+    args = argparser.parse_args()
+
+    wmi_devices, wmi_sensors = synthetic_wmi(args.sensors, args.devices)
+    print(f'{args.sensors} sensors, {args.devices} devices')
+    print(f'{"":40} {"time":>11} {"memory":>13}')
+    if args.sensors * args.devices <= 10 ** 7:
+        measure('dataclasses (per device sensors scan)', build_objects, wmi_devices, wmi_sensors, repeat=1)
+    devices = measure('dataclasses (grouped)', build_objects_grouped, wmi_devices, wmi_sensors)
+    catalog = measure('columnar catalog', SensorCatalog.from_wmi, wmi_devices, wmi_sensors)
+    catalog_dict = catalog.to_dict()
+    measure('columnar catalog from cache', SensorCatalog.from_dict, catalog_dict)
+    assert len(scan_objects(devices)) == len(scan_catalog(catalog))
+    measure('scan dataclasses by sensor type', scan_objects, devices)
+    measure('scan catalog by sensor type code', scan_catalog, catalog)
+
+
+if __name__ == '__main__':
+    main()
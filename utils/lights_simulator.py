@@ -0,0 +1,374 @@
+"""
+Headless simulator of the arduino RingLights effects.
+
+Reproduces the effect math of `arduino/rgb_temps/lights.cpp` (idle hue wheel, dim, flame, gamma mapping),
+using the sketch's own lookup tables, vectorized over NumPy arrays, for a batch of independent rings at once,
+so that effects can be rendered, profiled and regression-tested without flashing the board.
+
+Example:
+    python utils/lights_simulator.py --leds 16 --frames 3000 --trace ramp --gif ring.gif --png strip.png
+"""
+import re
+import time
+import argparse
+from pathlib import Path
+from dataclasses import dataclass
+
+import numpy as np
+
+
+SKETCH_PATH = Path(__file__).resolve().parent.parent / 'arduino' / 'rgb_temps'
+LIGHTS_HEADER_PATH = SKETCH_PATH / 'lights.h'
+EFFECT_TABLES_HEADER_PATH = SKETCH_PATH / 'effect_tables.h'
+
+# Constants mirrored from lights.h / rgb_temps.ino
+RING_BASE_COLOR = (0.0, 0.0, 0.0)
+RING_HOT_COLOR = (191.0, 0.0, 0.0)
+RINGFLAME_HOT_COLOR = (255.0, 159.0, 0.0)
+SETTING_SMOOTHING = 64
+INITIAL_VALUES = 0.5
+RING_PERIOD = 8
+ROTATION_BASE_SPEED = 24.0
+IDLE_BRIGHTNESS = 0.5
+DIM_SPEEDUP = 1.125
+DIM_REPEATS = 2
+DEFAULT_FPS = 30.0
+
+HSV_HUE_SEXTANT = 256
+HSV_HUE_MAX = 6 * HSV_HUE_SEXTANT - 1
+HSV_SAT_MAX = 255
+HSV_VAL_MAX = 255
+
+
+def load_table(table_name, header_path):
+    """Parses a PROGMEM lookup table from an arduino sketch header, so the two can't go out of sync"""
+    with open(header_path, mode='r', encoding='utf8') as fp:
+        source = fp.read()
+    match = re.search(table_name + r'\[[^\]]*\]\s*=\s*{(?P<values>[^}]*)}', source)
+    if not match:
+        raise ValueError(f'Table {table_name} not found in "{header_path}"')
+    values = re.sub(r'/\*.*?\*/', '', match.group('values'), flags=re.S)
+    return np.array([int(v) for v in values.split(',') if v.strip()], dtype=np.uint8)
+
+
+def load_gamma_table(header_path=LIGHTS_HEADER_PATH):
+    return load_table('_GammaTable', header_path)
+
+
+def load_hue_wheel_table(header_path=EFFECT_TABLES_HEADER_PATH):
+    return load_table('_HueWheelTable', header_path).reshape(-1, 3)
+
+
+def load_dim_curve_table(header_path=EFFECT_TABLES_HEADER_PATH):
+    return load_table('_DimCurveTable', header_path)
+
+
+def _hsv_sextant_channels():
+    """Replicates fast_hsv2rgb pointer swapping: for each sextant, the output channels for (top, bottom, slope)"""
+    channels = []
+    for sextant in range(6):
+        r, g, b = 0, 1, 2
+        if sextant & 2:
+            r, b = b, r
+        if sextant & 4:
+            g, b = b, g
+        if not (sextant & 6):
+            if not (sextant & 1):
+                r, g = g, r
+        else:
+            if sextant & 1:
+                r, g = g, r
+        channels.append((g, b, r))
+    return np.array(channels, dtype=np.intp)
+
+
+_SEXTANT_CHANNELS = _hsv_sextant_channels()
+
+
+def fast_hsv2rgb_32bit(h, s, v):
+    """Vectorized port of fast_hsv2rgb_32bit (C fallback), returns an uint8 array with a trailing RGB axis"""
+    h = np.asarray(h, dtype=np.uint32)
+    s = np.broadcast_to(np.asarray(s, dtype=np.uint32), h.shape)
+    v = np.broadcast_to(np.asarray(v, dtype=np.uint32), h.shape)
+    sextant = np.minimum(h >> 8, 5)
+    h_fraction = h & 0xff
+
+    ww = v * (255 - s)
+    ww += 1
+    ww += ww >> 8
+    bottom = ww >> 8
+
+    slope_mul = np.where(sextant & 1, s * h_fraction, s * (256 - h_fraction)) & 0xffff
+    d = v * ((255 << 8) - slope_mul)
+    d += d >> 8
+    d += v
+    slope = d >> 16
+
+    rgb = np.empty(h.shape + (3,), dtype=np.uint8)
+    channels = _SEXTANT_CHANNELS[sextant]
+    np.put_along_axis(rgb, channels[..., 0:1], v[..., None].astype(np.uint8), axis=-1)
+    np.put_along_axis(rgb, channels[..., 1:2], bottom[..., None].astype(np.uint8), axis=-1)
+    np.put_along_axis(rgb, channels[..., 2:3], slope[..., None].astype(np.uint8), axis=-1)
+    monochromatic = s == 0
+    if np.any(monochromatic):
+        rgb[monochromatic] = v[monochromatic, None].astype(np.uint8)
+    return rgb
+
+
+def mix_values(first, second, strength):
+    return (1.0 - strength) * first + strength * second
+
+
+@dataclass
+class FrameTimings:
+    """Wall-clock timings of a simulation run"""
+
+    frame_times: np.ndarray
+    """Seconds spent rendering each frame (for the whole batch)"""
+
+    @property
+    def total(self):
+        return float(self.frame_times.sum())
+
+    @property
+    def mean(self):
+        return float(self.frame_times.mean())
+
+    @property
+    def frames_per_second(self):
+        return len(self.frame_times) / self.total if self.total else float('inf')
+
+    def summary(self):
+        return (f'{len(self.frame_times)} frames in {self.total:.3f}s '
+                f'(mean {self.mean * 1e6:.1f}us/frame, '
+                f'p99 {np.percentile(self.frame_times, 99) * 1e6:.1f}us/frame, '
+                f'{self.frames_per_second:.0f} fps)')
+
+
+class RingSimulator:
+    """
+    Simulates a batch of independent RingLights with the same number of LEDs.
+    All state arrays have a leading batch axis.
+    """
+
+    def __init__(self, num_leds, batch=1, fps=DEFAULT_FPS, seed=None, gamma_table=None, idle_dynamic=True):
+        self.num_leds = num_leds
+        self.batch = batch
+        self.fps = fps
+        self.idle_dynamic = idle_dynamic
+        self.rng = np.random.default_rng(seed)
+        self.gamma_table = gamma_table if gamma_table is not None else load_gamma_table()
+        self.hue_wheel_table = load_hue_wheel_table()
+        self.dim_curve_table = load_dim_curve_table()
+        self.hue_scale = len(self.hue_wheel_table) / num_leds
+        self.dim_scale = DIM_REPEATS * len(self.dim_curve_table) / num_leds
+
+        self.base_color = np.array(RING_BASE_COLOR)
+        self.hot_color = np.array(RING_HOT_COLOR)
+        self.flame_hot_color = np.array(RINGFLAME_HOT_COLOR)
+        self.positions = np.arange(num_leds, dtype=np.float64)
+
+        self.setting_heat = np.full(batch, INITIAL_VALUES)
+        self.setting_load = np.full(batch, INITIAL_VALUES)
+        self.setting_rpm = np.full(batch, INITIAL_VALUES)
+        self.heat = self.setting_heat.copy()
+        self.load = self.setting_load.copy()
+        self.rpm = self.setting_rpm.copy()
+        self.entropy = np.zeros(batch)
+        self.ring_offset = np.zeros(batch)
+        self.flame_force = np.zeros((batch, num_leds))
+        self.ring_pixels = self.make_idle(np.zeros(batch)).astype(np.float64)
+
+    def set_sensors(self, heat, load, rpm):
+        """Sets sensor values (0.0-1.0), scalars or arrays with one value per batch item"""
+        self.setting_heat = np.broadcast_to(np.asarray(heat, dtype=np.float64), (self.batch,))
+        self.setting_load = np.broadcast_to(np.asarray(load, dtype=np.float64), (self.batch,))
+        self.setting_rpm = np.broadcast_to(np.asarray(rpm, dtype=np.float64), (self.batch,))
+
+    def set_raw_sensors(self, raw_heat, raw_load, raw_rpm):
+        """Sets sensor values as sent over serial by the `U` command (0-255)"""
+        self.set_sensors(*(np.clip(np.asarray(raw, dtype=np.float64) / 255.0, 0.0, 1.0)
+                           for raw in (raw_heat, raw_load, raw_rpm)))
+
+    def make_idle(self, offset):
+        phase = ((self.positions[None, :] + offset[:, None]) * self.hue_scale).astype(np.uint16)
+        return self.hue_wheel_table[phase % len(self.hue_wheel_table)]
+
+    def update_context(self):
+        inv_smooth = 1.0 / SETTING_SMOOTHING
+        self.heat = mix_values(self.heat, self.setting_heat, inv_smooth)
+        self.load = mix_values(self.load, self.setting_load, inv_smooth)
+        self.rpm = mix_values(self.rpm, self.setting_rpm, inv_smooth)
+
+        rotation = (ROTATION_BASE_SPEED / self.fps) * 1.5 * self.rpm ** 3
+        self.entropy = 99000 * self.load ** 2
+
+        self.ring_offset = self.ring_offset + rotation
+        wrap_period = self.num_leds * RING_PERIOD
+        self.ring_offset = np.where(self.ring_offset >= wrap_period, self.ring_offset - wrap_period,
+                                    np.where(self.ring_offset < 0, self.ring_offset + wrap_period, self.ring_offset))
+
+    def update_ring(self):
+        self.update_context()
+
+        rows = np.arange(self.batch)
+        for _ in range(self.num_leds // 8 + 1):
+            triggered = self.rng.integers(0, 100000, self.batch) <= self.entropy
+            leds = self.rng.integers(0, self.num_leds, self.batch)
+            force = self.flame_force[rows, leds]
+            new_force = np.where(force < 100.0, 200.0 - force, 100.0 + 0.25 * (force - 100.0))
+            self.flame_force[rows, leds] = np.where(triggered, new_force, force)
+
+        force = self.flame_force
+        force = np.where(force > 0.0,
+                         force * 0.9 * (1.0 - (self.entropy[:, None] / 150000.0) * (force / 200.0)),
+                         force)
+        self.flame_force = np.where(force <= 1.0, 0.0, force)
+
+    def mix_dim(self, mix, offset, strength):
+        phase = ((self.positions[None, :] + offset[:, None]) * self.dim_scale).astype(np.uint16)
+        base_dim = self.dim_curve_table[phase % len(self.dim_curve_table)] / 255.0
+        strength = np.clip(strength[:, None] * base_dim, 0.0, 1.0)
+        return mix_values(mix, self.base_color, strength[..., None])
+
+    def display_ring(self):
+        """Computes the current frame, returns gamma mapped uint8 RGB with shape (batch, num_leds, 3)"""
+        if self.idle_dynamic:
+            mix = self.make_idle(self.ring_offset).astype(np.float64)
+        else:
+            oi = self.positions[None, :] + self.ring_offset[:, None]
+            pix_offset = (oi - np.trunc(oi))[..., None]
+            src0 = oi.astype(np.intp) % self.num_leds
+            src1 = (src0 + 1) % self.num_leds
+            rows = np.arange(self.batch)[:, None]
+            mix = mix_values(self.ring_pixels[rows, src0], self.ring_pixels[rows, src1], pix_offset)
+        flame_cool_color = mix * 3.0
+        load = self.load[:, None, None]
+        heat = self.heat[:, None, None]
+        mix = mix * mix_values(IDLE_BRIGHTNESS, 1.0, load)
+        mix = mix_values(mix, self.hot_color, heat)
+
+        flame_force = self.flame_force[..., None]
+        flame_leds = flame_force != 0.0
+        if np.any(flame_leds):
+            dim = 1.0 - (0.75 * (self.rng.integers(0, 512, flame_force.shape) / 511.0) * load ** 2)
+            strength = dim * (0.5 + 0.5 * heat) * (100.0 - np.abs(flame_force - 100.0)) / 100.0
+            inv_heat = 1.0 - heat
+            flame_color = mix_values(flame_cool_color, self.flame_hot_color, 1.0 - inv_heat * inv_heat)
+            mix = np.where(flame_leds, mix_values(mix, flame_color, strength), mix)
+
+        mix = self.mix_dim(mix, self.ring_offset * DIM_SPEEDUP, np.minimum(1.0, self.rpm * 6.0))
+
+        clipped = np.clip(mix, 0.0, 255.0)
+        index = np.minimum(len(self.gamma_table) - 1,
+                           ((len(self.gamma_table) - 1) * clipped / 255.0).astype(np.uint32))
+        return self.gamma_table[index]
+
+    def loop_step(self):
+        self.update_ring()
+        return self.display_ring()
+
+    def render(self, trace, raw=False):
+        """
+        Renders one frame per trace sample.
+        `trace` has shape (frames, 3) or (frames, batch, 3) with (heat, load, rpm) columns,
+        either normalized 0.0-1.0 or raw 0-255 if `raw` is True.
+        Returns the frames array with shape (frames, batch, num_leds, 3) and the timings.
+        """
+        trace = np.asarray(trace, dtype=np.float64)
+        if trace.ndim == 2:
+            trace = np.broadcast_to(trace[:, None, :], (trace.shape[0], self.batch, 3))
+        set_sensors = self.set_raw_sensors if raw else self.set_sensors
+        frames = np.empty((len(trace), self.batch, self.num_leds, 3), dtype=np.uint8)
+        frame_times = np.empty(len(trace))
+        for n, sample in enumerate(trace):
+            start = time.perf_counter()
+            set_sensors(sample[:, 0], sample[:, 1], sample[:, 2])
+            frames[n] = self.loop_step()
+            frame_times[n] = time.perf_counter() - start
+        return frames, FrameTimings(frame_times)
+
+
+def make_trace(kind, frames):
+    """Builds a synthetic (frames, 3) sensor trace: "idle", "load", "ramp" or "step" """
+    t = np.linspace(0.0, 1.0, frames)
+    if kind == 'idle':
+        return np.tile([0.1, 0.05, 0.2], (frames, 1))
+    if kind == 'load':
+        return np.tile([0.9, 1.0, 0.8], (frames, 1))
+    if kind == 'ramp':
+        return np.stack([t, t, t], axis=1)
+    if kind == 'step':
+        step = (t >= 0.5).astype(np.float64)
+        return np.stack([0.1 + 0.8 * step, 0.05 + 0.95 * step, 0.2 + 0.6 * step], axis=1)
+    raise ValueError(f'Unknown trace kind: {kind}')
+
+
+def load_trace_csv(path):
+    """Loads a (frames, 3) trace of heat, load, rpm columns from a CSV file"""
+    return np.loadtxt(path, delimiter=',', ndmin=2, usecols=(0, 1, 2))
+
+
+def save_strip_png(frames, path, scale=4):
+    """Saves a (frames, num_leds, 3) array as a PNG strip: one row per frame, one column per LED"""
+    from PIL import Image
+    image = Image.fromarray(np.ascontiguousarray(frames), mode='RGB')
+    image = image.resize((image.width * scale, image.height), resample=Image.NEAREST)
+    image.save(path)
+
+
+def save_ring_gif(frames, path, fps=DEFAULT_FPS, size=128, every=1):
+    """Saves a (frames, num_leds, 3) array as an animated GIF, drawing LEDs as dots on a ring"""
+    from PIL import Image, ImageDraw
+    num_leds = frames.shape[1]
+    angles = 2.0 * np.pi * np.arange(num_leds) / num_leds
+    radius = size * 0.38
+    dot = max(2.0, np.pi * radius / num_leds * 0.8)
+    centers = [(size / 2 + radius * np.sin(a), size / 2 - radius * np.cos(a)) for a in angles]
+    images = []
+    for frame in frames[::every]:
+        image = Image.new('RGB', (size, size))
+        draw = ImageDraw.Draw(image)
+        for (x, y), color in zip(centers, frame):
+            draw.ellipse((x - dot, y - dot, x + dot, y + dot), fill=tuple(int(c) for c in color))
+        images.append(image)
+    images[0].save(path, save_all=True, append_images=images[1:], duration=int(1000 * every / fps), loop=0)
+
+
+def parse_args():
+    argparser = argparse.ArgumentParser(description='Simulate RingLights effects headlessly')
+    argparser.add_argument('--leds', type=int, default=16, help='Number of LEDs of the ring')
+    argparser.add_argument('--batch', type=int, default=1, help='Number of independent rings to simulate')
+    argparser.add_argument('--frames', type=int, default=3000, help='Number of frames for synthetic traces')
+    argparser.add_argument('--fps', type=float, default=DEFAULT_FPS, help='Simulated board fps')
+    argparser.add_argument('--seed', type=int, default=None, help='Random seed')
+    argparser.add_argument('--trace', default='ramp',
+                           help='Synthetic trace (idle, load, ramp, step) or path to a heat,load,rpm CSV file')
+    argparser.add_argument('--raw', action='store_true', help='CSV trace values are raw serial values (0-255)')
+    argparser.add_argument('--save-frames', default=None, help='Save frames array to a .npy file')
+    argparser.add_argument('--png', default=None, help='Save the first ring as a PNG strip')
+    argparser.add_argument('--gif', default=None, help='Save the first ring as an animated GIF')
+    argparser.add_argument('--gif-every', type=int, default=2, help='Keep one GIF frame every N frames')
+    return argparser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if Path(args.trace).is_file():
+        trace = load_trace_csv(args.trace)
+    else:
+        trace = make_trace(args.trace, args.frames)
+        args.raw = False
+    simulator = RingSimulator(args.leds, batch=args.batch, fps=args.fps, seed=args.seed)
+    frames, timings = simulator.render(trace, raw=args.raw)
+    print(timings.summary())
+    if args.save_frames:
+        np.save(args.save_frames, frames)
+    if args.png:
+        save_strip_png(frames[:, 0], args.png)
+    if args.gif:
+        save_ring_gif(frames[:, 0], args.gif, fps=args.fps, every=args.gif_every)
+
+
+if __name__ == '__main__':
+    main()
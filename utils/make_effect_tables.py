@@ -0,0 +1,36 @@
+"""
+Generates the PROGMEM effect lookup tables of the arduino sketch (arduino/rgb_temps/effect_tables.h):
+the idle hue wheel and the dim curve, both indexed by an 8-bit phase (one full turn / period).
+"""
+import math
+
+from lights_simulator import fast_hsv2rgb_32bit, HSV_HUE_SEXTANT, HSV_SAT_MAX, HSV_VAL_MAX
+from make_gamma_map import format_map
+
+
+TABLE_SIZE = 256
+
+
+def make_hue_wheel(size=TABLE_SIZE):
+    """Full saturation / value RGB colors around the hue wheel, flattened as r, g, b triplets"""
+    hues = [i * 6 * HSV_HUE_SEXTANT // size for i in range(size)]
+    return [int(c) for rgb in fast_hsv2rgb_32bit(hues, HSV_SAT_MAX, HSV_VAL_MAX) for c in rgb]
+
+
+def make_dim_curve(size=TABLE_SIZE, out_range=255):
+    """Dim strength along one dim period: raised cosine over a quadratic ease-out of the phase"""
+    values = []
+    for i in range(size):
+        phase = 1.0 - (1.0 - i / size) ** 2
+        values.append(int(round(out_range * (1.0 + math.cos(2.0 * math.pi * phase)) / 2.0)))
+    return values
+
+
+if __name__ == '__main__':
+    print(f'#define EFFECT_TABLE_SIZE {TABLE_SIZE}\n')
+    print('const uint8_t PROGMEM _HueWheelTable[EFFECT_TABLE_SIZE * 3] = {'
+          '  /* fast_hsv2rgb_32bit(i * HSV_HUE_STEPS / 256, 255, 255) */')
+    print(format_map(make_hue_wheel(), cols=24) + '};\n')
+    print('const uint8_t PROGMEM _DimCurveTable[EFFECT_TABLE_SIZE] = {'
+          '  /* 255 * (1 + cos(2 * PI * (1 - (1 - i / 256)^2))) / 2 */')
+    print(format_map(make_dim_curve()) + '};')